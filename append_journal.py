@@ -0,0 +1,146 @@
+# append_journal.py
+
+import asyncio
+import contextlib
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class AppendJournal:
+    """
+    Отложенная групповая запись строк в конец файлов.
+    Строки копятся в памяти и раз в окно фиксации записываются фоновой задачей:
+    одна запись (и при необходимости один fsync) на файл за окно.
+    Вызывающий код может дождаться фиксации своей строки (durable=True).
+    """
+
+    def __init__(self, commit_interval: float = 0.05, fsync: bool = False):
+        self.commit_interval = commit_interval
+        self.fsync = fsync
+        self.pending = {}  # file_path -> список строк
+        self.waiters = {}  # file_path -> список future, ожидающих фиксации
+        self._wakeup = None
+        self._task = None
+        self._lock = None
+        self._lock_loop = None
+        self._stopping = False
+
+    def _ensure_lock(self) -> asyncio.Lock:
+        # Один замок на цикл событий: фоновая запись, flush, rotate и exclusive исключают друг друга.
+        # Новый замок создаётся только в новом цикле (например, после перезапуска), в нём старый непригоден
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def append(self, file_path: str, data: str, durable: bool = False):
+        """
+        Ставит строку в очередь на запись. При durable=True ждёт, пока строка не будет записана на диск.
+        """
+        self._ensure_started()
+        self.pending.setdefault(file_path, []).append(f"{data}\n")
+        future = None
+        if durable:
+            future = asyncio.get_running_loop().create_future()
+            self.waiters.setdefault(file_path, []).append(future)
+        self._wakeup.set()
+        if future is not None:
+            await future
+
+    async def flush(self, file_path: str = None):
+        """
+        Немедленно записывает накопленные строки (для одного файла или для всех).
+        Всегда ждёт завершения уже начатой фоновой записи, даже если новых строк нет.
+        """
+        async with self._ensure_lock():
+            await self._flush_locked(file_path)
+
+    @contextlib.asynccontextmanager
+    async def exclusive(self, file_path: str):
+        """
+        Дописывает накопленные строки файла и приостанавливает фоновую запись на время блока.
+        Внутри блока файл можно читать или перезаписывать целиком: все принятые ранее
+        строки уже на диске, а строки, принятые во время блока, будут дописаны после него.
+        """
+        async with self._ensure_lock():
+            await self._flush_locked(file_path)
+            yield
+
+    async def rotate(self, file_path: str, target_path: str):
+        """
+        Дописывает накопленные строки и атомарно переименовывает файл.
+        Пока идёт переименование, фоновая запись в файл не выполняется;
+        последующие строки попадут в новый файл.
+        """
+        async with self._ensure_lock():
+            await self._flush_locked(file_path)
+            os.replace(file_path, target_path)
+
+    async def _flush_locked(self, file_path: str = None):
+        if file_path is None:
+            batch, self.pending = self.pending, {}
+            waiters, self.waiters = self.waiters, {}
+        else:
+            if file_path not in self.pending:
+                return
+            batch = {file_path: self.pending.pop(file_path)}
+            waiters = {file_path: self.waiters.pop(file_path, [])}
+        if not batch:
+            return
+        errors = await asyncio.to_thread(self._write_batch, batch, self.fsync)
+        for path, futures in waiters.items():
+            for future in futures:
+                if future.done():
+                    continue
+                if path in errors:
+                    future.set_exception(errors[path])
+                else:
+                    future.set_result(None)
+
+    @staticmethod
+    def _write_batch(batch: dict, fsync: bool) -> dict:
+        errors = {}
+        for file_path, lines in batch.items():
+            try:
+                with open(file_path, 'a', encoding='utf-8') as f:
+                    f.write(''.join(lines))
+                    if fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+            except OSError as e:
+                logger.error(f"Ошибка записи {len(lines)} строк в {file_path}: {e}")
+                errors[file_path] = e
+        return errors
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            if not self._stopping:
+                await asyncio.sleep(self.commit_interval)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка фоновой записи журнала: {e}")
+            if self._stopping:
+                return
+
+    async def stop(self):
+        """
+        Останавливает фоновую задачу и записывает всё накопленное.
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
@@ -0,0 +1,72 @@
+# benchmarks/dataset.py
+
+import os
+import random
+from datetime import datetime, timedelta
+
+# Первый ID синтетических пользователей (администратор и реальные ID сюда не попадают)
+FIRST_USER_ID = 100000
+# Глобальный лимит ключей в наборе данных: выдача в бенчмарке не должна упираться в лимит
+DATASET_KEY_LIMIT = 1000000
+
+
+def user_ids(users: int) -> list:
+    return list(range(FIRST_USER_ID, FIRST_USER_ID + users))
+
+
+def build_dataset(data_dir: str, users: int, log_lines: int, pool_size: int, banned_share: float = 0.05, seed: int = 0) -> dict:
+    """
+    Создаёт в data_dir файлы бота заданного размера: пользователей, строки
+    keys_log.txt (выдачи и статистика, как их пишет бот) и очередь .conf ключей.
+    Возвращает описание набора данных для отчёта.
+    """
+    rnd = random.Random(seed)
+    users_dir = os.path.join(data_dir, 'users')
+    configs_dir = os.path.join(data_dir, 'configs')
+    os.makedirs(users_dir, exist_ok=True)
+    os.makedirs(configs_dir, exist_ok=True)
+
+    ids = user_ids(users)
+    banned_count = int(users * banned_share)
+    banned = ids[:banned_count]
+    authorized = ids[banned_count:]
+
+    def write_lines(filename: str, lines):
+        with open(os.path.join(users_dir, filename), 'w', encoding='utf-8') as f:
+            for line in lines:
+                f.write(f"{line}\n")
+
+    write_lines('authorized_users.txt', authorized)
+    write_lines('banned_users.txt', banned)
+    write_lines('key_limit.txt', [DATASET_KEY_LIMIT])
+
+    # История выдачи: ключи из прошлого, которых уже нет в очереди
+    log = []
+    issued = []
+    stats = {}
+    started = datetime(2024, 1, 1)
+    for i in range(log_lines):
+        user_id = rnd.choice(ids) if ids else FIRST_USER_ID
+        if i % 2:
+            stats[user_id] = stats.get(user_id, 0) + 1
+            log.append(f"{user_id}:stats:{stats[user_id]}")
+        else:
+            key_filename = f"history_{i:08d}.conf"
+            timestamp = (started + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S")
+            log.append(f"{timestamp} - User: user{user_id} (ID: {user_id}) - Key: {key_filename}")
+            issued.append(f"{user_id}:{key_filename}")
+    write_lines('keys_log.txt', log)
+    write_lines('keys_issued.txt', issued)
+
+    for i in range(pool_size):
+        with open(os.path.join(configs_dir, f"key_{i:06d}.conf"), 'w', encoding='utf-8') as f:
+            f.write(f"[Interface]\n# benchmark key {i}\nPrivateKey = {rnd.getrandbits(128):032x}\n")
+
+    return {
+        'users': users,
+        'authorized': len(authorized),
+        'banned': len(banned),
+        'log_lines': log_lines,
+        'history_issuances': len(issued),
+        'pool_size': pool_size,
+    }
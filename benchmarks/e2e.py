@@ -0,0 +1,270 @@
+# benchmarks/e2e.py
+"""
+Сквозной нагрузочный тест через настоящий HTTP: бот работает в режиме polling
+против локального FakeTelegramServer (TELEGRAM_API_SERVER), а виртуальные
+пользователи отправляют обновления и ждут ответа бота:
+
+    python benchmarks/e2e.py --virtual-users 2000 --duration 60 --latency 0.05
+    python benchmarks/e2e.py --flood-rate 0.02 --retry-after 2 --broadcast
+    python benchmarks/e2e.py --global-rate 30 --baseline e2e_old.json
+
+Выводятся обновлений в секунду, задержка от отправки обновления до первого
+ответа бота (p50/p99), потерянные ответы и статистика 429. Результаты
+сохраняются в JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.dataset import build_dataset, user_ids  # noqa: E402
+from benchmarks.fake_api_server import FakeTelegramServer  # noqa: E402
+from benchmarks.run import (  # noqa: E402
+    ADMIN_ID, BROADCAST_TEXT, GET_KEY_BUTTON, summarize
+)
+
+# Действия виртуального пользователя: последовательность шагов (тип, данные) и вес
+ACTIONS = {
+    'start': ([('message', '/start')], 3),
+    'get_key': ([('message', GET_KEY_BUTTON)], 2),
+    'vpn_support': ([('message', "🛠 Не работает VPN"), ('message', "Оператор"), ('message', "🔙 Назад")], 2),
+    'callback': ([('callback', 'no_action')], 3),
+}
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = {name: [] for name in ACTIONS}
+        self.lost = {name: 0 for name in ACTIONS}
+
+    def summary(self, duration: float) -> dict:
+        result = {}
+        for name, latencies in self.latencies.items():
+            result[name] = summarize(latencies, duration, lost=self.lost[name])
+        return result
+
+
+async def virtual_user(server: FakeTelegramServer, user_id: int, deadline: float, args, stats: LoadStats, rnd: random.Random):
+    """
+    Замкнутый цикл: отправить обновление, дождаться ответа бота, подумать, повторить.
+    """
+    names = list(ACTIONS)
+    weights = [ACTIONS[name][1] for name in names]
+    await asyncio.sleep(rnd.uniform(0, args.think_time))
+    while time.perf_counter() < deadline:
+        name = rnd.choices(names, weights)[0]
+        for kind, payload in ACTIONS[name][0]:
+            reply = server.wait_reply(user_id)
+            sent_at = time.perf_counter()
+            if kind == 'message':
+                server.push_message(user_id, payload)
+            else:
+                server.push_callback(user_id, payload)
+            try:
+                await asyncio.wait_for(reply, args.reply_timeout)
+                stats.latencies[name].append(time.perf_counter() - sent_at)
+            except asyncio.TimeoutError:
+                stats.lost[name] += 1
+                break
+        await asyncio.sleep(rnd.expovariate(1 / args.think_time) if args.think_time else 0)
+
+
+async def run_broadcast(bot, broadcast_engine, recipients: list) -> dict:
+    """
+    Рассылка во время нагрузки. Запускается напрямую через BroadcastEngine:
+    сообщение о прогрессе может получить 429, тогда запуск повторяется.
+    """
+    from aiogram.utils.exceptions import RetryAfter
+
+    started_at = time.perf_counter()
+    while True:
+        try:
+            await broadcast_engine.start(bot, ADMIN_ID, BROADCAST_TEXT, recipients)
+            break
+        except RetryAfter as e:
+            await asyncio.sleep(e.timeout)
+    while broadcast_engine.is_running:
+        await asyncio.sleep(0.05)
+    state = broadcast_engine.state
+    return {
+        'duration_s': round(time.perf_counter() - started_at, 3),
+        'recipients': len(state['recipients']),
+        'sent': state['sent'],
+        'failed': state['failed'],
+    }
+
+
+async def run_load(args, server: FakeTelegramServer) -> dict:
+    import main
+    import utils
+    from handlers import broadcast_engine
+    from metrics import TELEGRAM_ERRORS
+
+    if utils.sqlite_storage is not None:
+        await asyncio.to_thread(utils.sqlite_storage.migrate_from_files)
+
+    startup_started_at = time.perf_counter()
+    await main.on_startup(main.dp)
+    polling = asyncio.create_task(main.dp.start_polling(timeout=args.poll_timeout, relax=0))
+    results = {'startup_s': round(time.perf_counter() - startup_started_at, 4)}
+
+    stats = LoadStats()
+    rnd = random.Random(args.seed)
+    users = user_ids(args.users)[int(args.users * 0.05):]  # без забаненных (см. build_dataset)
+    virtual = rnd.sample(users, min(args.virtual_users, len(users)))
+    started_at = time.perf_counter()
+    deadline = started_at + args.duration
+    tasks = [
+        asyncio.create_task(virtual_user(server, user_id, deadline, args, stats, random.Random(rnd.random())))
+        for user_id in virtual
+    ]
+    broadcast = None
+    if args.broadcast:
+        recipients = sorted((await utils.get_user_registry()).authorized)
+        broadcast = asyncio.create_task(run_broadcast(main.bot, broadcast_engine, recipients))
+    duration = None
+    try:
+        await asyncio.gather(*tasks)
+        duration = time.perf_counter() - started_at
+        if broadcast is not None:
+            results['broadcast'] = await broadcast
+    finally:
+        duration = duration or time.perf_counter() - started_at
+        main.dp.stop_polling()
+        server.release_polling()
+        await main.dp.wait_closed()
+        await polling
+        await main.on_shutdown(main.dp)
+        await (await main.bot.get_session()).close()
+
+    latencies = [latency for values in stats.latencies.values() for latency in values]
+    results.update({
+        'virtual_users': len(virtual),
+        'duration_s': round(duration, 3),
+        'updates_delivered': server.delivered,
+        'updates_per_s': round(server.delivered / duration, 2),
+        'replies': summarize(latencies, duration, lost=sum(stats.lost.values())),
+        'actions': stats.summary(duration),
+        'api_calls': dict(server.calls),
+        'flood_errors': dict(server.flood_errors),
+        'bot_api_errors': {method: int(count) for method, count in TELEGRAM_ERRORS.values.items()},
+        'uploaded_bytes': server.uploaded_bytes,
+    })
+    return results
+
+
+def print_results(report: dict, baseline: dict = None):
+    results = report['results']
+    old = (baseline or {}).get('results', {})
+
+    def compare(key: str, value, old_value):
+        return f"{key}: {value}" + (f" (было: {old_value})" if old_value is not None else "")
+
+    print(f"\nВиртуальных пользователей: {results['virtual_users']}, длительность: {results['duration_s']} сек.")
+    print(compare("Обновлений в секунду", results['updates_per_s'], old.get('updates_per_s')))
+    replies, old_replies = results['replies'], old.get('replies', {})
+    print(compare("Ответ бота p50, мс", replies['p50_ms'], old_replies.get('p50_ms')))
+    print(compare("Ответ бота p99, мс", replies['p99_ms'], old_replies.get('p99_ms')))
+    print(compare("Без ответа", replies['lost'], old_replies.get('lost')))
+    print(f"429 от сервера: {results['flood_errors'] or 'нет'}; ошибки запросов бота: {results['bot_api_errors'] or 'нет'}")
+    if 'broadcast' in results:
+        print(f"Рассылка: {results['broadcast']}")
+    print(f"\n{'действие':<12} {'ответов':>8} {'p50, мс':>10} {'p99, мс':>10} {'без ответа':>11}")
+    for name, action in results['actions'].items():
+        print(f"{name:<12} {action['requests']:>8} {action['p50_ms']:>10} {action['p99_ms']:>10} {action['lost']:>11}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Сквозной нагрузочный тест бота против локального Bot API")
+    parser.add_argument('--virtual-users', type=int, default=1000, help="число виртуальных пользователей")
+    parser.add_argument('--duration', type=float, default=30, help="длительность нагрузки, сек")
+    parser.add_argument('--think-time', type=float, default=1.0, help="средняя пауза пользователя между действиями, сек")
+    parser.add_argument('--reply-timeout', type=float, default=10, help="сколько ждать ответа бота, сек")
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка ответа Bot API, сек")
+    parser.add_argument('--jitter', type=float, default=0.0, help="случайная добавка к задержке, сек")
+    parser.add_argument('--flood-rate', type=float, default=0.0, help="доля запросов с ответом 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="retry_after в ответах 429, сек")
+    parser.add_argument('--global-rate', type=float, default=0.0, help="лимит сообщений в секунду (0 — без лимита)")
+    parser.add_argument('--broadcast', action='store_true', help="запустить рассылку во время нагрузки")
+    parser.add_argument('--users', type=int, help="пользователей в наборе данных (по умолчанию с запасом)")
+    parser.add_argument('--log-lines', type=int, default=10000, help="строк в keys_log.txt")
+    parser.add_argument('--pool', type=int, default=5000, help="ключей .conf в очереди")
+    parser.add_argument('--storage', choices=('files', 'sqlite'), default='files', help="STORAGE_BACKEND")
+    parser.add_argument('--fsm', choices=('sqlite', 'memory'), default='sqlite', help="FSM_STORAGE")
+    parser.add_argument('--poll-timeout', type=int, default=20, help="timeout long polling, сек")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="файл с результатами (по умолчанию e2e_ГГГГммдд_ЧЧММСС.json)")
+    parser.add_argument('--baseline', help="результаты прошлого запуска для сравнения")
+    args = parser.parse_args()
+    if args.users is None:
+        args.users = args.virtual_users * 2
+    return args
+
+
+async def run(args) -> dict:
+    server = FakeTelegramServer(args.latency, args.jitter, args.flood_rate, args.retry_after, args.global_rate, args.seed)
+    base_url = await server.start()
+    os.environ['TELEGRAM_API_SERVER'] = base_url
+    try:
+        return await run_load(args, server)
+    finally:
+        await server.stop()
+
+
+def main():
+    args = parse_args()
+    output = os.path.abspath(args.output or f"e2e_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    # Конфигурация бота читается при импорте, поэтому окружение и рабочая папка задаются заранее
+    work_dir = tempfile.mkdtemp(prefix='bot_e2e_')
+    os.chdir(work_dir)
+    shutil.copy(os.path.join(ROOT_DIR, 'messages.json'), work_dir)
+    os.environ.update({
+        'API_TOKEN': '123456:E2E',
+        'AUTHORIZED_USER_ID': str(ADMIN_ID),
+        'ADMIN_USERNAME': 'admin',
+        'BOT_MODE': 'polling',
+        'STORAGE_BACKEND': args.storage,
+        'FSM_STORAGE': args.fsm,
+        'METRICS_PORT': '0',
+        'STAGING_CHAT_ID': '',
+        'THROTTLE_GET_KEY': '1000000/1',
+    })
+    dataset = build_dataset(os.path.join(work_dir, 'data'), args.users, args.log_lines, args.pool, seed=args.seed)
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        os.chdir(ROOT_DIR)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'params': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+        'dataset': dataset,
+        'results': results,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_results(report, baseline)
+    print(f"\nРезультаты сохранены: {output}")
+
+
+if __name__ == '__main__':
+    main()
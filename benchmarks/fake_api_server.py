@@ -0,0 +1,220 @@
+# benchmarks/fake_api_server.py
+
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Методы, на которые Telegram отвечает ограничением частоты (429)
+FLOOD_METHODS = ('sendMessage', 'sendDocument', 'editMessageText')
+
+
+class FakeTelegramServer:
+    """
+    Локальный HTTP-сервер, реализующий методы Bot API, которые использует бот.
+    Обновления для getUpdates добавляет генератор нагрузки (push_message, push_callback),
+    ответы бота передаются ожидающим виртуальным пользователям (wait_reply).
+    Задержка ответа и 429 с retry_after задаются параметрами:
+    flood_rate — доля запросов с 429, global_rate — общий лимит сообщений в секунду.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, flood_rate: float = 0.0,
+                 retry_after: int = 1, global_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.limiter = TokenBucket(global_rate, global_rate) if global_rate else None
+        self.random = random.Random(seed)
+
+        self.updates = []  # неподтверждённые обновления по возрастанию update_id
+        self.delivered = 0  # обновлений, подтверждённых ботом через offset
+        self._new_updates = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._callback_ids = itertools.count(1)
+        self._callbacks = {}  # id callback-запроса -> chat_id
+        self._waiters = {}  # chat_id -> Future ответа бота
+
+        self.calls = Counter()  # метод -> число запросов
+        self.flood_errors = Counter()  # метод -> число ответов 429
+        self.uploaded_bytes = 0
+        self._runner = None
+
+    # Генерация обновлений
+
+    def _push(self, payload: dict) -> int:
+        update_id = next(self._update_ids)
+        payload['update_id'] = update_id
+        self.updates.append(payload)
+        self._new_updates.set()
+        return update_id
+
+    def push_message(self, user_id: int, text: str) -> int:
+        return self._push({'message': {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'User', 'username': f"user{user_id}"},
+            'text': text,
+            **({'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]} if text.startswith('/') else {}),
+        }})
+
+    def push_callback(self, user_id: int, data: str) -> int:
+        callback_id = str(next(self._callback_ids))
+        self._callbacks[callback_id] = user_id
+        return self._push({'callback_query': {
+            'id': callback_id,
+            'chat_instance': str(user_id),
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'User', 'username': f"user{user_id}"},
+            'data': data,
+            'message': {'message_id': next(self._message_ids), 'date': int(time.time()), 'chat': {'id': user_id, 'type': 'private'}, 'text': '-'},
+        }})
+
+    def wait_reply(self, chat_id: int) -> asyncio.Future:
+        """
+        Возвращает Future, которое завершится при первом ответе бота в чат chat_id.
+        Регистрировать ожидание нужно до отправки обновления.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[chat_id] = future
+        return future
+
+    def _notify(self, chat_id: int, method: str):
+        future = self._waiters.pop(chat_id, None)
+        if future is not None and not future.done():
+            future.set_result(method)
+
+    # Методы Bot API
+
+    async def _get_updates(self, params: dict):
+        offset = int(params.get('offset') or 0)
+        if offset:
+            confirmed = 0
+            while confirmed < len(self.updates) and self.updates[confirmed]['update_id'] < offset:
+                confirmed += 1
+            del self.updates[:confirmed]
+            self.delivered += confirmed
+        if not self.updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), float(params.get('timeout') or 0))
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get('limit') or 100)
+        return self.updates[:limit]
+
+    def _message(self, chat_id: int, **fields) -> dict:
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            **fields,
+        }
+
+    async def _call(self, method: str, params: dict, files: dict):
+        if method == 'getUpdates':
+            return await self._get_updates(params)
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+        if method in ('deleteWebhook', 'setWebhook', 'deleteMessage'):
+            return True
+        if method == 'getChat':
+            chat_id = int(params['chat_id'])
+            return {'id': chat_id, 'type': 'private', 'username': f"user{chat_id}", 'first_name': 'User'}
+        if method == 'answerCallbackQuery':
+            chat_id = self._callbacks.pop(params.get('callback_query_id'), None)
+            if chat_id is not None:
+                self._notify(chat_id, method)
+            return True
+
+        chat_id = int(params.get('chat_id') or 0)
+        if method == 'sendMessage':
+            result = self._message(chat_id, text=params.get('text', ''))
+        elif method == 'sendDocument':
+            document = files.get('document')
+            if document is not None:
+                self.uploaded_bytes += len(document.file.read())
+                file_name = document.filename
+            else:
+                file_name = None  # отправка по file_id
+            file_id = f"file-{self.calls[method]}"
+            result = self._message(chat_id, document={'file_id': file_id, 'file_unique_id': file_id, 'file_name': file_name})
+        elif method == 'editMessageText':
+            result = self._message(chat_id, message_id=int(params.get('message_id') or 0), text=params.get('text', ''))
+        else:
+            return None
+        self._notify(chat_id, method)
+        return result
+
+    def _flood_control(self, method: str):
+        if method not in FLOOD_METHODS:
+            return False
+        if self.flood_rate and self.random.random() < self.flood_rate:
+            return True
+        return self.limiter is not None and not self.limiter.try_consume()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.calls[method] += 1
+        form = await request.post()
+        params, files = {}, {}
+        for name, value in form.items():
+            if isinstance(value, web.FileField):
+                files[name] = value
+            else:
+                params[name] = value
+
+        if method != 'getUpdates':
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+            if delay:
+                await asyncio.sleep(delay)
+
+        if self._flood_control(method):
+            self.flood_errors[method] += 1
+            return web.json_response({
+                'ok': False,
+                'error_code': 429,
+                'description': f"Too Many Requests: retry after {self.retry_after}",
+                'parameters': {'retry_after': self.retry_after},
+            }, status=429)
+
+        result = await self._call(method, params, files)
+        if result is None:
+            return web.json_response({'ok': False, 'error_code': 404, 'description': 'Not Found'}, status=404)
+        return web.json_response({'ok': True, 'result': result}, dumps=lambda obj: json.dumps(obj, ensure_ascii=False))
+
+    # Запуск
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """
+        Запускает сервер и возвращает его базовый адрес для TelegramAPIServer.from_base.
+        """
+        app = web.Application(client_max_size=50 * 1024 * 1024)
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    def release_polling(self):
+        """
+        Завершает ожидающий getUpdates, чтобы бот мог сразу остановить polling.
+        """
+        self._new_updates.set()
+
+    async def stop(self):
+        self.release_polling()
+        if self._runner is not None:
+            await self._runner.cleanup()
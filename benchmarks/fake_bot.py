@@ -0,0 +1,71 @@
+# benchmarks/fake_bot.py
+
+import asyncio
+import itertools
+import time
+from collections import Counter
+
+from aiogram import Bot
+
+
+class FakeBot:
+    """
+    Подменяет сетевые запросы aiogram (Bot.request) ответами в памяти процесса
+    и записывает вызовы. Бот, обработчики и middleware работают без изменений,
+    включая MetricsBot. Задержка latency имитирует время ответа Telegram.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()  # метод -> число вызовов
+        self.documents = []  # имена файлов, отправленных через sendDocument
+        self.messages = []  # (chat_id, текст, time.perf_counter()) для каждого sendMessage
+        self._message_ids = itertools.count(1)
+        self._original = None
+
+    def install(self):
+        self._original = Bot.request
+        fake = self
+
+        async def request(bot, method, data=None, files=None, **kwargs):
+            return await fake.request(method, data or {}, files or {})
+
+        Bot.request = request
+
+    def uninstall(self):
+        if self._original is not None:
+            Bot.request = self._original
+            self._original = None
+
+    def reset(self):
+        self.calls.clear()
+        self.documents.clear()
+        self.messages.clear()
+
+    async def request(self, method: str, data: dict, files: dict):
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        chat_id = int(data.get('chat_id') or 0)
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+        if method == 'getChat':
+            return {'id': chat_id, 'type': 'private', 'username': f"user{chat_id}", 'first_name': 'User'}
+        if method in ('answerCallbackQuery', 'deleteMessage', 'setWebhook', 'deleteWebhook'):
+            return True
+
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+        }
+        if method == 'sendDocument':
+            document = files.get('document')
+            filename = getattr(document, 'filename', None) or data.get('document')
+            self.documents.append(filename)
+            message['document'] = {'file_id': f"file-{message['message_id']}", 'file_unique_id': str(message['message_id']), 'file_name': filename}
+        else:
+            if method == 'sendMessage':
+                self.messages.append((chat_id, data.get('text'), time.perf_counter()))
+            message['text'] = data.get('text', '')
+        return message
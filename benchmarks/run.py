@@ -0,0 +1,287 @@
+# benchmarks/run.py
+"""
+Синтетический нагрузочный бенчмарк бота.
+
+Создаёт во временной папке набор данных заданного размера, запускает бота
+с FakeBot вместо сетевых запросов и прогоняет обновления через Dispatcher:
+
+    python benchmarks/run.py --users 5000 --log-lines 200000 --pool 3000
+    python benchmarks/run.py --scenarios get_key --concurrency 100 --baseline bench_old.json
+
+Для каждого сценария выводятся пропускная способность и задержки p50/p99,
+результаты сохраняются в JSON для сравнения запусков.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.dataset import build_dataset  # noqa: E402
+from benchmarks.fake_bot import FakeBot  # noqa: E402
+
+ADMIN_ID = 1
+SCENARIOS = ('get_key', 'stats', 'broadcast')
+
+GET_KEY_BUTTON = "🔑 Получить ключ"
+STATS_BUTTON = "📊 Статистика"
+BROADCAST_BUTTON = "📢 Отправить сообщение всем"
+BROADCAST_TEXT = "Benchmark broadcast"
+
+
+def percentile(values: list, p: float) -> float:
+    """
+    Процентиль по методу ближайшего ранга (values должен быть отсортирован).
+    """
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+def summarize(latencies: list, duration: float, **extra) -> dict:
+    latencies = sorted(latencies)
+    result = {
+        'requests': len(latencies),
+        'duration_s': round(duration, 4),
+        'throughput_rps': round(len(latencies) / duration, 2) if duration > 0 else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+    result.update(extra)
+    return result
+
+
+class Updates:
+    """
+    Фабрика обновлений Telegram от имени пользователей.
+    """
+
+    def __init__(self):
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def message(self, user_id: int, text: str):
+        from aiogram import types
+
+        return types.Update.to_object({
+            'update_id': next(self._update_ids),
+            'message': {
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': 'User', 'username': f"user{user_id}"},
+                'text': text,
+            },
+        })
+
+
+async def drive(dp, updates: list, concurrency: int) -> tuple:
+    """
+    Обрабатывает обновления через Dispatcher не более чем по concurrency одновременно.
+    Возвращает (задержки обработки каждого обновления, общее время).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def process(update):
+        async with semaphore:
+            started_at = time.perf_counter()
+            await dp.process_update(update)
+            latencies.append(time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(process(update) for update in updates))
+    return latencies, time.perf_counter() - started_at
+
+
+async def scenario_get_key(ctx: dict, args) -> dict:
+    """
+    Параллельная выдача ключей случайным авторизованным пользователям.
+    Проверяет, что ни один ключ не выдан дважды.
+    """
+    main, fake, make = ctx['main'], ctx['fake'], ctx['updates']
+    import config
+    from utils import read_file, get_key_pool
+
+    rnd = random.Random(args.seed)
+    users = sorted(ctx['registry'].authorized)
+    pool_before = (await get_key_pool()).remaining
+    history = Counter(line.partition(':')[2] for line in await read_file(config.KEYS_ISSUED_FILE))
+
+    fake.reset()
+    updates = [make.message(rnd.choice(users), GET_KEY_BUTTON) for _ in range(args.requests)]
+    latencies, duration = await drive(main.dp, updates, args.concurrency)
+
+    sent = Counter(fake.documents)
+    issued = Counter(line.partition(':')[2] for line in await read_file(config.KEYS_ISSUED_FILE))
+    issued.subtract(history)
+    issued = +issued
+    duplicates = sorted(name for name in sent.keys() | issued.keys() if sent[name] > 1 or issued[name] > 1 or name in history)
+    assert not duplicates, f"Ключи выданы повторно: {duplicates[:10]}"
+    assert sorted(sent) == sorted(issued), "Отправленные ключи не совпадают с записанными в keys_issued.txt"
+    pool_after = (await get_key_pool()).remaining
+    assert pool_before - pool_after == len(sent), "Очередь ключей уменьшилась не на число выданных ключей"
+    return summarize(latencies, duration, keys_issued=len(sent), pool_left=pool_after, duplicates=0)
+
+
+async def scenario_stats(ctx: dict, args) -> dict:
+    """
+    Повторные запросы статистики администратором (первый запрос заполняет кэш профилей).
+    """
+    main, make = ctx['main'], ctx['updates']
+    runs = max(1, args.requests // 10)
+    updates = [make.message(ADMIN_ID, STATS_BUTTON) for _ in range(runs)]
+    latencies, duration = await drive(main.dp, updates, 1)
+    return summarize(latencies, duration, first_ms=round(latencies[0] * 1000, 3))
+
+
+async def scenario_broadcast(ctx: dict, args) -> dict:
+    """
+    Рассылка всем авторизованным пользователям. Задержка — время от запуска
+    рассылки до отправки сообщения каждому получателю.
+    """
+    main, fake, make = ctx['main'], ctx['fake'], ctx['updates']
+    from handlers import broadcast_engine
+
+    await drive(main.dp, [make.message(ADMIN_ID, BROADCAST_BUTTON)], 1)
+    fake.reset()
+    started_at = time.perf_counter()
+    await drive(main.dp, [make.message(ADMIN_ID, BROADCAST_TEXT)], 1)
+    while broadcast_engine.is_running:
+        await asyncio.sleep(0.01)
+    duration = time.perf_counter() - started_at
+    # Сообщение о прогрессе и ответ администратору в задержки доставки не входят
+    latencies = [sent_at - started_at for _, text, sent_at in fake.messages if text == BROADCAST_TEXT]
+    return summarize(latencies, duration, recipients=len(broadcast_engine.state['recipients']))
+
+
+async def run_benchmarks(args, dataset: dict) -> dict:
+    from aiogram import Bot, Dispatcher
+    import main
+    import utils
+
+    fake = FakeBot(args.latency)
+    fake.install()
+    Bot.set_current(main.bot)
+    Dispatcher.set_current(main.dp)
+
+    if utils.sqlite_storage is not None:
+        await asyncio.to_thread(utils.sqlite_storage.migrate_from_files)
+
+    startup_started_at = time.perf_counter()
+    await main.on_startup(main.dp)
+    results = {'startup_s': round(time.perf_counter() - startup_started_at, 4)}
+
+    ctx = {'main': main, 'fake': fake, 'updates': Updates(), 'registry': await utils.get_user_registry()}
+    scenarios = {'get_key': scenario_get_key, 'stats': scenario_stats, 'broadcast': scenario_broadcast}
+    try:
+        for name in args.scenarios:
+            print(f"▶ {name}...", flush=True)
+            results[name] = await scenarios[name](ctx, args)
+            results[name]['telegram_calls'] = dict(fake.calls)
+    finally:
+        await main.on_shutdown(main.dp)
+        fake.uninstall()
+    return results
+
+
+def print_results(report: dict, baseline: dict = None):
+    print(f"\nСтарт бота: {report['results']['startup_s']} сек.")
+    header = f"{'сценарий':<12} {'запросов':>9} {'rps':>10} {'p50, мс':>10} {'p99, мс':>10}"
+    print(header)
+    for name in SCENARIOS:
+        result = report['results'].get(name)
+        if result is None:
+            continue
+        line = f"{name:<12} {result['requests']:>9} {result['throughput_rps']:>10} {result['p50_ms']:>10} {result['p99_ms']:>10}"
+        old = (baseline or {}).get('results', {}).get(name)
+        if old:
+            line += f"   (было: {old['throughput_rps']} rps, p99 {old['p99_ms']} мс)"
+        print(line)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Синтетический нагрузочный бенчмарк бота")
+    parser.add_argument('--users', type=int, default=1000, help="число пользователей")
+    parser.add_argument('--log-lines', type=int, default=10000, help="строк в keys_log.txt")
+    parser.add_argument('--pool', type=int, default=1000, help="ключей .conf в очереди")
+    parser.add_argument('--requests', type=int, default=500, help="запросов ключа (статистика — в 10 раз меньше)")
+    parser.add_argument('--concurrency', type=int, default=50, help="одновременно обрабатываемых обновлений")
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка ответа Telegram, сек")
+    parser.add_argument('--storage', choices=('files', 'sqlite'), default='files', help="STORAGE_BACKEND")
+    parser.add_argument('--fsm', choices=('sqlite', 'memory'), default='sqlite', help="FSM_STORAGE")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="файл с результатами (по умолчанию bench_ГГГГммдд_ЧЧММСС.json)")
+    parser.add_argument('--baseline', help="результаты прошлого запуска для сравнения")
+    parser.add_argument('--keep', action='store_true', help="не удалять папку с данными")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    output = os.path.abspath(args.output or f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    # Конфигурация бота читается при импорте, поэтому окружение и рабочая папка задаются заранее
+    work_dir = tempfile.mkdtemp(prefix='bot_bench_')
+    os.chdir(work_dir)
+    shutil.copy(os.path.join(ROOT_DIR, 'messages.json'), work_dir)
+    os.environ.update({
+        'API_TOKEN': '123456:BENCHMARK',
+        'AUTHORIZED_USER_ID': str(ADMIN_ID),
+        'ADMIN_USERNAME': 'admin',
+        'BOT_MODE': 'polling',
+        'STORAGE_BACKEND': args.storage,
+        'FSM_STORAGE': args.fsm,
+        'METRICS_PORT': '0',
+        'STAGING_CHAT_ID': '',
+        'BROADCAST_RATE': '1000000',
+        'BROADCAST_CONCURRENCY': str(args.concurrency),
+        'BROADCAST_PROGRESS_INTERVAL': '3600',
+        'THROTTLE_GET_KEY': '1000000/1',
+    })
+
+    dataset = build_dataset(os.path.join(work_dir, 'data'), args.users, args.log_lines, args.pool, seed=args.seed)
+    try:
+        results = asyncio.run(run_benchmarks(args, dataset))
+    finally:
+        os.chdir(ROOT_DIR)
+        if args.keep:
+            print(f"Данные бенчмарка: {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'params': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'keep')},
+        'dataset': dataset,
+        'results': results,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_results(report, baseline)
+    print(f"\nРезультаты сохранены: {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+# broadcast.py
+
+import asyncio
+import json
+import logging
+import os
+import time
+
+from aiogram import Bot
+from aiogram.types import ParseMode
+from aiogram.utils.exceptions import RetryAfter, NetworkError, TelegramAPIError
+
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+MAX_SEND_ATTEMPTS = 5
+
+
+class BroadcastEngine:
+    """
+    Рассылка сообщения всем пользователям.
+    Сообщения отправляются параллельно несколькими воркерами в пределах
+    глобального лимита Telegram (каждому получателю уходит одно сообщение,
+    поэтому лимит на чат соблюдается автоматически). RetryAfter приостанавливает
+    все воркеры на указанное время. Прогресс периодически сохраняется в файл,
+    поэтому прерванная рассылка продолжается после перезапуска, а администратору
+    обновляется сообщение с прогрессом.
+    """
+
+    def __init__(self, state_path: str, rate: float, concurrency: int, progress_interval: float):
+        self.state_path = state_path
+        self.rate = rate
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval
+        self.state = None
+        self._task = None
+        self._limiter = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # Сохранение прогресса
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return None
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Не удалось прочитать состояние рассылки {self.state_path}: {e}")
+            return None
+
+    def _save_state(self, state: dict):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def _snapshot(self) -> dict:
+        state = dict(self.state)
+        state['ahead'] = sorted(self.state['ahead'])
+        return state
+
+    async def _persist(self):
+        await asyncio.to_thread(self._save_state, self._snapshot())
+
+    def _mark_done(self, index: int, delivered: bool):
+        """
+        Отмечает получателя обработанным и сдвигает курсор:
+        все получатели до cursor обработаны, ahead — обработанные после курсора.
+        """
+        state = self.state
+        if delivered:
+            state['sent'] += 1
+        else:
+            state['failed'] += 1
+        state['ahead'].add(index)
+        while state['cursor'] in state['ahead']:
+            state['ahead'].discard(state['cursor'])
+            state['cursor'] += 1
+
+    # Запуск
+
+    async def start(self, bot: Bot, admin_chat_id: int, text: str, recipients: list) -> bool:
+        """
+        Запускает новую рассылку. Возвращает False, если предыдущая ещё не завершена.
+        """
+        if self.is_running:
+            return False
+        recipients = list(dict.fromkeys(recipients))
+        progress_message = await bot.send_message(admin_chat_id, self._progress_text(0, 0, 0, len(recipients)))
+        self.state = {
+            'text': text,
+            'admin_chat_id': admin_chat_id,
+            'progress_message_id': progress_message.message_id,
+            'recipients': recipients,
+            'cursor': 0,
+            'ahead': set(),
+            'sent': 0,
+            'failed': 0,
+            'started_at': time.time(),
+        }
+        await self._persist()
+        self._task = asyncio.create_task(self._run(bot))
+        return True
+
+    async def resume(self, bot: Bot) -> bool:
+        """
+        Продолжает рассылку, прерванную остановкой бота.
+        """
+        if self.is_running:
+            return False
+        state = await asyncio.to_thread(self._load_state)
+        if not state:
+            return False
+        state['ahead'] = set(state.get('ahead', []))
+        self.state = state
+        logger.info(f"Продолжаем рассылку с позиции {state['cursor']} из {len(state['recipients'])}")
+        self._task = asyncio.create_task(self._run(bot))
+        return True
+
+    async def stop(self):
+        """
+        Останавливает рассылку и сохраняет прогресс для продолжения после перезапуска.
+        """
+        if not self.is_running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        await self._persist()
+
+    # Отправка
+
+    async def _run(self, bot: Bot):
+        state = self.state
+        self._limiter = TokenBucket(self.rate, self.rate)
+        queue = asyncio.Queue()
+        for index in range(state['cursor'], len(state['recipients'])):
+            if index not in state['ahead']:
+                queue.put_nowait(index)
+
+        workers = [asyncio.create_task(self._worker(bot, queue)) for _ in range(self.concurrency)]
+        reporter = asyncio.create_task(self._report_progress(bot))
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            reporter.cancel()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(reporter, *workers, return_exceptions=True)
+
+        await self._edit_progress(bot, final=True)
+        logger.info(f"Рассылка завершена: доставлено {state['sent']}, ошибок {state['failed']}")
+        await asyncio.to_thread(self._clear_state)
+
+    def _clear_state(self):
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+    async def _worker(self, bot: Bot, queue: asyncio.Queue):
+        while True:
+            try:
+                index = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            chat_id = self.state['recipients'][index]
+            delivered = await self._send(bot, chat_id)
+            self._mark_done(index, delivered)
+
+    async def _send(self, bot: Bot, chat_id: int) -> bool:
+        for attempt in range(MAX_SEND_ATTEMPTS):
+            await self._limiter.acquire()
+            try:
+                await bot.send_message(chat_id, self.state['text'], parse_mode=ParseMode.HTML)
+                return True
+            except RetryAfter as e:
+                logger.warning(f"Рассылка: флуд-контроль, пауза {e.timeout} сек.")
+                self._limiter.pause(e.timeout)
+            except (NetworkError, asyncio.TimeoutError) as e:
+                delay = 2 ** attempt
+                logger.warning(f"Рассылка: сетевая ошибка для {chat_id}: {e}, повтор через {delay} сек.")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                logger.error(f"Ошибка при отправке сообщения пользователю {chat_id}: {e}")
+                return False
+        logger.error(f"Ошибка при отправке сообщения пользователю {chat_id}: превышено число попыток")
+        return False
+
+    # Прогресс
+
+    @staticmethod
+    def _progress_text(done: int, sent: int, failed: int, total: int) -> str:
+        return (
+            f"📢 Рассылка: {done}/{total}\n"
+            f"✅ Доставлено: {sent}\n"
+            f"❌ Ошибок: {failed}"
+        )
+
+    async def _edit_progress(self, bot: Bot, final: bool = False):
+        state = self.state
+        total = len(state['recipients'])
+        text = self._progress_text(state['sent'] + state['failed'], state['sent'], state['failed'], total)
+        if final:
+            text = f"{text}\n\n🏁 Рассылка завершена."
+        try:
+            await bot.edit_message_text(text, state['admin_chat_id'], state['progress_message_id'])
+        except TelegramAPIError as e:
+            logger.debug(f"Не удалось обновить прогресс рассылки: {e}")
+
+    async def _report_progress(self, bot: Bot):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            await self._persist()
+            await self._edit_progress(bot)
@@ -15,9 +15,23 @@ API_TOKEN = get_env_variable("API_TOKEN")
 AUTHORIZED_USER_ID = int(get_env_variable("AUTHORIZED_USER_ID"))
 ADMIN_USERNAME = get_env_variable("ADMIN_USERNAME")
 
+# Адрес Bot API (например, локальный telegram-bot-api или тестовый сервер); по умолчанию api.telegram.org
+TELEGRAM_API_SERVER = get_env_variable("TELEGRAM_API_SERVER", required=False)
+
+# Режим получения обновлений: "polling" (по умолчанию) или "webhook"
+BOT_MODE = (get_env_variable("BOT_MODE", required=False) or "polling").lower()
+WEBHOOK_HOST = get_env_variable("WEBHOOK_HOST", required=False) or "0.0.0.0"
+WEBHOOK_PORT = int(get_env_variable("WEBHOOK_PORT", required=False) or 8080)
+WEBHOOK_PATH = get_env_variable("WEBHOOK_PATH", required=False) or "/webhook"
+# Публичный адрес бота (например, за обратным прокси); если задан, вебхук регистрируется при старте
+WEBHOOK_URL = get_env_variable("WEBHOOK_URL", required=False)
+WEBHOOK_SECRET = get_env_variable("WEBHOOK_SECRET", required=BOT_MODE == "webhook")
+
 # Пути к файлам данных
 DATA_DIR = os.path.join(os.getcwd(), 'data')
 CONFIGS_DIR = os.path.join(DATA_DIR, 'configs')  # Путь к папке configs
+CLAIMED_CONFIGS_DIR = os.path.join(CONFIGS_DIR, 'claimed')  # Ключи в процессе выдачи
+STAGED_FILE_IDS_FILE = os.path.join(CONFIGS_DIR, 'staged_file_ids.json')  # file_id заранее загруженных ключей
 USERS_DIR = os.path.join(DATA_DIR, 'users')      # Путь к папке users
 
 AUTHORIZED_USERS_FILE = os.path.join(USERS_DIR, 'authorized_users.txt')
@@ -29,8 +43,61 @@ SITE_EXCEPTIONS_FILE = os.path.join(USERS_DIR, 'exceptions.txt')
 KEY_LIMIT_FILE = os.path.join(USERS_DIR, 'key_limit.txt')
 USER_LIMITS_FILE = os.path.join(USERS_DIR, 'user_limits.txt')
 
+# Уплотнение журнала выдачи: снимок, архив сегментов и порог размера живого журнала
+KEYS_LOG_COMPACTING_FILE = os.path.join(USERS_DIR, 'keys_log.compacting')
+KEYS_LOG_SNAPSHOT_FILE = os.path.join(USERS_DIR, 'keys_log_snapshot.json')
+KEYS_LOG_ARCHIVE_DIR = os.path.join(USERS_DIR, 'keys_log_archive')
+KEYS_LOG_MAX_BYTES = int(get_env_variable("KEYS_LOG_MAX_BYTES", required=False) or 1024 * 1024)
+KEYS_LOG_COMPACT_INTERVAL = int(get_env_variable("KEYS_LOG_COMPACT_INTERVAL", required=False) or 600)
+
 # Дополнительные файлы для подсчёта ключей
 USER_KEYS_COUNT_FILE = os.path.join(USERS_DIR, 'user_keys_count.txt')
 
+# Хранилище данных: "files" (текстовые файлы) или "sqlite"
+STORAGE_BACKEND = (get_env_variable("STORAGE_BACKEND", required=False) or "files").lower()
+SQLITE_DB_FILE = os.path.join(USERS_DIR, 'bot.db')
+
+# Хранилище состояний диалогов (FSM): "sqlite" (по умолчанию, переживает перезапуск) или "memory"
+FSM_STORAGE = (get_env_variable("FSM_STORAGE", required=False) or "sqlite").lower()
+FSM_DB_FILE = os.path.join(USERS_DIR, 'fsm.db')
+FSM_CACHE_SIZE = int(get_env_variable("FSM_CACHE_SIZE", required=False) or 1000)
+# Незавершённые диалоги удаляются через FSM_STATE_TTL сек (если для состояния не задан свой TTL), проверка каждые FSM_SWEEP_INTERVAL сек
+FSM_STATE_TTL = int(get_env_variable("FSM_STATE_TTL", required=False) or 3600)
+FSM_SWEEP_INTERVAL = int(get_env_variable("FSM_SWEEP_INTERVAL", required=False) or 60)
+
+# Групповая запись в файлы: окно фиксации (в секундах) и fsync после каждой записи
+JOURNAL_COMMIT_INTERVAL = float(get_env_variable("JOURNAL_COMMIT_INTERVAL", required=False) or 0.05)
+JOURNAL_FSYNC = (get_env_variable("JOURNAL_FSYNC", required=False) or "0").lower() in ("1", "true", "yes")
+
+# Кэш профилей пользователей (bot.get_chat): время жизни (сек), размер и число параллельных запросов
+PROFILE_CACHE_TTL = int(get_env_variable("PROFILE_CACHE_TTL", required=False) or 3600)
+PROFILE_CACHE_SIZE = int(get_env_variable("PROFILE_CACHE_SIZE", required=False) or 10000)
+PROFILE_FETCH_CONCURRENCY = int(get_env_variable("PROFILE_FETCH_CONCURRENCY", required=False) or 10)
+
+# Рассылка: сообщений в секунду, число параллельных отправок, период обновления прогресса (сек)
+BROADCAST_RATE = float(get_env_variable("BROADCAST_RATE", required=False) or 25)
+BROADCAST_CONCURRENCY = int(get_env_variable("BROADCAST_CONCURRENCY", required=False) or 10)
+BROADCAST_PROGRESS_INTERVAL = float(get_env_variable("BROADCAST_PROGRESS_INTERVAL", required=False) or 5)
+BROADCAST_STATE_FILE = os.path.join(USERS_DIR, 'broadcast_state.json')
+
+# Предзагрузка ключей в служебный чат (опционально): ID чата, загрузок в секунду, период проверки (сек)
+STAGING_CHAT_ID = get_env_variable("STAGING_CHAT_ID", required=False)
+STAGING_CHAT_ID = int(STAGING_CHAT_ID) if STAGING_CHAT_ID else None
+STAGING_RATE = float(get_env_variable("STAGING_RATE", required=False) or 1)
+STAGING_INTERVAL = float(get_env_variable("STAGING_INTERVAL", required=False) or 60)
+
+# Ограничение частоты действий для каждого пользователя: "N/сек" — не более N за указанное число секунд
+THROTTLE_GET_KEY = get_env_variable("THROTTLE_GET_KEY", required=False) or "3/60"
+THROTTLE_ACCESS_REQUEST = get_env_variable("THROTTLE_ACCESS_REQUEST", required=False) or "1/300"
+THROTTLE_WISHES = get_env_variable("THROTTLE_WISHES", required=False) or "3/600"
+THROTTLE_SUPPORT = get_env_variable("THROTTLE_SUPPORT", required=False) or "3/600"
+
+# Метрики в формате Prometheus: адрес и порт HTTP-сервера (пустой порт — сервер не запускается)
+METRICS_HOST = get_env_variable("METRICS_HOST", required=False) or "127.0.0.1"
+METRICS_PORT = int(get_env_variable("METRICS_PORT", required=False) or 0)
+
+# Прогрев при старте: если загрузка индексов заняла больше STARTUP_BUDGET сек, бот не запускается (0 — без ограничения)
+STARTUP_BUDGET = float(get_env_variable("STARTUP_BUDGET", required=False) or 0)
+
 # Путь к Docker Compose файлу (опционально)
 DOCKER_COMPOSE_FILE = os.path.expanduser('~/antizapret/docker-compose.yml')
\ No newline at end of file
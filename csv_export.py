@@ -0,0 +1,51 @@
+# csv_export.py
+
+import csv
+import gzip
+import os
+import tempfile
+
+USERS_HEADER = ('user_id', 'status', 'key_limit', 'keys_count', 'key_files')
+ISSUANCES_HEADER = ('issued_at', 'username', 'user_id', 'key_filename')
+
+
+def _open_csv(file_path: str, compress: bool):
+    if compress:
+        return gzip.open(file_path, 'wt', encoding='utf-8', newline='')
+    return open(file_path, 'w', encoding='utf-8', newline='')
+
+
+def write_csv(rows, header: tuple, compress: bool = False) -> str:
+    """
+    Записывает строки во временный CSV-файл (при compress — сжатый gzip) и возвращает его путь.
+    rows может быть генератором: строки записываются по одной и в памяти не накапливаются.
+    Удалять файл после отправки должен вызывающий.
+    """
+    fd, file_path = tempfile.mkstemp(prefix='export_', suffix='.csv.gz' if compress else '.csv')
+    os.close(fd)
+    try:
+        with _open_csv(file_path, compress) as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+    except BaseException:
+        os.remove(file_path)
+        raise
+    return file_path
+
+
+def iter_user_rows(user_ids: set, authorized: set, banned: set, quota_index, key_files: dict):
+    """
+    Строки выгрузки пользователей по возрастанию ID: статус, лимит, число выданных ключей и их имена.
+    key_files: {user_id: [имя файла, ...]} в порядке выдачи.
+    """
+    for user_id in sorted(user_ids):
+        if user_id in banned:
+            status = 'banned'
+        elif user_id in authorized:
+            status = 'authorized'
+        else:
+            status = 'removed'  # ключи выдавались, но пользователь больше не в списках
+        files = key_files.get(user_id, [])
+        yield user_id, status, quota_index.limit_for(user_id), len(files), ' '.join(files)
+
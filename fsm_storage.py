@@ -0,0 +1,359 @@
+# fsm_storage.py
+
+import asyncio
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.dispatcher.storage import BaseStorage
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    chat TEXT NOT NULL,
+    user TEXT NOT NULL,
+    state TEXT,
+    data TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    updated_at REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (chat, user)
+);
+"""
+
+
+def _empty_record() -> dict:
+    return {'state': None, 'data': {}, 'bucket': {}}
+
+
+class SQLiteFSMStorage(BaseStorage):
+    """
+    Хранилище состояний FSM в SQLite (режим WAL).
+    Состояния и данные диалогов переживают перезапуск бота, а база может
+    использоваться несколькими процессами на одном хосте. Недавно
+    использованные записи держатся в кэше; если базу изменил другой процесс
+    (PRAGMA data_version), кэш сбрасывается. Все обращения к базе выполняются
+    в отдельном потоке, чтобы не блокировать цикл событий.
+    """
+
+    def __init__(self, db_path: str, cache_size: int = 1000):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self._conn = None
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # (chat, user) -> запись {'state', 'data', 'bucket'}
+        self._data_version = None
+        self.live_entries = 0  # число записей по данным последней очистки
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(fsm)")}
+            if 'updated_at' not in columns:
+                conn.execute("ALTER TABLE fsm ADD COLUMN updated_at REAL NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_fsm_updated_at ON fsm (updated_at)")
+            self._conn = conn
+            logger.info(f"Открыто хранилище состояний FSM: {self.db_path}")
+        return self._conn
+
+    # Кэш
+
+    def _sync_cache(self, conn: sqlite3.Connection):
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            # Базу изменило другое соединение: закэшированные записи могли устареть
+            self._cache.clear()
+            self._data_version = version
+
+    def _remember(self, key: tuple, record: dict):
+        if self.cache_size <= 0:
+            return
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _load(self, conn: sqlite3.Connection, key: tuple) -> dict:
+        record = self._cache.get(key)
+        if record is not None:
+            self._cache.move_to_end(key)
+            return record
+        row = conn.execute("SELECT state, data, bucket FROM fsm WHERE chat = ? AND user = ?", key).fetchone()
+        if row:
+            record = {'state': row[0], 'data': json.loads(row[1]), 'bucket': json.loads(row[2])}
+        else:
+            record = _empty_record()
+        self._remember(key, record)
+        return record
+
+    # Синхронные операции (выполняются в потоке)
+
+    def _read_sync(self, key: tuple, field: str):
+        with self._lock:
+            conn = self._connect()
+            self._sync_cache(conn)
+            return copy.deepcopy(self._load(conn, key)[field])
+
+    def _modify_sync(self, key: tuple, modify):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._sync_cache(conn)
+                record = copy.deepcopy(self._load(conn, key))
+                modify(record)
+                if record == _empty_record():
+                    conn.execute("DELETE FROM fsm WHERE chat = ? AND user = ?", key)
+                else:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO fsm (chat, user, state, data, bucket, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (*key, record['state'], json.dumps(record['data'], ensure_ascii=False),
+                         json.dumps(record['bucket'], ensure_ascii=False), time.time())
+                    )
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            self._remember(key, record)
+
+    def _expire_sync(self, state_ttls: dict, default_ttl: float) -> int:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed = 0
+                for state, ttl in state_ttls.items():
+                    removed += conn.execute(
+                        "DELETE FROM fsm WHERE state = ? AND updated_at < ?", (state, now - ttl)
+                    ).rowcount
+                placeholders = ", ".join("?" for _ in state_ttls)
+                removed += conn.execute(
+                    f"DELETE FROM fsm WHERE (state IS NULL OR state NOT IN ({placeholders})) AND updated_at < ?",
+                    (*state_ttls, now - default_ttl)
+                ).rowcount
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            if removed:
+                self._cache.clear()
+            return removed
+
+    def _count_sync(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM fsm WHERE state IS NOT NULL OR data != '{}'").fetchone()[0]
+
+    def _close_sync(self):
+        with self._lock:
+            self._cache.clear()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # BaseStorage
+
+    def _key(self, chat, user) -> tuple:
+        chat, user = self.check_address(chat=chat, user=user)
+        return str(chat), str(user)
+
+    async def _read(self, chat, user, field: str):
+        return await asyncio.to_thread(self._read_sync, self._key(chat, user), field)
+
+    async def _modify(self, chat, user, modify):
+        await asyncio.to_thread(self._modify_sync, self._key(chat, user), modify)
+
+    async def expire(self, state_ttls: dict, default_ttl: float) -> int:
+        """
+        Удаляет записи, которые не менялись дольше TTL своего состояния.
+        Возвращает число удалённых записей.
+        """
+        return await asyncio.to_thread(self._expire_sync, state_ttls, default_ttl)
+
+    async def count_entries(self) -> int:
+        return await asyncio.to_thread(self._count_sync)
+
+    async def close(self):
+        await asyncio.to_thread(self._close_sync)
+
+    async def wait_closed(self):
+        pass
+
+    async def get_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        state = await self._read(chat, user, 'state')
+        return state if state is not None else self.resolve_state(default)
+
+    async def get_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> typing.Dict:
+        return await self._read(chat, user, 'data')
+
+    async def set_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.AnyStr = None):
+        state = self.resolve_state(state)
+
+        def modify(record):
+            record['state'] = state
+        await self._modify(chat, user, modify)
+
+    async def set_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        data = copy.deepcopy(data) if data else {}
+
+        def modify(record):
+            record['data'] = data
+        await self._modify(chat, user, modify)
+
+    async def update_data(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None, **kwargs):
+        data = copy.deepcopy(data) if data else {}
+
+        def modify(record):
+            record['data'].update(data, **kwargs)
+        await self._modify(chat, user, modify)
+
+    async def reset_state(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          with_data: typing.Optional[bool] = True):
+        def modify(record):
+            record['state'] = None
+            if with_data:
+                record['data'] = {}
+        await self._modify(chat, user, modify)
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> typing.Dict:
+        return await self._read(chat, user, 'bucket')
+
+    async def set_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         bucket: typing.Dict = None):
+        bucket = copy.deepcopy(bucket) if bucket else {}
+
+        def modify(record):
+            record['bucket'] = bucket
+        await self._modify(chat, user, modify)
+
+    async def update_bucket(self, *,
+                            chat: typing.Union[str, int, None] = None,
+                            user: typing.Union[str, int, None] = None,
+                            bucket: typing.Dict = None, **kwargs):
+        bucket = copy.deepcopy(bucket) if bucket else {}
+
+        def modify(record):
+            record['bucket'].update(bucket, **kwargs)
+        await self._modify(chat, user, modify)
+
+
+class ExpiringMemoryStorage(MemoryStorage):
+    """
+    MemoryStorage, запоминающий время последнего изменения каждой записи,
+    чтобы брошенные диалоги можно было удалить по TTL.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.touched = {}  # (chat, user) -> время последнего изменения
+        self.live_entries = 0  # число записей по данным последней очистки
+
+    def _touch(self, chat, user):
+        chat, user = map(str, self.check_address(chat=chat, user=user))
+        self.touched[(chat, user)] = time.monotonic()
+
+    async def set_state(self, *, chat=None, user=None, state=None):
+        await super().set_state(chat=chat, user=user, state=state)
+        self._touch(chat, user)
+
+    async def set_data(self, *, chat=None, user=None, data=None):
+        await super().set_data(chat=chat, user=user, data=data)
+        self._touch(chat, user)
+
+    async def update_data(self, *, chat=None, user=None, data=None, **kwargs):
+        await super().update_data(chat=chat, user=user, data=data, **kwargs)
+        self._touch(chat, user)
+
+    async def set_bucket(self, *, chat=None, user=None, bucket=None):
+        await super().set_bucket(chat=chat, user=user, bucket=bucket)
+        self._touch(chat, user)
+
+    async def update_bucket(self, *, chat=None, user=None, bucket=None, **kwargs):
+        await super().update_bucket(chat=chat, user=user, bucket=bucket, **kwargs)
+        self._touch(chat, user)
+
+    async def expire(self, state_ttls: dict, default_ttl: float) -> int:
+        """
+        Удаляет записи, которые не менялись дольше TTL своего состояния.
+        Пустые записи, которые MemoryStorage создаёт при каждом чтении, удаляются сразу.
+        """
+        now = time.monotonic()
+        removed = 0
+        for chat in list(self.data):
+            users = self.data[chat]
+            for user in list(users):
+                record = users[user]
+                touched_at = self.touched.get((chat, user))
+                if touched_at is None:
+                    touched_at = self.touched[(chat, user)] = now
+                empty = record == _empty_record()
+                ttl = state_ttls.get(record['state'], default_ttl)
+                if empty or now - touched_at > ttl:
+                    del users[user]
+                    self.touched.pop((chat, user), None)
+                    removed += not empty
+            if not users:
+                del self.data[chat]
+        for key in [key for key in self.touched if key[0] not in self.data or key[1] not in self.data[key[0]]]:
+            del self.touched[key]
+        return removed
+
+    async def count_entries(self) -> int:
+        # Записи без состояния и данных (пустые после finish() или только со счётчиками троттлинга) не считаются
+        return sum(
+            1 for users in self.data.values() for record in users.values()
+            if record['state'] is not None or record['data']
+        )
+
+
+async def fsm_expiry_worker(storage, state_ttls: dict, default_ttl: float, interval: float):
+    """
+    Фоновая задача: периодически удаляет брошенные диалоги и обновляет
+    storage.live_entries — число активных записей FSM.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await storage.expire(state_ttls, default_ttl)
+            storage.live_entries = await storage.count_entries()
+            if removed:
+                logger.info(f"Удалено устаревших состояний FSM: {removed}, активных: {storage.live_entries}")
+        except Exception as e:
+            logger.error(f"Ошибка при очистке состояний FSM: {e}")
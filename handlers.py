@@ -5,27 +5,36 @@ import os
 import asyncio
 import html
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import zipfile
 
 import aiofiles
 from aiogram import types, Dispatcher, Bot
 from aiogram.types import ParseMode, InputFile, ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.utils.exceptions import Unauthorized, CantParseEntities
+from aiogram.utils.exceptions import Unauthorized, CantParseEntities, RetryAfter, TelegramAPIError, MessageNotModified
 from aiogram.dispatcher import FSMContext
 
 from config import (
     AUTHORIZED_USERS_FILE,
     BANNED_USERS_FILE,
-    KEYS_ISSUED_FILE,
-    KEYS_LOG_FILE,
     SUPPORT_REQUESTS_FILE,
     SITE_EXCEPTIONS_FILE,
     CONFIGS_DIR,
     AUTHORIZED_USER_ID,
     ADMIN_USERNAME,
     USER_LIMITS_FILE,
-    KEY_LIMIT_FILE
+    KEY_LIMIT_FILE,
+    PROFILE_CACHE_TTL,
+    PROFILE_CACHE_SIZE,
+    PROFILE_FETCH_CONCURRENCY,
+    BROADCAST_RATE,
+    BROADCAST_CONCURRENCY,
+    BROADCAST_PROGRESS_INTERVAL,
+    BROADCAST_STATE_FILE,
+    THROTTLE_GET_KEY,
+    THROTTLE_ACCESS_REQUEST,
+    THROTTLE_WISHES,
+    THROTTLE_SUPPORT
 )
 
 from keyboards import (
@@ -33,7 +42,7 @@ from keyboards import (
     access_request_kb,
     create_authorize_kb,
     get_back_kb,
-    get_users_keyboard,
+    get_users_page_kb,
     get_user_actions_keyboard,
     get_stats_user_actions_keyboard
 )
@@ -46,33 +55,58 @@ from states import (
     UploadKeysForm,
     ManageUserForm,
     SupportReplyStates,
-    GlobalSettingsForm
+    GlobalSettingsForm,
+    SCREEN_USERS,
+    SCREEN_USER_ACTIONS,
+    SCREEN_STATS,
+    SCREEN_STATS_USER
 )
 
+from profile_cache import ProfileCache
+from broadcast import BroadcastEngine
+from router import Router, RouterMiddleware, IDLE, ANY
+from throttling import ThrottlingMiddleware, throttled, parse_rate_limit
+from metrics import MetricsMiddleware
+from profiler import Profiler
+
 from utils import (
-    read_file,
     append_to_file,
     remove_from_file,
     log_key_issuance,
     check_key_issued,
-    mark_key_issued,
-    get_conf_files,
     update_user_stats,
     load_user_stats,
     add_site_exceptions,
     extract_conf_files_from_zip,
     write_file,
-    get_user_limit,
     set_user_limit,
     get_global_limit,
     set_global_limit,
-    get_user_keys_count
+    get_user_keys_count,
+    get_user_registry,
+    get_quota_index,
+    get_user_key_files,
+    get_issuance_index,
+    get_key_pool,
+    get_recent_issuances,
+    export_users_csv,
+    export_issuances_csv,
+    get_issuance_rollups
 )
 
 logger = logging.getLogger(__name__)
 
 bot = None  # Будет установлен в main.py через set_bot_instance
 
+# Кэш профилей пользователей перед bot.get_chat
+profile_cache = ProfileCache(PROFILE_CACHE_TTL, PROFILE_CACHE_SIZE, PROFILE_FETCH_CONCURRENCY)
+
+# Рассылка сообщений всем пользователям
+broadcast_engine = BroadcastEngine(BROADCAST_STATE_FILE, BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_PROGRESS_INTERVAL)
+
+# Профилирование по команде администратора
+profiler = Profiler()
+
 def set_bot_instance(new_bot: Bot):
     global bot
     bot = new_bot
@@ -90,6 +124,18 @@ def load_messages(filepath='messages.json'):
 
 MESSAGES = load_messages()
 
+# Лимиты частоты дорогих действий на пользователя
+throttling = ThrottlingMiddleware(
+    {
+        'get_key': parse_rate_limit(THROTTLE_GET_KEY),
+        'access_request': parse_rate_limit(THROTTLE_ACCESS_REQUEST),
+        'wishes': parse_rate_limit(THROTTLE_WISHES),
+        'support': parse_rate_limit(THROTTLE_SUPPORT),
+    },
+    MESSAGES.get("throttled", "⏳ Слишком много запросов. Подождите немного и попробуйте снова."),
+    exempt={AUTHORIZED_USER_ID}
+)
+
 def format_user_display(user_obj, user_id, keys_count):
     """
     Форматирует отображение пользователя для списка.
@@ -114,13 +160,12 @@ def format_user_display(user_obj, user_id, keys_count):
 async def cmd_start(message: types.Message):
     user_id = message.from_user.id
     logger.info(f"Команда /start от {user_id}")
-    banned_users = await read_file(BANNED_USERS_FILE)
-    if str(user_id) in banned_users:
+    registry = await get_user_registry()
+    if registry.is_banned(user_id):
         await message.reply(MESSAGES.get("get_key_banned", "🚫 Вы забанены."), parse_mode=ParseMode.HTML)
         return
 
-    authorized_users = await read_file(AUTHORIZED_USERS_FILE)
-    if str(user_id) not in authorized_users and user_id != AUTHORIZED_USER_ID:
+    if not registry.is_authorized(user_id) and user_id != AUTHORIZED_USER_ID:
         await message.reply(MESSAGES.get("access_request", "🔒 Для доступа к VPN нажмите кнопку ниже."), reply_markup=access_request_kb(), parse_mode=ParseMode.HTML)
         return
 
@@ -128,6 +173,7 @@ async def cmd_start(message: types.Message):
     text = MESSAGES.get("welcome", "👋 Добро пожаловать! Выберите действие")
     await message.reply(text, reply_markup=main_menu_kb, parse_mode=ParseMode.HTML)
 
+@throttled('access_request')
 async def handle_access_request(call: types.CallbackQuery, state: FSMContext):
     user_id = call.from_user.id
     try:
@@ -171,14 +217,14 @@ async def handle_authorization_response(call: types.CallbackQuery, state: FSMCon
         return
 
     try:
-        user = await bot.get_chat(user_id)
+        user = await profile_cache.get(bot, user_id)
         keys_count = await get_user_keys_count(user_id)
         user_display = format_user_display(user, user_id, keys_count)
 
         if response == "yes":
             # Проверяем, не добавлен ли уже пользователь
-            authorized_users = await read_file(AUTHORIZED_USERS_FILE)
-            if str(user_id) not in authorized_users:
+            registry = await get_user_registry()
+            if not registry.is_authorized(user_id):
                 await append_to_file(AUTHORIZED_USERS_FILE, str(user_id))
             message_text = f"✅ {user_display}: доступ предоставлен"
             await call.message.edit_text(message_text, parse_mode=ParseMode.HTML)
@@ -190,8 +236,8 @@ async def handle_authorization_response(call: types.CallbackQuery, state: FSMCon
             )
         elif response == "no":
             # Проверяем, не добавлен ли уже пользователь в бан
-            banned_users = await read_file(BANNED_USERS_FILE)
-            if str(user_id) not in banned_users:
+            registry = await get_user_registry()
+            if not registry.is_banned(user_id):
                 await append_to_file(BANNED_USERS_FILE, str(user_id))
             message_text = f"❌ {user_display}: доступ отклонен"
             await call.message.edit_text(message_text, parse_mode=ParseMode.HTML)
@@ -217,6 +263,7 @@ async def process_wishes(message: types.Message, state: FSMContext):
     await WishesStates.waiting_for_text.set()
     await message.reply(MESSAGES.get("wishes_prompt", "📝 Напишите текст вашего пожелания или предложения:"), reply_markup=get_back_kb(), parse_mode=ParseMode.HTML)
 
+@throttled('wishes')
 async def process_wishes_text(message: types.Message, state: FSMContext):
     if message.text.strip().lower() == "🔙 назад":
         await state.finish()
@@ -254,6 +301,7 @@ async def process_operator(message: types.Message, state: FSMContext):
     await VPNSupportStates.next()
     await message.reply(MESSAGES.get("vpn_issue_prompt_description", "📝 Опишите вашу проблему:"), reply_markup=get_back_kb(), parse_mode=ParseMode.HTML)
 
+@throttled('support')
 async def process_description(message: types.Message, state: FSMContext):
     if message.text.strip().lower() == "🔙 назад":
         await state.finish()
@@ -269,7 +317,7 @@ async def process_description(message: types.Message, state: FSMContext):
     admin_id = AUTHORIZED_USER_ID
 
     try:
-        user = await bot.get_chat(user_id)
+        user = await profile_cache.get(bot, user_id)
         username = user.username if user.username else f"{user.first_name} {user.last_name}"
         message_text = (
             f"🆘 <b>Обращение в поддержку VPN</b>\n\n"
@@ -367,20 +415,18 @@ async def process_broadcast_message(message: types.Message, state: FSMContext):
         return
 
     broadcast_message = message.text.strip()
-    authorized_users = await read_file(AUTHORIZED_USERS_FILE)
-    authorized_users = [int(uid) for uid in authorized_users if uid.isdigit()]
+    registry = await get_user_registry()
+    authorized_users = sorted(registry.authorized)
     if AUTHORIZED_USER_ID not in authorized_users:
         authorized_users.append(AUTHORIZED_USER_ID)
 
-    count = 0
-    for uid in authorized_users:
-        try:
-            await bot.send_message(uid, broadcast_message, parse_mode=ParseMode.HTML)
-            count += 1
-        except Exception as e:
-            logger.error(f"Ошибка при отправке сообщения пользователю {uid}: {e}")
-
-    await message.reply(MESSAGES.get("broadcast_sent", "✅ Сообщение отправлено {count} пользователям.").format(count=count), reply_markup=get_main_menu_kb(message.from_user.id))
+    # Рассылка идёт в фоне, прогресс обновляется в отдельном сообщении
+    started = await broadcast_engine.start(bot, message.from_user.id, broadcast_message, authorized_users)
+    if started:
+        text = MESSAGES.get("broadcast_started", "📢 Рассылка запущена для {count} пользователей.").format(count=len(authorized_users))
+    else:
+        text = MESSAGES.get("broadcast_busy", "⏳ Предыдущая рассылка ещё не завершена.")
+    await message.reply(text, reply_markup=get_main_menu_kb(message.from_user.id))
     await state.finish()
 
 async def cmd_upload_keys(message: types.Message, state: FSMContext):
@@ -439,36 +485,44 @@ async def process_upload_keys(message: types.Message, state: FSMContext):
     else:
         await message.reply(MESSAGES.get("error_generic", "❌ Произошла ошибка."), reply_markup=get_back_kb())
 
+@throttled('get_key')
 async def cmd_get_key(message: types.Message):
     user_id = message.from_user.id
-    banned_users = await read_file(BANNED_USERS_FILE)
-    if str(user_id) in banned_users:
+    registry = await get_user_registry()
+    if registry.is_banned(user_id):
         await message.reply(MESSAGES.get("get_key_banned", "🚫 Вы забанены и не можете использовать этого бота."), parse_mode=ParseMode.HTML)
         return
 
-    authorized_users = await read_file(AUTHORIZED_USERS_FILE)
-    if str(user_id) not in authorized_users and user_id != AUTHORIZED_USER_ID:
+    if not registry.is_authorized(user_id) and user_id != AUTHORIZED_USER_ID:
         await message.reply(MESSAGES.get("get_key_not_authorized", "🔒 Вы не авторизованы для использования этого бота."), parse_mode=ParseMode.HTML)
         return
 
-    # Проверка лимита ключей
-    user_limit = await get_user_limit(user_id)
-    issued_keys = await read_file(KEYS_ISSUED_FILE)
-    user_keys = [line for line in issued_keys if line.startswith(f"{user_id}:")]
-    if len(user_keys) >= user_limit and user_id != AUTHORIZED_USER_ID:
+    # Проверка лимита ключей: резервируем выдачу, чтобы параллельные запросы не превысили лимит
+    quota = await get_quota_index()
+    first_key = quota.issued_count(user_id) == 0
+    if not quota.try_acquire(user_id, unlimited=user_id == AUTHORIZED_USER_ID):
         await message.reply(MESSAGES.get("get_key_limit_reached", "🔒 Вы достигли максимального лимита ключей. Пожалуйста, свяжитесь с поддержкой для увеличения лимита."), parse_mode=ParseMode.HTML)
         return
 
-    conf_files = await get_conf_files()
-    if not conf_files:
+    try:
+        await send_next_key(message, user_id, first_key)
+    finally:
+        quota.release(user_id)
+
+async def send_next_key(message: types.Message, user_id: int, first_key: bool):
+    """
+    Отправляет пользователю следующий свободный ключ и фиксирует выдачу.
+    """
+    pool = await get_key_pool()
+    next_file = pool.claim()
+    if next_file is None:
         await message.reply("❌ Все файлы были отправлены")
         return
 
-    next_file = conf_files[0]
-    file_path = os.path.join(CONFIGS_DIR, next_file)
+    file_path = pool.claimed_path(next_file)
+    sent = False
 
     try:
-        first_key = not any(line.startswith(f"{user_id}:") for line in issued_keys)
         instruction_message = ""
         if first_key:
             instruction_message = (
@@ -477,30 +531,32 @@ async def cmd_get_key(message: types.Message):
                 "- Нажмите кнопку <b>Получить ключ</b> и добавьте файл `.conf` в приложение WireGuard или AmneziaVPN\n"
             )
 
-        if not os.path.exists(file_path):
-            await message.reply("❌ Файл не найден. Пожалуйста, попробуйте позже")
-            return
-
-        if first_key:
-            await message.reply_document(
-                InputFile(file_path),
-                caption=instruction_message,
-                parse_mode=ParseMode.HTML
-            )
-        else:
-            await message.reply_document(InputFile(file_path))
+        caption_kwargs = {'caption': instruction_message, 'parse_mode': ParseMode.HTML} if first_key else {}
+        # Предзагруженный ключ отправляем по file_id, без повторной загрузки файла
+        file_id = pool.file_id(next_file)
+        if file_id:
+            try:
+                await message.reply_document(file_id, **caption_kwargs)
+                sent = True
+            except RetryAfter:
+                raise
+            except TelegramAPIError as e:
+                logger.warning(f"Не удалось отправить ключ {next_file} по file_id: {e}")
+        if not sent:
+            await message.reply_document(InputFile(file_path), **caption_kwargs)
+            sent = True
 
         try:
-            user = await bot.get_chat(user_id)
+            user = await profile_cache.get(bot, user_id)
             username = user.username if user.username else f"{user.first_name} {user.last_name}"
         except:
             username = f"ID: {user_id}"
 
+        # log_key_issuance записывает ключ и в keys_log.txt, и в keys_issued.txt
         await log_key_issuance(user_id, username, next_file)
-        await mark_key_issued(user_id, next_file)
         await update_user_stats(user_id)
 
-        os.remove(file_path)
+        pool.complete(next_file)
 
         confirmation_message = MESSAGES.get("get_key_sent", "🔑 Ключ успешно отправлен\n\n👋 Выберите действие:")
         if first_key:
@@ -508,6 +564,11 @@ async def cmd_get_key(message: types.Message):
         await message.reply(f"{confirmation_message}", reply_markup=get_main_menu_kb(user_id), parse_mode=ParseMode.HTML)
     except Exception as e:
         logger.error(f"Ошибка при отправке файла {next_file}: {e}")
+        # Отправленный ключ повторно не выдаём, неотправленный возвращаем в очередь
+        if sent:
+            pool.complete(next_file)
+        else:
+            pool.release(next_file)
         await message.reply(MESSAGES.get("error_generic", "❌ Произошла ошибка."))
 
 async def cmd_add_site(message: types.Message, state: FSMContext):
@@ -546,66 +607,9 @@ async def cmd_users(message: types.Message, state: FSMContext):
         await message.reply(MESSAGES.get("access_denied", "🚫 У вас нет прав для выполнения этого действия."), parse_mode=ParseMode.HTML)
         return
 
-    authorized_users = await read_file(AUTHORIZED_USERS_FILE)
-    banned_users = await read_file(BANNED_USERS_FILE)
-
-    # Сформируем списки пользователей
-    user_list = []
-    # Авторизованные пользователи
-    for uid_str in authorized_users:
-        if not uid_str.isdigit():
-            continue
-        uid = int(uid_str)
-        try:
-            user_obj = await bot.get_chat(uid)
-            keys_count = await get_user_keys_count(uid)
-            user_display = user_obj.username if user_obj.username else f"{user_obj.first_name or ''} {user_obj.last_name or ''}".strip() or "Имя не указано"
-            user_list.append((user_display, uid))
-        except Exception as e:
-            logger.error(f"Ошибка получения информации о пользователе {uid}: {e}")
-            user_list.append(("Имя не указано", uid))
-
-    # Забаненные пользователи
-    for uid_str in banned_users:
-        if not uid_str.isdigit():
-            continue
-        uid = int(uid_str)
-        try:
-            user_obj = await bot.get_chat(uid)
-            keys_count = await get_user_keys_count(uid)
-            user_display = user_obj.username if user_obj.username else f"{user_obj.first_name or ''} {user_obj.last_name or ''}".strip() or "Имя не указано"
-            user_list.append((user_display, uid))
-        except Exception as e:
-            logger.error(f"Ошибка получения информации о пользователе {uid}: {e}")
-            user_list.append(("Имя не указано", uid))
-
-    # Сформируем текст списка пользователей
-    text = "👥 **Авторизованные пользователи:**\n"
-    authorized_users_display = []
-    for user_display, uid in user_list:
-        if uid in map(int, authorized_users):
-            keys_count = await get_user_keys_count(uid)
-            authorized_users_display.append(f"{user_display} (ID: {uid}) - {keys_count} ключей")
-    if authorized_users_display:
-        text += "\n".join(authorized_users_display)
-    else:
-        text += "Нет авторизованных пользователей."
-
-    text += "\n\n🚫 **Забаненные пользователи:**\n"
-    banned_users_display = []
-    for user_display, uid in user_list:
-        if uid in map(int, banned_users):
-            keys_count = await get_user_keys_count(uid)
-            banned_users_display.append(f"{user_display} (ID: {uid}) - {keys_count} ключей")
-    if banned_users_display:
-        text += "\n".join(banned_users_display)
-    else:
-        text += "Нет забаненных пользователей."
-
-    # Клавиатура с кнопками для каждого пользователя
-    users_keyboard = get_users_keyboard(user_list)
-
-    await message.reply(text, parse_mode=ParseMode.MARKDOWN, disable_web_page_preview=True, reply_markup=users_keyboard)
+    text, users_keyboard = await render_users_page(VIEW_USERS)
+    await state.update_data(screen=SCREEN_USERS)
+    await message.reply(text, parse_mode=ParseMode.HTML, disable_web_page_preview=True, reply_markup=users_keyboard)
 
 async def handle_user_selection(message: types.Message, state: FSMContext):
     """
@@ -626,20 +630,25 @@ async def handle_user_selection(message: types.Message, state: FSMContext):
         await message.reply("❌ Не удалось определить пользователя. Попробуйте снова.", reply_markup=get_back_kb())
         return
 
+    await show_user_actions(message, state, user_id)
+
+async def show_user_actions(message: types.Message, state: FSMContext, user_id: int):
+    """
+    Показывает меню действий для выбранного пользователя.
+    """
     # Сохраняем выбранный user_id в состоянии
-    await state.update_data(selected_user_id=user_id)
+    await state.update_data(selected_user_id=user_id, screen=SCREEN_USER_ACTIONS)
 
     # Проверяем, забанен ли пользователь
-    banned_users = await read_file(BANNED_USERS_FILE)
-    is_banned = str(user_id) in banned_users
+    registry = await get_user_registry()
+    is_banned = registry.is_banned(user_id)
 
     # Создаём клавиатуру с действиями
     actions_keyboard = get_user_actions_keyboard(is_banned)
 
     # Отправляем меню действий
     try:
-        user_obj = await bot.get_chat(user_id)
-        user_display = user_obj.username if user_obj.username else f"{user_obj.first_name or ''} {user_obj.last_name or ''}".strip() or "Имя не указано"
+        user_display = _user_display(await profile_cache.get(bot, user_id))
     except Exception as e:
         logger.error(f"Ошибка получения информации о пользователе {user_id}: {e}")
         user_display = "Имя не указано"
@@ -666,9 +675,9 @@ async def handle_user_action(message: types.Message, state: FSMContext):
         await message.reply(MESSAGES.get("welcome", "👋 Добро пожаловать! Выберите действие"), reply_markup=get_main_menu_kb(user_id))
         return
 
+    registry = await get_user_registry()
     if action == "Забанить":
-        authorized_users = await read_file(AUTHORIZED_USERS_FILE)
-        if str(user_id) not in authorized_users:
+        if not registry.is_authorized(user_id):
             await append_to_file(BANNED_USERS_FILE, str(user_id))
             await message.reply("✅ Пользователь забанен.", reply_markup=get_user_actions_keyboard(True))
             logger.info(f"Пользователь {user_id} был забанен")
@@ -689,9 +698,10 @@ async def set_user_limit_value(message: types.Message, state: FSMContext):
     Обработчик установки нового лимита для пользователя.
     """
     if message.text.strip().lower() == "🔙 назад":
-        await state.finish()
+        # Данные с выбранным пользователем сохраняем: возвращаемся к действиям с ним
+        await state.reset_state(with_data=False)
         user_id = (await state.get_data()).get('selected_user_id')
-        is_banned = str(user_id) in await read_file(BANNED_USERS_FILE)
+        is_banned = (await get_user_registry()).is_banned(user_id)
         await message.reply("🔙 Отменено.", reply_markup=get_user_actions_keyboard(is_banned))
         return
 
@@ -711,80 +721,19 @@ async def set_user_limit_value(message: types.Message, state: FSMContext):
         return
 
     await set_user_limit(user_id, new_limit)
-    await message.reply(f"✅ Лимит ключей для пользователя {user_id} установлен на {new_limit}.", reply_markup=get_user_actions_keyboard(str(user_id) in await read_file(BANNED_USERS_FILE)))
+    await message.reply(f"✅ Лимит ключей для пользователя {user_id} установлен на {new_limit}.", reply_markup=get_user_actions_keyboard((await get_user_registry()).is_banned(user_id)))
 
     logger.info(f"Лимит ключей для пользователя {user_id} изменён на {new_limit}")
-    await state.finish()
+    await state.reset_state(with_data=False)
 
 async def cmd_stats(message: types.Message, state: FSMContext):
     if message.from_user.id != AUTHORIZED_USER_ID:
         await message.reply(MESSAGES.get("access_denied", "🚫 У вас нет прав для выполнения этого действия."), parse_mode=ParseMode.HTML)
         return
 
-    # Общее количество оставшихся ключей
-    conf_files = await get_conf_files()
-    remain = len(conf_files)
-
-    authorized_users = await read_file(AUTHORIZED_USERS_FILE)
-    banned_users = await read_file(BANNED_USERS_FILE)
-
-    # Сформируем списки пользователей
-    user_list = []
-    # Авторизованные пользователи
-    for uid_str in authorized_users:
-        if not uid_str.isdigit():
-            continue
-        uid = int(uid_str)
-        try:
-            user_obj = await bot.get_chat(uid)
-            keys_count = await get_user_keys_count(uid)
-            user_display = user_obj.username if user_obj.username else f"{user_obj.first_name or ''} {user_obj.last_name or ''}".strip() or "Имя не указано"
-            user_list.append((user_display, uid))
-        except Exception as e:
-            logger.error(f"Ошибка получения информации о пользователе {uid}: {e}")
-            user_list.append(("Имя не указано", uid))
-
-    # Забаненные пользователи
-    for uid_str in banned_users:
-        if not uid_str.isdigit():
-            continue
-        uid = int(uid_str)
-        try:
-            user_obj = await bot.get_chat(uid)
-            keys_count = await get_user_keys_count(uid)
-            user_display = user_obj.username if user_obj.username else f"{user_obj.first_name or ''} {user_obj.last_name or ''}".strip() or "Имя не указано"
-            user_list.append((user_display, uid))
-        except Exception as e:
-            logger.error(f"Ошибка получения информации о пользователе {uid}: {e}")
-            user_list.append(("Имя не указано", uid))
-
-    # Сформируем текст статистики
-    text = f"📊 **Статистика:**\n\n**Осталось ключей:** {remain}\n\n**Авторизованные пользователи:**\n"
-    authorized_users_display = []
-    for user_display, uid in user_list:
-        if uid in map(int, authorized_users):
-            keys_count = await get_user_keys_count(uid)
-            authorized_users_display.append(f"{user_display} (ID: {uid}) - {keys_count} ключей")
-    if authorized_users_display:
-        text += "\n".join(authorized_users_display)
-    else:
-        text += "Нет авторизованных пользователей."
-
-    text += "\n\n🚫 **Забаненные пользователи:**\n"
-    banned_users_display = []
-    for user_display, uid in user_list:
-        if uid in map(int, banned_users):
-            keys_count = await get_user_keys_count(uid)
-            banned_users_display.append(f"{user_display} (ID: {uid}) - {keys_count} ключей")
-    if banned_users_display:
-        text += "\n".join(banned_users_display)
-    else:
-        text += "Нет забаненных пользователей."
-
-    # Клавиатура с кнопками для каждого пользователя
-    stats_keyboard = get_users_keyboard(user_list)
-
-    await message.reply(text, parse_mode=ParseMode.MARKDOWN, disable_web_page_preview=True, reply_markup=stats_keyboard)
+    text, stats_keyboard = await render_users_page(VIEW_STATS)
+    await state.update_data(screen=SCREEN_STATS)
+    await message.reply(text, parse_mode=ParseMode.HTML, disable_web_page_preview=True, reply_markup=stats_keyboard)
 
 async def handle_stats_user_selection(message: types.Message, state: FSMContext):
     """
@@ -804,19 +753,14 @@ async def handle_stats_user_selection(message: types.Message, state: FSMContext)
         await message.reply("❌ Не удалось определить пользователя. Попробуйте снова.", reply_markup=get_back_kb())
         return
 
+    await show_stats_user(message, state, user_id)
+
+async def show_stats_user(message: types.Message, state: FSMContext, user_id: int):
+    """
+    Показывает ключи, выданные пользователю.
+    """
     # Получаем список выданных ключей этому пользователю
-    issued_keys = await read_file(KEYS_LOG_FILE)
-    user_files = []
-    for line in issued_keys:
-        # Предполагается формат:
-        # timestamp - User: username (ID: user_id) - Key: filename.conf
-        if f"(ID: {user_id})" in line and "Key:" in line:
-            # Извлекаем filename.conf
-            parts = line.strip().split(" - ")
-            if len(parts) >= 3:
-                key_part = parts[2]
-                key_filename = key_part.replace("Key: ", "")
-                user_files.append(key_filename)
+    user_files = await get_user_key_files(user_id)
 
     if user_files:
         keys_text = f"📄 **Ключи пользователя (ID: {user_id}):**\n" + "\n".join(user_files)
@@ -826,8 +770,259 @@ async def handle_stats_user_selection(message: types.Message, state: FSMContext)
     # Клавиатура с кнопкой "🔙 Назад"
     kb = get_stats_user_actions_keyboard()
 
+    await state.update_data(screen=SCREEN_STATS_USER)
     await message.reply(keys_text, parse_mode=ParseMode.MARKDOWN, disable_web_page_preview=True, reply_markup=kb)
 
+# Списки пользователей в статистике и управлении пользователями выводятся постранично
+VIEW_STATS = 'stats'
+VIEW_USERS = 'users'
+USERS_PAGE_SIZE = 20
+
+def _user_display(user_obj) -> str:
+    if user_obj is None:
+        return "Имя не указано"
+    return user_obj.username if user_obj.username else f"{user_obj.first_name or ''} {user_obj.last_name or ''}".strip() or "Имя не указано"
+
+async def render_users_page(view: str, cursor: tuple = None, backward: bool = False) -> tuple:
+    """
+    Формирует страницу списка пользователей для статистики или управления
+    пользователями. Профили запрашиваются только для пользователей этой страницы,
+    поэтому стоимость не зависит от общего числа пользователей.
+    Возвращает (текст в HTML, клавиатура).
+    """
+    registry = await get_user_registry()
+    entries, start, total, next_cursor = registry.page(cursor, USERS_PAGE_SIZE, backward)
+    profiles = await profile_cache.get_many(bot, [uid for _, uid in entries])
+    issuance = await get_issuance_index()
+
+    if view == VIEW_STATS:
+        remain = (await get_key_pool()).remaining
+        text = f"📊 <b>Статистика:</b>\n\n<b>Осталось ключей:</b> {remain}\n"
+    else:
+        text = "👥 <b>Управление пользователями</b>\n"
+    text += f"<b>Авторизовано:</b> {len(registry.authorized)}, <b>забанено:</b> {len(registry.banned)}\n"
+
+    titles = {'authorized': "\n<b>Авторизованные пользователи:</b>", 'banned': "\n🚫 <b>Забаненные пользователи:</b>"}
+    lines = []
+    user_list = []
+    section = None
+    for entry_section, uid in entries:
+        if entry_section != section:
+            section = entry_section
+            lines.append(titles[section])
+        user_display = _user_display(profiles.get(uid))
+        lines.append(f"{html.escape(user_display)} (ID: {uid}) - {issuance.count(uid)} ключей")
+        user_list.append((user_display, uid))
+    if not entries:
+        lines.append("\nНет пользователей.")
+    text += "\n".join(lines)
+
+    label = f"{start + 1}–{start + len(entries)} из {total}" if entries else "0 из 0"
+    prev_cursor = entries[0] if entries and start > 0 else None
+    keyboard = get_users_page_kb(view, tuple(user_list), prev_cursor, next_cursor, label)
+    return text, keyboard
+
+def _parse_users_page_data(data: str):
+    # upage_<экран>_<n|p>_<раздел>_<user_id>
+    _, view, direction, section, user_id = data.split('_')
+    return view, (section, int(user_id)), direction == 'p'
+
+async def handle_users_page(call: types.CallbackQuery, state: FSMContext):
+    """
+    Переход на соседнюю страницу списка пользователей (кнопки ◀️ и ▶️).
+    """
+    if call.from_user.id != AUTHORIZED_USER_ID:
+        await call.answer(MESSAGES.get("access_denied", "🚫 У вас нет прав для выполнения этого действия."), show_alert=True)
+        return
+    try:
+        view, cursor, backward = _parse_users_page_data(call.data)
+    except ValueError:
+        await call.answer("❌ Неизвестная страница.")
+        return
+
+    text, keyboard = await render_users_page(view, cursor, backward)
+    await state.update_data(screen=SCREEN_STATS if view == VIEW_STATS else SCREEN_USERS)
+    try:
+        await call.message.edit_text(text, parse_mode=ParseMode.HTML, disable_web_page_preview=True, reply_markup=keyboard)
+    except MessageNotModified:
+        pass
+    await call.answer()
+
+async def handle_users_select(call: types.CallbackQuery, state: FSMContext):
+    """
+    Выбор пользователя на странице списка: статистика ключей или меню действий.
+    """
+    if call.from_user.id != AUTHORIZED_USER_ID:
+        await call.answer(MESSAGES.get("access_denied", "🚫 У вас нет прав для выполнения этого действия."), show_alert=True)
+        return
+    try:
+        _, view, user_id = call.data.split('_')
+        user_id = int(user_id)
+    except ValueError:
+        await call.answer("❌ Не удалось определить пользователя.")
+        return
+
+    await call.answer()
+    if view == VIEW_STATS:
+        await show_stats_user(call.message, state, user_id)
+    else:
+        await show_user_actions(call.message, state, user_id)
+
+RECENT_ISSUANCES_DEFAULT = 20
+RECENT_ISSUANCES_MAX = 100
+
+async def cmd_recent(message: types.Message):
+    """
+    Показывает последние выдачи ключей: /recent [N] [user_id].
+    """
+    if message.from_user.id != AUTHORIZED_USER_ID:
+        await message.reply(MESSAGES.get("access_denied", "🚫 У вас нет прав для выполнения этого действия."), parse_mode=ParseMode.HTML)
+        return
+
+    args = message.get_args().split()
+    try:
+        limit = int(args[0]) if args else RECENT_ISSUANCES_DEFAULT
+        user_id = int(args[1]) if len(args) > 1 else None
+    except ValueError:
+        await message.reply("❌ Использование: /recent [количество] [ID пользователя]")
+        return
+    limit = max(1, min(limit, RECENT_ISSUANCES_MAX))
+
+    entries = await get_recent_issuances(limit, user_id)
+    if not entries:
+        await message.reply("❌ Выдач ключей не найдено.")
+        return
+
+    title = f"🕑 <b>Последние выдачи ключей ({len(entries)})</b>"
+    if user_id is not None:
+        title = f"🕑 <b>Последние выдачи ключей пользователю (ID: {user_id}) ({len(entries)})</b>"
+    lines = [
+        f"{html.escape(issued_at)} — {html.escape(username)} (ID: {uid}) — <code>{html.escape(key_filename)}</code>"
+        for issued_at, username, uid, key_filename in entries
+    ]
+    text = title + "\n\n" + "\n".join(lines)
+    if len(text) > 4096:
+        text = text[:text.rfind("\n", 0, 4096)]
+    await message.reply(text, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
+
+async def cmd_export(message: types.Message):
+    """
+    Выгружает данные в CSV: /export — пользователи, /export history — журнал выдачи ключей.
+    Параметр gz сжимает файл. Файл собирается построчно в отдельном потоке и отправляется документом.
+    """
+    if message.from_user.id != AUTHORIZED_USER_ID:
+        await message.reply(MESSAGES.get("access_denied", "🚫 У вас нет прав для выполнения этого действия."), parse_mode=ParseMode.HTML)
+        return
+
+    args = set(message.get_args().split())
+    if not args <= {"history", "gz"}:
+        await message.reply("❌ Использование: /export [history] [gz]")
+        return
+    history = "history" in args
+    compress = "gz" in args
+
+    if history:
+        file_path = await export_issuances_csv(compress)
+        name, caption = "keys_log", "📤 Журнал выдачи ключей"
+    else:
+        file_path = await export_users_csv(compress)
+        name, caption = "users", "📤 Пользователи и выданные ключи"
+    filename = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv" + (".gz" if compress else "")
+    try:
+        await message.reply_document(InputFile(file_path, filename=filename), caption=caption)
+    finally:
+        await asyncio.to_thread(os.remove, file_path)
+
+ISSUANCE_DAYS_DEFAULT = 7
+ISSUANCE_DAYS_MAX = 31
+ISSUANCE_RATE_WINDOW_DAYS = 7
+
+async def cmd_issuance(message: types.Message):
+    """
+    Показывает темп выдачи ключей, активных пользователей по дням и прогноз
+    исчерпания очереди: /issuance [дней]. Считается по сводкам, без чтения журнала.
+    """
+    if message.from_user.id != AUTHORIZED_USER_ID:
+        await message.reply(MESSAGES.get("access_denied", "🚫 У вас нет прав для выполнения этого действия."), parse_mode=ParseMode.HTML)
+        return
+
+    args = message.get_args().split()
+    try:
+        days = int(args[0]) if args else ISSUANCE_DAYS_DEFAULT
+        if days <= 0 or len(args) > 1:
+            raise ValueError
+    except ValueError:
+        await message.reply("❌ Использование: /issuance [количество дней]")
+        return
+    days = min(days, ISSUANCE_DAYS_MAX)
+
+    rollups = await get_issuance_rollups()
+    remaining = (await get_key_pool()).remaining
+    now = datetime.now()
+    last_day = rollups.last_hours(now, 24)
+    rate = rollups.daily_rate(now, ISSUANCE_RATE_WINDOW_DAYS)
+
+    lines = [
+        "📈 <b>Выдача ключей</b>",
+        "",
+        f"За последний час: {last_day[-1]}, за 24 часа: {sum(last_day)}",
+        f"Средний темп за {ISSUANCE_RATE_WINDOW_DAYS} дн.: {rate:.1f} ключей в сутки",
+        f"По часам за сутки: <code>{' '.join(str(count) for count in last_day)}</code>",
+    ]
+    if rate > 0:
+        days_left = remaining / rate
+        lines.append(
+            f"В очереди {remaining} ключей — хватит примерно на {days_left:.1f} дн. "
+            f"(до {(now + timedelta(days=days_left)).strftime('%Y-%m-%d')})"
+        )
+    else:
+        lines.append(f"В очереди {remaining} ключей — за {ISSUANCE_RATE_WINDOW_DAYS} дн. выдач не было, прогноз недоступен")
+    lines.extend(["", f"<b>По дням ({days}):</b>"])
+    lines.extend(
+        f"{day} — ключей: {issued}, пользователей: {active}"
+        for day, issued, active in rollups.last_days(now, days)
+    )
+    await message.reply("\n".join(lines), parse_mode=ParseMode.HTML)
+
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_MAX_SECONDS = 600
+
+async def cmd_profile(message: types.Message):
+    """
+    Включает профилирование: /profile [секунд] или /profile [N] upd — до N обновлений.
+    /profile stop завершает профилирование досрочно.
+    """
+    if message.from_user.id != AUTHORIZED_USER_ID:
+        await message.reply(MESSAGES.get("access_denied", "🚫 У вас нет прав для выполнения этого действия."), parse_mode=ParseMode.HTML)
+        return
+
+    args = message.get_args().split()
+    if args and args[0] == "stop":
+        if not profiler.is_running:
+            await message.reply("❌ Профилирование не запущено.")
+            return
+        await profiler.stop()
+        return
+
+    try:
+        value = int(args[0]) if args else PROFILE_DEFAULT_SECONDS
+        by_updates = len(args) > 1 and args[1] == "upd"
+        if value <= 0 or (len(args) > 1 and not by_updates):
+            raise ValueError
+    except ValueError:
+        await message.reply("❌ Использование: /profile [секунд], /profile [N] upd или /profile stop")
+        return
+
+    seconds = PROFILE_MAX_SECONDS if by_updates else min(value, PROFILE_MAX_SECONDS)
+    started = profiler.start(Dispatcher.get_current(), bot, message.chat.id, seconds, value if by_updates else None)
+    if not started:
+        await message.reply("⏳ Профилирование уже запущено.")
+        return
+    if by_updates:
+        await message.reply(f"⏱ Профилирование включено на {value} обновлений (не дольше {seconds} сек.).")
+    else:
+        await message.reply(f"⏱ Профилирование включено на {seconds} сек.")
+
 async def handle_stats_back(message: types.Message, state: FSMContext):
     """
     Обработчик кнопки "🔙 Назад" в статистике.
@@ -858,52 +1053,73 @@ async def handle_back(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
     await message.reply(MESSAGES.get("welcome", "👋 Добро пожаловать! Выберите действие"), reply_markup=get_main_menu_kb(user_id), parse_mode=ParseMode.HTML)
 
+async def handle_no_action(call: types.CallbackQuery):
+    await call.answer()
+
 # Регистрация всех обработчиков
 
 def register_handlers(dp: Dispatcher):
     # Регистрация обработчиков команд
     dp.register_message_handler(cmd_start, commands=['start'])
+    dp.register_message_handler(cmd_recent, commands=['recent'], state='*')
+    dp.register_message_handler(cmd_profile, commands=['profile'], state='*')
+    dp.register_message_handler(cmd_export, commands=['export'], state='*')
+    dp.register_message_handler(cmd_issuance, commands=['issuance'], state='*')
 
-    # Обработчики кнопок для запроса доступа
-    dp.register_callback_query_handler(handle_access_request, lambda c: c.data == 'request_access', state='*')
-    dp.register_callback_query_handler(handle_authorization_response, lambda c: c.data.startswith('authorize_'), state='*')
-
-    # Обработчики кнопок пользователей (управление и статистика)
-    dp.register_message_handler(handle_user_selection, lambda m: "(ID: " in m.text, state='*')  # Управление пользователями
-    dp.register_message_handler(handle_stats_user_selection, lambda m: "(ID: " in m.text, state='*')  # Статистика
-
-    # Обработчики действий для управления пользователями
-    dp.register_message_handler(handle_user_action, lambda m: m.text in ["Забанить", "Разбанить", "Изменить личный лимит ключей", "🔙 Назад"], state='*')
-    dp.register_message_handler(set_user_limit_value, state=ManageUserForm.set_limit, content_types=types.ContentTypes.TEXT)
-
-    # Обработчики статистики
-    dp.register_message_handler(cmd_stats, lambda m: m.text == "📊 Статистика")
-    dp.register_message_handler(handle_stats_back, lambda m: m.text == "🔙 Назад", state='*')
-    dp.register_message_handler(handle_user_action_in_stats, lambda m: m.text == "🔙 Назад", state='*')
-
-    # Обработчики других команд и состояний
-    dp.register_message_handler(process_wishes, lambda m: m.text == "💬 Пожелания и предложения", state='*')
-    dp.register_message_handler(process_wishes_text, state=WishesStates.waiting_for_text, content_types=types.ContentTypes.TEXT)
-    dp.register_message_handler(cmd_get_key, lambda m: m.text == "🔑 Получить ключ")
-    dp.register_message_handler(cmd_add_site, lambda m: m.text == "🌐 Добавить сайт в исключения")
-    dp.register_message_handler(process_site_url, state=AddSiteForm.site_url)
-    dp.register_message_handler(process_vpn_issue, lambda m: m.text == "🛠 Не работает VPN")
-
-    dp.register_message_handler(cmd_broadcast, lambda m: m.text == "📢 Отправить сообщение всем")
-    dp.register_message_handler(process_broadcast_message, state=BroadcastForm.message_text)
-    dp.register_message_handler(cmd_upload_keys, lambda m: m.text == "📤 Загрузить ключи")
+    # Загрузка архива с ключами (документ, поэтому не через маршрутизатор кнопок)
     dp.register_message_handler(process_upload_keys, content_types=types.ContentType.DOCUMENT, state=UploadKeysForm.uploading)
-    dp.register_message_handler(cmd_users, lambda m: m.text == "👥 Управление пользователями")
-
-    dp.register_message_handler(process_support_reply, state=SupportReplyStates.waiting_for_reply, content_types=types.ContentTypes.TEXT)
-    dp.register_message_handler(process_operator, state=VPNSupportStates.waiting_for_operator, content_types=types.ContentTypes.TEXT)
-    dp.register_message_handler(process_description, state=VPNSupportStates.waiting_for_description, content_types=types.ContentTypes.TEXT)
-
-    # Обработчики кнопки "🔙 Назад" во всех состояниях
-    dp.register_message_handler(handle_back, lambda m: m.text.strip().lower() == "🔙 назад", state='*')
-
-    # Обработчики callback_query для поддержки
-    dp.register_callback_query_handler(handle_reply_button, lambda c: c.data and c.data.startswith("reply_"), state='*')
 
-    # Дополнительные обработчики (если необходимо)
-    dp.register_callback_query_handler(lambda c: c.answer(), lambda c: c.data == "no_action")
\ No newline at end of file
+    # Кнопки, ввод текста и callback-запросы маршрутизируются по точному совпадению с учётом экрана
+    router = Router()
+
+    # Кнопки главного меню (без состояния, с любого экрана)
+    router.add_text("📊 Статистика", cmd_stats)
+    router.add_text("🔑 Получить ключ", cmd_get_key)
+    router.add_text("🌐 Добавить сайт в исключения", cmd_add_site)
+    router.add_text("🛠 Не работает VPN", process_vpn_issue)
+    router.add_text("📢 Отправить сообщение всем", cmd_broadcast)
+    router.add_text("📤 Загрузить ключи", cmd_upload_keys)
+    router.add_text("👥 Управление пользователями", cmd_users)
+    router.add_text("💬 Пожелания и предложения", process_wishes, ANY)
+
+    # Управление пользователями
+    router.add_fallback(SCREEN_USERS, handle_user_selection)
+    for action in ("Забанить", "Разбанить", "Изменить личный лимит ключей", "🔙 Назад"):
+        router.add_text(action, handle_user_action, SCREEN_USER_ACTIONS)
+    router.add_fallback(ManageUserForm.set_limit.state, set_user_limit_value)
+
+    # Статистика
+    router.add_fallback(SCREEN_STATS, handle_stats_user_selection)
+    router.add_text("🔙 Назад", handle_stats_back, SCREEN_STATS)
+    router.add_text("🔙 Назад", handle_user_action_in_stats, SCREEN_STATS_USER)
+
+    # Ввод текста в состояниях (кнопку "🔙 Назад" обработчики проверяют сами)
+    router.add_fallback(WishesStates.waiting_for_text.state, process_wishes_text)
+    router.add_fallback(AddSiteForm.site_url.state, process_site_url)
+    router.add_fallback(BroadcastForm.message_text.state, process_broadcast_message)
+    router.add_fallback(SupportReplyStates.waiting_for_reply.state, process_support_reply)
+    router.add_fallback(VPNSupportStates.waiting_for_operator.state, process_operator)
+    router.add_fallback(VPNSupportStates.waiting_for_description.state, process_description)
+
+    # Обработчики кнопки "🔙 Назад" на остальных экранах
+    router.add_text("🔙 Назад", handle_back, IDLE)
+    router.add_text("🔙 Назад", handle_back, UploadKeysForm.uploading.state)
+    # Ввод пожелания и описания проблемы ограничен по частоте: возврат в меню не должен расходовать лимит
+    router.add_text("🔙 Назад", handle_back, WishesStates.waiting_for_text.state)
+    router.add_text("🔙 Назад", handle_back, VPNSupportStates.waiting_for_description.state)
+
+    # Callback-запросы: запрос доступа, авторизация, ответ на обращение
+    router.add_callback('request_access', handle_access_request)
+    router.add_callback('authorize_', handle_authorization_response)
+    router.add_callback('reply_', handle_reply_button)
+    router.add_callback('no_action', handle_no_action)
+    router.add_callback('upage_', handle_users_page)
+    router.add_callback('usel_', handle_users_select)
+
+    dp.middleware.setup(RouterMiddleware(router))
+
+    # Ограничение частоты дорогих действий (администратор не ограничивается)
+    dp.middleware.setup(throttling)
+
+    # Время работы и ошибки обработчиков (после ограничения частоты, чтобы не учитывать отклонённые события)
+    dp.middleware.setup(MetricsMiddleware())
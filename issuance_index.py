@@ -0,0 +1,71 @@
+# issuance_index.py
+
+import re
+
+# timestamp - User: username (ID: user_id) - Key: filename.conf
+ISSUANCE_LINE_RE = re.compile(r"^(.*?) - User: (.*) \(ID: (-?\d+)\) - Key: (.*)$")
+# user_id:stats:count
+STATS_LINE_RE = re.compile(r"^(-?\d+):stats:(\d+)$")
+
+
+def parse_issuance_line(line: str):
+    """
+    Разбирает строку журнала выдачи ключей.
+    Возвращает кортеж (timestamp, username, user_id, key_filename) или None.
+    """
+    match = ISSUANCE_LINE_RE.match(line.strip())
+    if not match:
+        return None
+    issued_at, username, user_id, key_filename = match.groups()
+    return issued_at, username, int(user_id), key_filename
+
+
+def parse_stats_line(line: str):
+    """
+    Разбирает строку статистики вида user_id:stats:count.
+    Возвращает кортеж (user_id, count) или None.
+    """
+    match = STATS_LINE_RE.match(line.strip())
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+class IssuanceIndex:
+    """
+    Агрегат выдачи ключей по пользователям.
+    Строится за один проход по keys_log.txt (поверх снимка, если журнал уже
+    уплотнялся) и дополняется при каждой выдаче, поэтому экраны статистики
+    и управления пользователями не перечитывают журнал. Хранятся только числа:
+    имена выданных файлов читаются из журнала по запросу для одного пользователя.
+    """
+
+    def __init__(self):
+        self.counts = {}  # user_id -> число выданных ключей
+        self.stats = {}  # user_id -> счётчик статистики из строк user_id:stats:count
+        self.loaded = False
+
+    def load(self, log_lines: list, snapshot: dict = None):
+        counts = dict((snapshot or {}).get('counts', {}))
+        stats = dict((snapshot or {}).get('stats', {}))
+        for line in log_lines:
+            entry = parse_issuance_line(line)
+            if entry is not None:
+                counts[entry[2]] = counts.get(entry[2], 0) + 1
+                continue
+            user_stats = parse_stats_line(line)
+            if user_stats is not None:
+                stats[user_stats[0]] = user_stats[1]
+        self.counts = counts
+        self.stats = stats
+        self.loaded = True
+
+    def count(self, user_id: int) -> int:
+        return self.counts.get(user_id, 0)
+
+    def on_issued(self, user_id: int):
+        self.counts[user_id] = self.counts.get(user_id, 0) + 1
+
+    def increment_stats(self, user_id: int) -> int:
+        self.stats[user_id] = self.stats.get(user_id, 0) + 1
+        return self.stats[user_id]
@@ -0,0 +1,98 @@
+# issuance_rollups.py
+
+from datetime import datetime, timedelta
+
+# Сколько последних дней хранят множества пользователей для подсчёта активных
+OPEN_DAYS = 2
+
+
+def _hour_key(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d %H")
+
+
+def _day_key(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d")
+
+
+class IssuanceRollups:
+    """
+    Почасовые и посуточные счётчики выдачи ключей.
+    Обновляются при каждой выдаче, поэтому темп выдачи и число активных
+    пользователей за день считаются по фиксированному числу корзин,
+    без чтения журнала. Множества пользователей хранятся только для
+    последних OPEN_DAYS дней, за более ранние дни остаётся готовое число.
+    """
+
+    def __init__(self):
+        self.hourly = {}  # 'ГГГГ-ММ-ДД ЧЧ' -> число выдач
+        self.daily = {}  # 'ГГГГ-ММ-ДД' -> число выдач
+        self.active = {}  # 'ГГГГ-ММ-ДД' -> число пользователей, получивших ключ
+        self.day_users = {}  # 'ГГГГ-ММ-ДД' -> множество ID за открытые дни
+        self.loaded = False
+
+    def load(self, snapshot: dict = None, log_entries=()):
+        """
+        Заполняет счётчики из сохранённой сводки и дополняет их выдачами
+        (кортежами parse_issuance_line), которые в сводку ещё не вошли.
+        """
+        snapshot = snapshot or {}
+        self.hourly = dict(snapshot.get('hourly', {}))
+        self.daily = {day: counts[0] for day, counts in snapshot.get('daily', {}).items()}
+        self.active = {day: counts[1] for day, counts in snapshot.get('daily', {}).items()}
+        self.day_users = {day: set(users) for day, users in snapshot.get('day_users', {}).items()}
+        for entry in log_entries:
+            self.add(entry[0], entry[2])
+        self.loaded = True
+
+    def dump(self) -> dict:
+        """
+        Компактное представление для сохранения: корзины с числами и ID только за открытые дни.
+        """
+        return {
+            'hourly': dict(self.hourly),
+            'daily': {day: [count, self.active.get(day, 0)] for day, count in self.daily.items()},
+            'day_users': {day: sorted(users) for day, users in self.day_users.items()},
+        }
+
+    def add(self, issued_at: str, user_id: int):
+        """
+        Учитывает выдачу с отметкой времени вида 'ГГГГ-ММ-ДД ЧЧ:ММ:СС'.
+        """
+        if issued_at[4:5] != '-' or issued_at[10:11] != ' ':
+            return
+        hour, day = issued_at[:13], issued_at[:10]
+        self.hourly[hour] = self.hourly.get(hour, 0) + 1
+        self.daily[day] = self.daily.get(day, 0) + 1
+        users = self.day_users.get(day)
+        if users is None:
+            if self.day_users and day < min(self.day_users):
+                # День уже закрыт: повторных пользователей за него не отличить, активные не меняются
+                return
+            users = self.day_users[day] = set()
+            for old_day in sorted(self.day_users)[:-OPEN_DAYS]:
+                del self.day_users[old_day]
+        if user_id not in users:
+            users.add(user_id)
+            self.active[day] = self.active.get(day, 0) + 1
+
+    def last_hours(self, now: datetime, hours: int) -> list:
+        """
+        Возвращает число выдач за каждый из последних hours часов, от старых к новым.
+        """
+        return [self.hourly.get(_hour_key(now - timedelta(hours=i)), 0) for i in range(hours - 1, -1, -1)]
+
+    def last_days(self, now: datetime, days: int) -> list:
+        """
+        Возвращает кортежи (день, выдач, активных пользователей) за последние days дней, новые первыми.
+        """
+        result = []
+        for i in range(days):
+            day = _day_key(now - timedelta(days=i))
+            result.append((day, self.daily.get(day, 0), self.active.get(day, 0)))
+        return result
+
+    def daily_rate(self, now: datetime, days: int = 7) -> float:
+        """
+        Средний темп выдачи в сутки за скользящее окно последних days суток.
+        """
+        return sum(self.last_hours(now, days * 24)) / days
@@ -0,0 +1,155 @@
+# key_pool.py
+
+import json
+import logging
+import os
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class KeyPool:
+    """
+    Очередь свободных .conf файлов.
+    Папка с ключами индексируется один раз, после чего ключи выдаются из очереди (FIFO).
+    Выдача атомарна: файл переименовывается в папку claimed, поэтому два
+    параллельных запроса не могут получить один и тот же ключ.
+    Для заранее загруженных в Telegram ключей хранится их file_id.
+    """
+
+    def __init__(self, configs_dir: str, claimed_dir: str, file_ids_path: str = None):
+        self.configs_dir = configs_dir
+        self.claimed_dir = claimed_dir
+        self.file_ids_path = file_ids_path
+        self.queue = deque()
+        self.queued = set()
+        self.file_ids = {}  # filename -> file_id загруженного в Telegram документа
+        self.loaded = False
+
+    def load(self):
+        """
+        Индексирует папку с ключами. Ключи, оставшиеся в claimed после
+        аварийной остановки, возвращаются в очередь.
+        """
+        os.makedirs(self.configs_dir, exist_ok=True)
+        os.makedirs(self.claimed_dir, exist_ok=True)
+        for filename in os.listdir(self.claimed_dir):
+            if filename.endswith('.conf'):
+                os.replace(os.path.join(self.claimed_dir, filename), os.path.join(self.configs_dir, filename))
+                logger.warning(f"Ключ {filename} не был выдан до остановки и возвращён в очередь")
+
+        filenames = sorted(f for f in os.listdir(self.configs_dir) if f.endswith('.conf'))
+        self.queue = deque(filenames)
+        self.queued = set(filenames)
+        self.file_ids = {name: file_id for name, file_id in self._read_file_ids().items() if name in self.queued}
+        self.loaded = True
+
+    def check(self) -> dict:
+        """
+        Проверяет очередь ключей: сколько ключей осталось, сколько из них уже
+        загружено в Telegram и какие файлы пусты (такой ключ не подключится).
+        """
+        empty = []
+        queue = list(self.queue)
+        for filename in queue:
+            try:
+                if os.path.getsize(os.path.join(self.configs_dir, filename)) == 0:
+                    empty.append(filename)
+            except OSError:
+                empty.append(filename)
+        return {'remaining': len(queue), 'staged': len(self.file_ids), 'empty': empty}
+
+    def _read_file_ids(self) -> dict:
+        if not self.file_ids_path or not os.path.exists(self.file_ids_path):
+            return {}
+        try:
+            with open(self.file_ids_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Не удалось прочитать file_id ключей {self.file_ids_path}: {e}")
+            return {}
+
+    def save_file_ids(self):
+        """
+        Сохраняет file_id загруженных ключей (вызывается из потока).
+        """
+        if not self.file_ids_path:
+            return
+        tmp_path = f"{self.file_ids_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(self.file_ids), f)
+        os.replace(tmp_path, self.file_ids_path)
+
+    def file_id(self, filename: str):
+        return self.file_ids.get(filename)
+
+    def set_file_id(self, filename: str, file_id: str):
+        # Ключ могли выдать, пока он загружался
+        if filename in self.queued:
+            self.file_ids[filename] = file_id
+
+    def unstaged(self) -> list:
+        """
+        Возвращает ключи в очереди, для которых ещё нет file_id.
+        """
+        return [name for name in self.queue if name not in self.file_ids]
+
+    @property
+    def remaining(self) -> int:
+        return len(self.queue)
+
+    def snapshot(self) -> list:
+        return list(self.queue)
+
+    def add(self, filename: str):
+        """
+        Добавляет ключ в конец очереди (например, после загрузки архива).
+        Если файл заменён, ранее полученный file_id больше не действителен.
+        """
+        self.file_ids.pop(filename, None)
+        if filename not in self.queued:
+            self.queue.append(filename)
+            self.queued.add(filename)
+
+    def claim(self):
+        """
+        Забирает следующий ключ из очереди и переносит его в claimed.
+        Возвращает имя файла или None, если ключей не осталось.
+        """
+        while self.queue:
+            filename = self.queue.popleft()
+            self.queued.discard(filename)
+            try:
+                os.rename(os.path.join(self.configs_dir, filename), self.claimed_path(filename))
+            except FileNotFoundError:
+                logger.warning(f"Ключ {filename} пропал из папки и пропущен")
+                continue
+            return filename
+        return None
+
+    def claimed_path(self, filename: str) -> str:
+        return os.path.join(self.claimed_dir, filename)
+
+    def complete(self, filename: str):
+        """
+        Удаляет выданный ключ.
+        """
+        self.file_ids.pop(filename, None)
+        try:
+            os.remove(self.claimed_path(filename))
+        except FileNotFoundError:
+            pass
+
+    def release(self, filename: str):
+        """
+        Возвращает невыданный ключ в начало очереди.
+        """
+        target_path = os.path.join(self.configs_dir, filename)
+        if os.path.exists(target_path):
+            # За время выдачи загрузили новый файл с тем же именем
+            self.complete(filename)
+            return
+        os.rename(self.claimed_path(filename), target_path)
+        if filename not in self.queued:
+            self.queue.appendleft(filename)
+            self.queued.add(filename)
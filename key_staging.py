@@ -0,0 +1,63 @@
+# key_staging.py
+
+import asyncio
+import logging
+import os
+
+from aiogram import Bot
+from aiogram.types import InputFile
+from aiogram.utils.exceptions import RetryAfter, TelegramAPIError
+
+from key_pool import KeyPool
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+async def stage_pending_keys(bot: Bot, pool: KeyPool, chat_id: int, limiter: TokenBucket) -> int:
+    """
+    Загружает в служебный чат ключи, для которых ещё нет file_id, и запоминает
+    полученные file_id. Возвращает число загруженных ключей.
+    """
+    staged = 0
+    for filename in pool.unstaged():
+        file_path = os.path.join(pool.configs_dir, filename)
+        await limiter.acquire()
+        try:
+            with open(file_path, 'rb') as f:
+                message = await bot.send_document(chat_id, InputFile(f, filename=filename), disable_notification=True)
+        except FileNotFoundError:
+            # Ключ выдали, пока он ждал загрузки
+            continue
+        except RetryAfter as e:
+            logger.warning(f"Предзагрузка ключей: флуд-контроль, пауза {e.timeout} сек.")
+            limiter.pause(e.timeout)
+            continue
+        except TelegramAPIError as e:
+            logger.error(f"Ошибка предзагрузки ключа {filename}: {e}")
+            continue
+        pool.set_file_id(filename, message.document.file_id)
+        staged += 1
+        try:
+            # file_id остаётся действительным и после удаления сообщения
+            await bot.delete_message(chat_id, message.message_id)
+        except TelegramAPIError as e:
+            logger.debug(f"Не удалось удалить сообщение предзагрузки {message.message_id}: {e}")
+    if staged:
+        await asyncio.to_thread(pool.save_file_ids)
+        logger.info(f"Предзагружено ключей: {staged}")
+    return staged
+
+
+async def key_staging_worker(bot: Bot, pool: KeyPool, chat_id: int, rate: float, interval: float):
+    """
+    Фоновая задача: заранее загружает ключи из очереди в служебный чат,
+    чтобы при выдаче отправлять пользователю готовый file_id без повторной загрузки файла.
+    """
+    limiter = TokenBucket(rate)
+    while True:
+        try:
+            await stage_pending_keys(bot, pool, chat_id, limiter)
+        except Exception as e:
+            logger.error(f"Ошибка при предзагрузке ключей: {e}")
+        await asyncio.sleep(interval)
@@ -1,5 +1,8 @@
 # keyboards.py
 
+import json
+from functools import lru_cache
+
 from aiogram.types import (
     ReplyKeyboardMarkup,
     KeyboardButton,
@@ -8,17 +11,51 @@ from aiogram.types import (
 )
 from config import AUTHORIZED_USER_ID
 
-def get_main_menu_kb(user_id: int) -> ReplyKeyboardMarkup:
+# Сколько страниц списка пользователей хранить готовыми
+USERS_KEYBOARD_CACHE_SIZE = 32
+
+
+class FrozenMarkup(str):
+    """
+    Клавиатура, сериализованная в JSON один раз. Это строка, поэтому aiogram
+    передаёт её в запрос как есть (prepare_arg не сериализует строки повторно).
+    Исходный объект клавиатуры доступен в markup.
+    """
+
+    def __new__(cls, markup):
+        frozen = super().__new__(cls, json.dumps(markup.to_python(), ensure_ascii=False))
+        frozen.markup = markup
+        return frozen
+
+
+_markup_cache = {}  # (вариант клавиатуры, ...) -> FrozenMarkup
+
+
+def _cached(key: tuple, build) -> FrozenMarkup:
     """
-    Создаёт основную клавиатуру для пользователя.
+    Возвращает готовую клавиатуру варианта key, создавая её при первом обращении.
+    Клавиатуры неизменяемы, поэтому один экземпляр используется во всех ответах.
     """
+    markup = _markup_cache.get(key)
+    if markup is None:
+        markup = _markup_cache[key] = FrozenMarkup(build())
+    return markup
+
+def get_main_menu_kb(user_id: int) -> FrozenMarkup:
+    """
+    Возвращает основную клавиатуру для пользователя (своя для администратора).
+    """
+    is_admin = user_id == AUTHORIZED_USER_ID
+    return _cached(('main_menu', is_admin), lambda: _build_main_menu_kb(is_admin))
+
+def _build_main_menu_kb(is_admin: bool) -> ReplyKeyboardMarkup:
     buttons = [
         KeyboardButton("🔑 Получить ключ"),
         KeyboardButton("🛠 Не работает VPN"),
         KeyboardButton("💬 Пожелания и предложения")
     ]
     # Добавляем админские кнопки, если пользователь администратор
-    if user_id == AUTHORIZED_USER_ID:
+    if is_admin:
         buttons.extend([
             KeyboardButton("📊 Статистика"),
             KeyboardButton("📢 Отправить сообщение всем"),
@@ -29,10 +66,13 @@ def get_main_menu_kb(user_id: int) -> ReplyKeyboardMarkup:
     kb.add(*buttons)
     return kb
 
-def access_request_kb() -> InlineKeyboardMarkup:
+def access_request_kb() -> FrozenMarkup:
     """
     Клавиатура с кнопкой "Запросить доступ".
     """
+    return _cached(('access_request',), _build_access_request_kb)
+
+def _build_access_request_kb() -> InlineKeyboardMarkup:
     # Используем InlineKeyboardMarkup для отправки callback_query
     request_button = InlineKeyboardButton("🔒 Запросить доступ", callback_data="request_access")
     kb = InlineKeyboardMarkup()
@@ -50,33 +90,58 @@ def create_authorize_kb(user_id: int) -> InlineKeyboardMarkup:
     kb.add(yes_button, no_button)
     return kb
 
-def get_back_kb() -> ReplyKeyboardMarkup:
+def get_back_kb() -> FrozenMarkup:
     """
     Клавиатура с кнопкой "🔙 Назад".
     """
+    return _cached(('back',), _build_back_kb)
+
+def _build_back_kb() -> ReplyKeyboardMarkup:
     back_button = KeyboardButton("🔙 Назад")
     kb = ReplyKeyboardMarkup(resize_keyboard=True)
     kb.add(back_button)
     return kb
 
-def get_users_keyboard(user_list: list) -> ReplyKeyboardMarkup:
+def users_page_data(view: str, cursor: tuple, backward: bool) -> str:
     """
-    Создаёт клавиатуру с кнопками для каждого пользователя.
-    user_list: список кортежей (user_display_text, user_id)
+    callback_data перехода на страницу списка пользователей: upage_<экран>_<n|p>_<раздел>_<user_id>.
+    """
+    section, user_id = cursor
+    return f"upage_{view}_{'p' if backward else 'n'}_{section}_{user_id}"
+
+def get_users_page_kb(view: str, user_list: tuple, prev_cursor: tuple, next_cursor: tuple, label: str) -> FrozenMarkup:
     """
-    kb = ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
+    Инлайн-клавиатура страницы списка пользователей: кнопка выбора для каждого
+    пользователя (usel_<экран>_<user_id>) и переходы на соседние страницы.
+    user_list: кортеж пар (user_display_text, user_id).
+    Клавиатура запоминается по содержимому страницы: пока страница не изменилась,
+    повторный показ не создаёт и не сериализует её заново.
+    """
+    return _users_page_kb(view, tuple(user_list), prev_cursor, next_cursor, label)
+
+@lru_cache(maxsize=USERS_KEYBOARD_CACHE_SIZE)
+def _users_page_kb(view: str, user_list: tuple, prev_cursor: tuple, next_cursor: tuple, label: str) -> FrozenMarkup:
+    kb = InlineKeyboardMarkup()
     for user_display, user_id in user_list:
         # Кнопка отображает имя/ник и ID
-        button_text = f"{user_display} (ID: {user_id})"
-        kb.add(KeyboardButton(button_text))
-    kb.add(KeyboardButton("🔙 Назад"))
-    return kb
+        kb.add(InlineKeyboardButton(f"{user_display} (ID: {user_id})", callback_data=f"usel_{view}_{user_id}"))
+    navigation = []
+    if prev_cursor is not None:
+        navigation.append(InlineKeyboardButton("◀️", callback_data=users_page_data(view, prev_cursor, True)))
+    navigation.append(InlineKeyboardButton(label, callback_data="no_action"))
+    if next_cursor is not None:
+        navigation.append(InlineKeyboardButton("▶️", callback_data=users_page_data(view, next_cursor, False)))
+    kb.row(*navigation)
+    return FrozenMarkup(kb)
 
-def get_user_actions_keyboard(is_banned: bool) -> ReplyKeyboardMarkup:
+def get_user_actions_keyboard(is_banned: bool) -> FrozenMarkup:
     """
     Создаёт клавиатуру с действиями для выбранного пользователя.
     is_banned: bool, указывает, забанен ли пользователь
     """
+    return _cached(('user_actions', bool(is_banned)), lambda: _build_user_actions_keyboard(is_banned))
+
+def _build_user_actions_keyboard(is_banned: bool) -> ReplyKeyboardMarkup:
     kb = ReplyKeyboardMarkup(resize_keyboard=True)
     if is_banned:
         kb.add(KeyboardButton("Разбанить"))
@@ -86,11 +151,9 @@ def get_user_actions_keyboard(is_banned: bool) -> ReplyKeyboardMarkup:
     kb.add(KeyboardButton("🔙 Назад"))
     return kb
 
-def get_stats_user_actions_keyboard() -> ReplyKeyboardMarkup:
+def get_stats_user_actions_keyboard() -> FrozenMarkup:
     """
     Клавиатура для возврата из детальной статистики пользователя.
     """
-    kb = ReplyKeyboardMarkup(resize_keyboard=True)
-    kb.add(KeyboardButton("🔙 Назад"))
-    return kb
+    return get_back_kb()
 
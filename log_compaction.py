@@ -0,0 +1,188 @@
+# log_compaction.py
+
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+
+from issuance_index import parse_issuance_line, parse_stats_line
+from issuance_rollups import IssuanceRollups
+from log_reader import iter_log_issuances
+
+logger = logging.getLogger(__name__)
+
+
+def read_snapshot(snapshot_path: str) -> dict:
+    """
+    Читает снимок уплотнённого журнала.
+    Возвращает словарь {'stats': {user_id: count}, 'counts': {user_id: число выдач},
+    'rollups': сводка IssuanceRollups.dump() или None, если снимок записан до появления сводок,
+    'segment_sizes': {имя сегмента: размер} на момент записи снимка или None, если размеры неизвестны,
+    'compacted_digest': sha256 последнего уплотнённого файла}.
+    """
+    if not os.path.exists(snapshot_path):
+        # Снимка ещё нет — ни одно уплотнение не завершилось, и в архиве не должно быть сегментов
+        return {'stats': {}, 'counts': {}, 'rollups': None, 'segment_sizes': {}, 'compacted_digest': None}
+    try:
+        with open(snapshot_path, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"Не удалось прочитать снимок журнала {snapshot_path}: {e}")
+        return {'stats': {}, 'counts': {}, 'rollups': None, 'segment_sizes': None, 'compacted_digest': None}
+    counts = raw.get('counts')
+    if counts is None:
+        # Снимок старого формата хранил имена выданных файлов: оставляем только их число
+        counts = {uid: len(names) for uid, names in raw.get('files', {}).items()}
+    return {
+        'stats': {int(uid): int(count) for uid, count in raw.get('stats', {}).items()},
+        'counts': {int(uid): int(count) for uid, count in counts.items()},
+        'rollups': raw.get('rollups'),
+        'segment_sizes': raw.get('segment_sizes'),
+        'compacted_digest': raw.get('compacted_digest'),
+    }
+
+
+def _write_snapshot(snapshot_path: str, snapshot: dict):
+    tmp_path = f"{snapshot_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'compacted_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'stats': {str(uid): count for uid, count in snapshot['stats'].items()},
+            'counts': {str(uid): count for uid, count in snapshot['counts'].items()},
+            'rollups': snapshot['rollups'],
+            'segment_sizes': snapshot['segment_sizes'],
+            'compacted_digest': snapshot['compacted_digest'],
+        }, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, snapshot_path)
+
+
+def segment_path(archive_dir: str, month: str) -> str:
+    return os.path.join(archive_dir, f"keys_log_{month}.txt")
+
+
+def list_segments(archive_dir: str) -> list:
+    """
+    Возвращает пути архивных сегментов журнала от старых к новым.
+    """
+    if not os.path.isdir(archive_dir):
+        return []
+    names = sorted(f for f in os.listdir(archive_dir) if f.startswith('keys_log_') and f.endswith('.txt'))
+    return [os.path.join(archive_dir, name) for name in names]
+
+
+def _segment_sizes(archive_dir: str) -> dict:
+    return {os.path.basename(path): os.path.getsize(path) for path in list_segments(archive_dir)}
+
+
+def _rollback_segments(archive_dir: str, segment_sizes: dict):
+    """
+    Обрезает архивные сегменты до размеров, записанных в снимке:
+    строки, дописанные прерванным уплотнением, будут перенесены повторно.
+    """
+    for path in list_segments(archive_dir):
+        name = os.path.basename(path)
+        committed = segment_sizes.get(name, 0)
+        if os.path.getsize(path) <= committed:
+            continue
+        logger.warning(f"Сегмент {name} длиннее записанного в снимке, откатываем прерванное уплотнение")
+        with open(path, 'r+b') as f:
+            f.truncate(committed)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _snapshot_rollups(snapshot: dict, archive_dir: str) -> IssuanceRollups:
+    rollups = IssuanceRollups()
+    if snapshot['rollups'] is not None:
+        rollups.load(snapshot['rollups'])
+    else:
+        # Снимок записан до появления сводок: досчитываем их по уже перенесённым в архив выдачам
+        rollups.load(log_entries=iter_log_issuances(list_segments(archive_dir)))
+    return rollups
+
+
+def read_rollups(snapshot_path: str, archive_dir: str) -> dict:
+    """
+    Возвращает сводку выдачи из снимка. Если снимок записан до появления сводок,
+    сводка один раз строится по архивным сегментам и сохраняется в снимок.
+    """
+    snapshot = read_snapshot(snapshot_path)
+    if snapshot['rollups'] is None:
+        if snapshot['segment_sizes'] is not None:
+            _rollback_segments(archive_dir, snapshot['segment_sizes'])
+        snapshot['rollups'] = _snapshot_rollups(snapshot, archive_dir).dump()
+        if os.path.exists(snapshot_path) or list_segments(archive_dir):
+            _write_snapshot(snapshot_path, snapshot)
+    return snapshot['rollups']
+
+
+def compact_file(compacting_path: str, snapshot_path: str, archive_dir: str) -> dict:
+    """
+    Уплотняет отложенную часть журнала:
+    строки статистики сворачиваются в снимок, строки выдачи ключей учитываются
+    в счётчиках и сводках снимка и переносятся в помесячные архивные сегменты.
+    Снимок записывается атомарно, после чего отложенный файл удаляется.
+    Повторный запуск после сбоя на любом шаге безопасен: снимок хранит размеры сегментов
+    и хеш уже уплотнённого файла, поэтому недописанные сегменты откатываются,
+    а файл, учтённый в снимке, просто удаляется.
+    Возвращает сводку {'stats': n, 'issuances': n, 'segments': [...]}.
+    """
+    summary = {'stats': 0, 'issuances': 0, 'segments': []}
+    if not os.path.exists(compacting_path):
+        return summary
+
+    snapshot = read_snapshot(snapshot_path)
+    digest = hashlib.sha256()
+    with open(compacting_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    digest = digest.hexdigest()
+    if digest == snapshot['compacted_digest']:
+        # Сбой случился после записи снимка: файл уже перенесён в архив
+        logger.warning(f"{compacting_path} уже учтён в снимке, удаляем без повторного уплотнения")
+        os.remove(compacting_path)
+        return summary
+    if snapshot['segment_sizes'] is not None:
+        _rollback_segments(archive_dir, snapshot['segment_sizes'])
+
+    rollups = _snapshot_rollups(snapshot, archive_dir)
+    segments = {}
+    fallback_month = datetime.now().strftime("%Y-%m")
+    with open(compacting_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            user_stats = parse_stats_line(line)
+            if user_stats is not None:
+                snapshot['stats'][user_stats[0]] = user_stats[1]
+                summary['stats'] += 1
+                continue
+            entry = parse_issuance_line(line)
+            if entry is not None:
+                snapshot['counts'][entry[2]] = snapshot['counts'].get(entry[2], 0) + 1
+                rollups.add(entry[0], entry[2])
+                month = entry[0][:7] if entry[0][4:5] == '-' else fallback_month
+                summary['issuances'] += 1
+            else:
+                month = fallback_month
+            segments.setdefault(month, []).append(f"{line}\n")
+
+    os.makedirs(archive_dir, exist_ok=True)
+    for month, lines in sorted(segments.items()):
+        path = segment_path(archive_dir, month)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(''.join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        summary['segments'].append(os.path.basename(path))
+
+    snapshot['rollups'] = rollups.dump()
+    snapshot['segment_sizes'] = _segment_sizes(archive_dir)
+    snapshot['compacted_digest'] = digest
+    _write_snapshot(snapshot_path, snapshot)
+    os.remove(compacting_path)
+    return summary
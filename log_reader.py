@@ -0,0 +1,85 @@
+# log_reader.py
+
+import mmap
+import os
+
+from issuance_index import parse_issuance_line
+
+
+def iter_lines_reversed(file_path: str):
+    """
+    Возвращает строки файла от последней к первой.
+    Файл отображается в память и просматривается с конца, поэтому
+    стоимость пропорциональна числу прочитанных строк, а не размеру файла.
+    """
+    if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+        return
+    with open(file_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = len(mm)
+            while end > 0:
+                start = mm.rfind(b'\n', 0, end - 1) + 1 if end > 1 else 0
+                line = mm[start:end].rstrip(b'\r\n')
+                if line:
+                    yield line.decode('utf-8', errors='replace')
+                end = start
+
+
+def recent_issuances(file_paths: list, limit: int, user_id: int = None) -> list:
+    """
+    Ищет последние limit выдач ключей, просматривая файлы журнала с конца.
+    file_paths перечисляются от самого нового к самому старому.
+    Возвращает список кортежей (timestamp, username, user_id, key_filename), новые первыми.
+    """
+    result = []
+    if limit <= 0:
+        return result
+    needle = f"(ID: {user_id})" if user_id is not None else None
+    for file_path in file_paths:
+        for line in iter_lines_reversed(file_path):
+            if needle is not None and needle not in line:
+                continue
+            entry = parse_issuance_line(line)
+            if entry is None or (user_id is not None and entry[2] != user_id):
+                continue
+            result.append(entry)
+            if len(result) >= limit:
+                return result
+    return result
+
+
+def key_files_by_user(file_paths: list, user_id: int = None) -> dict:
+    """
+    Собирает имена выданных файлов ключей по пользователям в порядке выдачи.
+    file_paths перечисляются от самого старого к самому новому и читаются построчно.
+    Если задан user_id, строки других пользователей пропускаются без разбора.
+    """
+    needle = f"(ID: {user_id})" if user_id is not None else None
+    files = {}
+    for file_path in file_paths:
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                if needle is not None and needle not in line:
+                    continue
+                entry = parse_issuance_line(line)
+                if entry is None or (user_id is not None and entry[2] != user_id):
+                    continue
+                files.setdefault(entry[2], []).append(entry[3])
+    return files
+
+
+def iter_log_issuances(file_paths: list):
+    """
+    Перебирает выдачи ключей из файлов журнала по порядку, читая их построчно.
+    Строки статистики и повреждённые строки пропускаются.
+    """
+    for file_path in file_paths:
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                entry = parse_issuance_line(line)
+                if entry is not None:
+                    yield entry
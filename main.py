@@ -1,27 +1,60 @@
 # main.py
 
+import asyncio
 import logging
 import os
+import time
 import aiofiles  # Асинхронное чтение и запись файлов
-from aiogram import Bot, Dispatcher
+from aiogram import Dispatcher
+from aiogram.bot.api import TELEGRAM_PRODUCTION, TelegramAPIServer
 from aiogram.types import ParseMode
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from config import (
     API_TOKEN,
+    TELEGRAM_API_SERVER,
     AUTHORIZED_USER_ID,
     CONFIGS_DIR,
     USERS_DIR,
     DATA_DIR,
-    KEY_LIMIT_FILE,
-    USER_LIMITS_FILE
+    STORAGE_BACKEND,
+    FSM_STORAGE,
+    FSM_DB_FILE,
+    FSM_CACHE_SIZE,
+    FSM_STATE_TTL,
+    FSM_SWEEP_INTERVAL,
+    KEYS_LOG_MAX_BYTES,
+    STAGING_CHAT_ID,
+    STAGING_RATE,
+    STAGING_INTERVAL,
+    BOT_MODE,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_URL,
+    WEBHOOK_SECRET,
+    METRICS_HOST,
+    METRICS_PORT,
+    STARTUP_BUDGET
 )
-from handlers import register_handlers, set_bot_instance
-from utils import read_file, append_to_file, write_file
+from handlers import register_handlers, set_bot_instance, broadcast_engine, throttling, profiler
+from utils import (
+    load_user_registry,
+    load_quota_index,
+    load_issuance_index,
+    load_issuance_rollups,
+    load_key_pool,
+    get_key_pool,
+    check_key_pool,
+    close_storage,
+    compact_keys_log,
+    keys_log_compaction_worker,
+    key_pool
+)
+from user_registry import user_registry
+from metrics import MetricsBot, CallbackMetric, registry, start_metrics_server
+from key_staging import key_staging_worker
+from fsm_storage import SQLiteFSMStorage, ExpiringMemoryStorage, fsm_expiry_worker
+from states import STATE_TTLS
 from logging.handlers import TimedRotatingFileHandler
-from dotenv import load_dotenv
-
-# Загрузка переменных окружения из .env
-load_dotenv()
 
 # Настройка логирования
 log_dir = 'logs'
@@ -45,8 +78,12 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 
 # Инициализация бота и диспетчера
-bot = Bot(token=API_TOKEN, parse_mode=ParseMode.HTML)
-storage = MemoryStorage()
+api_server = TelegramAPIServer.from_base(TELEGRAM_API_SERVER) if TELEGRAM_API_SERVER else TELEGRAM_PRODUCTION
+bot = MetricsBot(token=API_TOKEN, parse_mode=ParseMode.HTML, server=api_server)
+if FSM_STORAGE == 'memory':
+    storage = ExpiringMemoryStorage()
+else:
+    storage = SQLiteFSMStorage(FSM_DB_FILE, FSM_CACHE_SIZE)
 dp = Dispatcher(bot, storage=storage)
 
 # Установка экземпляра бота для других модулей
@@ -55,6 +92,18 @@ set_bot_instance(bot)
 # Регистрация обработчиков
 register_handlers(dp)
 
+# Показатели состояния бота, вычисляемые при запросе метрик
+registry.gauge('bot_keys_remaining', 'Свободные ключи в очереди', lambda: key_pool.remaining)
+registry.gauge('bot_users', 'Пользователи по статусу', lambda: {
+    'authorized': len(user_registry.authorized),
+    'banned': len(user_registry.banned),
+}, label='status')
+registry.gauge('bot_fsm_live_states', 'Активные записи FSM', storage.count_entries)
+registry.register(CallbackMetric(
+    'bot_throttled_total', 'События, отклонённые ограничением частоты', lambda: dict(throttling.rejected),
+    'counter', label='action'
+))
+
 # Функция инициализации проекта
 async def initialize_project():
     """
@@ -78,7 +127,7 @@ async def initialize_project():
         'user_keys_count.txt': []
     }
 
-    for filename, default_content in data_files.items():
+    async def create_file(filename: str, default_content: list):
         file_path = os.path.join(USERS_DIR, filename)
         if not os.path.exists(file_path):
             async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
@@ -87,24 +136,97 @@ async def initialize_project():
                         await f.write(f"{line}\n")
             logger.info(f"Создан файл: {file_path} с начальным содержимым.")
 
-    # Проверяем, существует ли ключевой лимит, если нет - создаём его
-    if not os.path.exists(KEY_LIMIT_FILE):
-        await write_file(KEY_LIMIT_FILE, ['10'])  # Устанавливаем глобальный лимит по умолчанию
-        logger.info(f"Создан файл с глобальным лимитом ключей: {KEY_LIMIT_FILE}")
-
-    # Проверяем, существует ли файл индивидуальных лимитов пользователей
-    if not os.path.exists(USER_LIMITS_FILE):
-        await write_file(USER_LIMITS_FILE, [])
-        logger.info(f"Создан файл с индивидуальными лимитами пользователей: {USER_LIMITS_FILE}")
+    # Файлы независимы, поэтому проверяем и создаём их параллельно
+    await asyncio.gather(*(create_file(filename, content) for filename, content in data_files.items()))
+
+# Фоновые задачи, запущенные при старте бота
+background_tasks = []
+metrics_runners = []
+
+async def _timed(timings: dict, step: str, coro):
+    started_at = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[step] = time.perf_counter() - started_at
+
+async def _warm_up_issuance(timings: dict):
+    # Уплотняем разросшийся журнал до загрузки агрегата, чтобы старт не зависел от длины истории
+    await _timed(timings, 'уплотнение журнала', compact_keys_log(KEYS_LOG_MAX_BYTES))
+    await asyncio.gather(
+        _timed(timings, 'агрегат выдачи', load_issuance_index()),
+        _timed(timings, 'сводки выдачи', load_issuance_rollups()),
+    )
+    # Число выдач для квот берётся из агрегата, поэтому индекс квот строится после него
+    await _timed(timings, 'индекс квот', load_quota_index())
+
+async def _warm_up_key_pool(timings: dict):
+    await _timed(timings, 'очередь ключей', load_key_pool())
+    await _timed(timings, 'проверка ключей', check_key_pool())
+
+async def warm_up():
+    """
+    Прогрев перед приёмом обновлений: создаёт файлы данных и параллельно строит
+    индексы в памяти (пользователи, квоты, агрегат и сводки выдачи, очередь ключей),
+    чтобы первые после запуска пользователи не ждали их загрузки.
+    Логирует время каждого шага; при превышении STARTUP_BUDGET останавливает запуск.
+    """
+    timings = {}
+    started_at = time.perf_counter()
+    await _timed(timings, 'файлы данных', initialize_project())
+    await asyncio.gather(
+        _timed(timings, 'реестр пользователей', load_user_registry()),
+        _timed(timings, 'состояния FSM', storage.count_entries()),
+        _warm_up_issuance(timings),
+        _warm_up_key_pool(timings),
+    )
+    total = time.perf_counter() - started_at
+
+    breakdown = ", ".join(f"{step} {elapsed * 1000:.0f} мс" for step, elapsed in timings.items())
+    logger.info(f"🔥 Прогрев завершён за {total * 1000:.0f} мс: {breakdown}")
+    if STARTUP_BUDGET and total > STARTUP_BUDGET:
+        logger.critical(f"Прогрев занял {total:.2f} сек. при бюджете {STARTUP_BUDGET} сек. — запуск остановлен.")
+        raise SystemExit(1)
 
 # Функция, выполняемая при старте бота
 async def on_startup(dispatcher):
-    await initialize_project()
-    logger.info("🚀 Бот запущен и инициализирован.")
+    await warm_up()
+    background_tasks.append(asyncio.create_task(keys_log_compaction_worker()))
+    background_tasks.append(asyncio.create_task(
+        fsm_expiry_worker(storage, STATE_TTLS, FSM_STATE_TTL, FSM_SWEEP_INTERVAL)
+    ))
+    if STAGING_CHAT_ID:
+        pool = await get_key_pool()
+        background_tasks.append(asyncio.create_task(
+            key_staging_worker(bot, pool, STAGING_CHAT_ID, STAGING_RATE, STAGING_INTERVAL)
+        ))
+    if METRICS_PORT:
+        metrics_runners.append(await start_metrics_server(METRICS_HOST, METRICS_PORT))
+    if await broadcast_engine.resume(bot):
+        logger.info("📢 Возобновлена прерванная рассылка.")
+    logger.info(f"🚀 Бот запущен и инициализирован (режим: {BOT_MODE}, хранилище: {STORAGE_BACKEND}).")
+
+# Функция, выполняемая при остановке бота
+async def on_shutdown(dispatcher):
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await broadcast_engine.stop()
+    await profiler.stop()
+    for runner in metrics_runners:
+        await runner.cleanup()
+    await close_storage()
+    logger.info("🛑 Бот остановлен.")
 
 if __name__ == '__main__':
-    from aiogram import executor
+    if BOT_MODE == 'webhook':
+        from webhook_server import start_webhook
+
+        start_webhook(dp, on_startup, on_shutdown, WEBHOOK_HOST, WEBHOOK_PORT,
+                      WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_URL)
+    else:
+        from aiogram import executor
 
-    executor.start_polling(dp, skip_updates=True, on_startup=on_startup)
+        executor.start_polling(dp, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown)
     
     
\ No newline at end of file
@@ -0,0 +1,233 @@
+# metrics.py
+
+import asyncio
+import bisect
+import functools
+import logging
+import sys
+import time
+from collections import defaultdict
+
+from aiohttp import web
+from aiogram import Bot, types
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, label: str = None):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+
+    def _series_name(self, label_value=None, suffix: str = '', le: str = None) -> str:
+        labels = []
+        if self.label is not None and label_value is not None:
+            labels.append(f'{self.label}="{_escape(label_value)}"')
+        if le is not None:
+            labels.append(f'le="{le}"')
+        name = self.name + suffix
+        return f"{name}{{{','.join(labels)}}}" if labels else name
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, label: str = None):
+        super().__init__(name, documentation, label)
+        self.values = defaultdict(float)
+
+    def inc(self, label_value=None, amount: float = 1.0):
+        self.values[label_value] += amount
+
+    async def render(self) -> list:
+        return self.header() + [
+            f"{self._series_name(label_value)} {_format_value(value)}" for label_value, value in sorted(self.values.items(), key=lambda i: str(i[0]))
+        ]
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label: str = None, buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label)
+        self.buckets = tuple(buckets)
+        self.series = {}  # значение метки -> [счётчики по корзинам, сумма, количество]
+
+    def observe(self, label_value, value: float):
+        series = self.series.get(label_value)
+        if series is None:
+            series = self.series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    async def render(self) -> list:
+        lines = self.header()
+        for label_value, (counts, total, count) in sorted(self.series.items(), key=lambda i: str(i[0])):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self._series_name(label_value, '_bucket', _format_value(bound))} {cumulative}")
+            lines.append(f"{self._series_name(label_value, '_sum')} {total}")
+            lines.append(f"{self._series_name(label_value, '_count')} {count}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    Метрика, значение которой вычисляется в момент запроса. Функция (обычная
+    или асинхронная) возвращает число либо словарь {значение метки: число}.
+    """
+
+    def __init__(self, name: str, documentation: str, func, metric_type: str = 'gauge', label: str = None):
+        super().__init__(name, documentation, label)
+        self.type = metric_type
+        self.func = func
+
+    async def render(self) -> list:
+        try:
+            value = self.func()
+            if asyncio.iscoroutine(value):
+                value = await value
+        except Exception as e:
+            logger.error(f"Ошибка вычисления метрики {self.name}: {e}")
+            return []
+        if isinstance(value, dict):
+            samples = [f"{self._series_name(k)} {_format_value(v)}" for k, v in sorted(value.items(), key=lambda i: str(i[0]))]
+        else:
+            samples = [f"{self.name} {_format_value(value)}"]
+        return self.header() + samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, func, label: str = None):
+        return self.register(CallbackMetric(name, documentation, func, 'gauge', label))
+
+    async def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(await metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HANDLER_DURATION = registry.register(Histogram(
+    'bot_handler_duration_seconds', 'Время обработки обновления обработчиком', 'handler'))
+HANDLER_ERRORS = registry.register(Counter(
+    'bot_handler_errors_total', 'Необработанные исключения в обработчиках', 'handler'))
+TELEGRAM_DURATION = registry.register(Histogram(
+    'bot_telegram_request_duration_seconds', 'Время запросов к Telegram Bot API', 'method'))
+TELEGRAM_ERRORS = registry.register(Counter(
+    'bot_telegram_errors_total', 'Ошибки запросов к Telegram Bot API', 'method'))
+STORAGE_DURATION = registry.register(Histogram(
+    'bot_storage_duration_seconds', 'Время операций с хранилищем данных', 'operation'))
+
+
+def timed(histogram: Histogram, label_value: str):
+    """
+    Декоратор асинхронной функции: записывает время её выполнения в гистограмму.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(label_value, time.perf_counter() - started_at)
+        return wrapper
+    return decorator
+
+
+class MetricsBot(Bot):
+    """
+    Bot, измеряющий время и ошибки запросов к Telegram Bot API по методам.
+    """
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return await super().request(method, data, files, **kwargs)
+        except Exception:
+            TELEGRAM_ERRORS.inc(method)
+            raise
+        finally:
+            TELEGRAM_DURATION.observe(method, time.perf_counter() - started_at)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Измеряет время работы обработчиков и считает исключения в них.
+    """
+
+    def _start(self, data: dict):
+        handler = current_handler.get(None)
+        data['metrics_handler'] = getattr(handler, '__name__', 'unknown')
+        data['metrics_started_at'] = time.perf_counter()
+
+    def _finish(self, data: dict):
+        started_at = data.pop('metrics_started_at', None)
+        if started_at is None:
+            return
+        handler = data.pop('metrics_handler')
+        HANDLER_DURATION.observe(handler, time.perf_counter() - started_at)
+        # post_process вызывается из finally, поэтому исключение обработчика видно здесь
+        if sys.exc_info()[1] is not None:
+            HANDLER_ERRORS.inc(handler)
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        self._start(data)
+
+    async def on_post_process_message(self, message: types.Message, results: list, data: dict):
+        self._finish(data)
+
+    async def on_process_callback_query(self, call: types.CallbackQuery, data: dict):
+        self._start(data)
+
+    async def on_post_process_callback_query(self, call: types.CallbackQuery, results: list, data: dict):
+        self._finish(data)
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """
+    Запускает HTTP-сервер с метриками в текстовом формате Prometheus (GET /metrics).
+    """
+    async def handle_metrics(request: web.Request):
+        body = await registry.render()
+        return web.Response(text=body, content_type='text/plain', charset='utf-8', headers={'X-Content-Type-Options': 'nosniff'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
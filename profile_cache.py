@@ -0,0 +1,94 @@
+# profile_cache.py
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from aiogram import Bot
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileCache:
+    """
+    Кэш профилей пользователей перед bot.get_chat с TTL и вытеснением LRU.
+    Промахи при пакетном запросе загружаются параллельно, но не более
+    concurrency запросов к Telegram одновременно. Одновременные запросы
+    одного и того же профиля объединяются в один вызов.
+    """
+
+    def __init__(self, ttl: float, max_size: int, concurrency: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.concurrency = concurrency
+        self._entries = OrderedDict()  # user_id -> (expires_at, chat)
+        self._inflight = {}  # user_id -> future загрузки
+        self._semaphore = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, user_id: int):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, chat = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return chat
+
+    def _store(self, user_id: int, chat):
+        self._entries[user_id] = (time.monotonic() + self.ttl, chat)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    async def _fetch(self, bot: Bot, user_id: int):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            chat = await bot.get_chat(user_id)
+        self._store(user_id, chat)
+        return chat
+
+    async def get(self, bot: Bot, user_id: int):
+        """
+        Возвращает профиль пользователя из кэша или загружает его через bot.get_chat.
+        Ошибки get_chat пробрасываются вызывающему и не кэшируются.
+        """
+        chat = self._lookup(user_id)
+        if chat is not None:
+            self.hits += 1
+            return chat
+        self.misses += 1
+        task = self._inflight.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(bot, user_id))
+            self._inflight[user_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        return await asyncio.shield(task)
+
+    async def get_many(self, bot: Bot, user_ids: list) -> dict:
+        """
+        Возвращает словарь {user_id: профиль} для списка пользователей.
+        Промахи загружаются параллельно; для пользователей, профиль которых
+        получить не удалось, значение равно None.
+        """
+        async def resolve(user_id: int):
+            try:
+                return await self.get(bot, user_id)
+            except Exception as e:
+                logger.error(f"Ошибка получения информации о пользователе {user_id}: {e}")
+                return None
+
+        unique_ids = list(dict.fromkeys(user_ids))
+        profiles = await asyncio.gather(*(resolve(user_id) for user_id in unique_ids))
+        return dict(zip(unique_ids, profiles))
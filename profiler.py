@@ -0,0 +1,177 @@
+# profiler.py
+
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+from datetime import datetime
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from aiogram.types import InputFile
+
+logger = logging.getLogger(__name__)
+
+# Модули бота, строки которых выделяются в отчёте
+HIGHLIGHT_FILES = ('handlers.py', 'utils.py')
+_HIGHLIGHT_PATHS = {os.path.join(os.path.dirname(os.path.abspath(__file__)), name) for name in HIGHLIGHT_FILES}
+TOP_FUNCTIONS = 60
+
+
+class _UpdateCounter(BaseMiddleware):
+    """
+    Считает обработанные обновления во время профилирования.
+    Подключается только на время сеанса, поэтому вне профилирования ничего не стоит.
+    """
+
+    def __init__(self, on_update):
+        super().__init__()
+        self.on_update = on_update
+
+    async def on_post_process_update(self, update: types.Update, results: list, data: dict):
+        self.on_update(update)
+
+
+class Profiler:
+    """
+    Профилирование бота по команде администратора (cProfile).
+    Профилировщик включается на заданное число секунд или обновлений,
+    после чего отчёт с самыми затратными функциями отправляется документом.
+    """
+
+    def __init__(self):
+        self._profile = None
+        self._counter = None
+        self._timer = None
+        self._dispatcher = None
+        self._bot = None
+        self._chat_id = None
+        self._started_at = 0.0
+        self._updates = 0
+        self._max_updates = None
+        self._start_update_id = None
+        self._stopping = False
+
+    @property
+    def is_running(self) -> bool:
+        return self._profile is not None
+
+    def start(self, dispatcher: Dispatcher, bot: Bot, chat_id: int, seconds: float, max_updates: int = None) -> bool:
+        """
+        Включает профилировщик. Сеанс завершается через seconds секунд
+        или после max_updates обновлений, если это число задано.
+        Если вызван из обработчика, профилировщик включается после завершения
+        текущего обновления: оно не попадает ни в отчёт, ни в счётчик.
+        Возвращает False, если профилирование уже идёт.
+        """
+        if self.is_running:
+            return False
+        self._dispatcher = dispatcher
+        self._bot = bot
+        self._chat_id = chat_id
+        self._updates = 0
+        self._max_updates = max_updates
+        self._stopping = False
+        current = types.Update.get_current()
+        self._start_update_id = current.update_id if current is not None else None
+        self._counter = _UpdateCounter(self._on_update)
+        dispatcher.middleware.setup(self._counter)
+        self._timer = asyncio.get_running_loop().call_later(seconds, self._schedule_stop)
+        self._started_at = time.perf_counter()
+        self._profile = cProfile.Profile()
+        if self._start_update_id is None:
+            self._enable(self._profile)
+        logger.info(f"Профилирование включено: {seconds} сек., обновлений: {max_updates or 'без ограничения'}")
+        return True
+
+    def _enable(self, profile: cProfile.Profile):
+        # Сеанс мог завершиться или смениться новым, пока ждали конца запустившего его обновления
+        if profile is self._profile:
+            self._started_at = time.perf_counter()
+            profile.enable()
+
+    def _on_update(self, update: types.Update):
+        if self._start_update_id is not None:
+            # Обновления, завершившиеся раньше запустившего сеанс, не профилировались и не считаются
+            if update.update_id == self._start_update_id:
+                self._start_update_id = None
+                asyncio.get_running_loop().call_soon(self._enable, self._profile)
+            return
+        self._updates += 1
+        if self._max_updates is not None and self._updates >= self._max_updates:
+            self._schedule_stop()
+
+    def _schedule_stop(self):
+        if not self._stopping:
+            self._stopping = True
+            asyncio.ensure_future(self.stop())
+
+    async def stop(self):
+        """
+        Выключает профилировщик и отправляет отчёт администратору.
+        """
+        if not self.is_running:
+            return
+        profile, self._profile = self._profile, None
+        profile.disable()
+        elapsed = time.perf_counter() - self._started_at
+        self._timer.cancel()
+        self._dispatcher.middleware.applications.remove(self._counter)
+        self._counter = None
+        logger.info(f"Профилирование завершено: {elapsed:.1f} сек., обновлений: {self._updates}")
+
+        report = await asyncio.to_thread(format_report, profile, elapsed, self._updates)
+        filename = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        try:
+            await self._bot.send_document(
+                self._chat_id,
+                InputFile(io.BytesIO(report.encode('utf-8')), filename=filename),
+                caption=f"⏱ Профилирование: {elapsed:.1f} сек., обновлений: {self._updates}"
+            )
+        except Exception as e:
+            logger.error(f"Ошибка при отправке отчёта профилирования: {e}")
+
+
+def _is_highlighted(filename: str) -> bool:
+    # Сравниваем полный путь: в стандартной библиотеке тоже есть logging/handlers.py
+    return os.path.abspath(filename) in _HIGHLIGHT_PATHS
+
+
+def _format_function(key: tuple) -> str:
+    filename, lineno, name = key
+    if filename == '~':
+        return name  # встроенная функция
+    return f"{os.path.basename(filename)}:{lineno}({name})"
+
+
+def _format_rows(rows: list) -> list:
+    lines = [f"  {'ncalls':>10} {'tottime':>9} {'cumtime':>9}  функция"]
+    for key, (primitive_calls, total_calls, tottime, cumtime, _) in rows:
+        calls = str(total_calls) if total_calls == primitive_calls else f"{total_calls}/{primitive_calls}"
+        marker = "▶" if _is_highlighted(key[0]) else " "
+        lines.append(f"{marker} {calls:>10} {tottime:>9.4f} {cumtime:>9.4f}  {_format_function(key)}")
+    return lines
+
+
+def format_report(profile: cProfile.Profile, elapsed: float, updates: int) -> str:
+    """
+    Формирует текстовый отчёт: самые затратные функции по суммарному времени
+    и отдельно функции из handlers.py и utils.py (отмечены ▶).
+    """
+    stats = pstats.Stats(profile).stats
+    by_cumtime = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+    own = [item for item in by_cumtime if _is_highlighted(item[0][0])]
+
+    lines = [
+        f"Профилирование: {elapsed:.1f} сек., обновлений: {updates}",
+        "Время указано в секундах; время ожидания в await и в потоках (asyncio.to_thread) не учитывается.",
+        "",
+        f"Топ-{TOP_FUNCTIONS} функций по суммарному времени (cumtime):",
+    ]
+    lines.extend(_format_rows(by_cumtime[:TOP_FUNCTIONS]))
+    lines.extend(["", f"Функции из {', '.join(HIGHLIGHT_FILES)}:"])
+    lines.extend(_format_rows(own) if own else ["  нет вызовов"])
+    return "\n".join(lines) + "\n"
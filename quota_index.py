@@ -0,0 +1,66 @@
+# quota_index.py
+
+
+class QuotaIndex:
+    """
+    Индекс квот на выдачу ключей.
+    Хранит в памяти число выданных пользователям ключей и их лимиты и обновляется
+    инкрементально при каждой выдаче и изменении лимита, поэтому проверка
+    допуска к выдаче выполняется за O(1) и без чтения файлов.
+    """
+
+    def __init__(self, default_limit: int):
+        self.issued = {}  # user_id -> число выдач
+        self.pending = {}  # user_id -> количество выдач в процессе
+        self.user_limits = {}
+        self.global_limit = default_limit
+        self.loaded = False
+
+    def load(self, issued_counts: dict, user_limits: dict, global_limit: int):
+        """
+        Заполняет индекс числом выдач по пользователям и словарём лимитов.
+        Каждая выдача учитывается отдельно, даже если имя файла уже выдавалось:
+        имена ключей повторяются после повторной загрузки архива.
+        """
+        self.issued = dict(issued_counts)
+        self.pending = {}
+        self.user_limits = dict(user_limits)
+        self.global_limit = global_limit
+        self.loaded = True
+
+    def issued_count(self, user_id: int) -> int:
+        return self.issued.get(user_id, 0)
+
+    def limit_for(self, user_id: int) -> int:
+        return self.user_limits.get(user_id, self.global_limit)
+
+    def try_acquire(self, user_id: int, unlimited: bool = False) -> bool:
+        """
+        Резервирует выдачу одного ключа, если лимит пользователя не исчерпан.
+        Резерв учитывает выдачи, которые ещё не завершились, чтобы параллельные
+        запросы одного пользователя не превысили лимит.
+        """
+        pending = self.pending.get(user_id, 0)
+        if not unlimited and self.issued_count(user_id) + pending >= self.limit_for(user_id):
+            return False
+        self.pending[user_id] = pending + 1
+        return True
+
+    def release(self, user_id: int):
+        """
+        Снимает резерв, если выдача ключа не состоялась.
+        """
+        pending = self.pending.get(user_id, 0) - 1
+        if pending > 0:
+            self.pending[user_id] = pending
+        else:
+            self.pending.pop(user_id, None)
+
+    def on_issued(self, user_id: int):
+        self.issued[user_id] = self.issued.get(user_id, 0) + 1
+
+    def set_user_limit(self, user_id: int, limit: int):
+        self.user_limits[user_id] = limit
+
+    def set_global_limit(self, limit: int):
+        self.global_limit = limit
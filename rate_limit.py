@@ -0,0 +1,65 @@
+# rate_limit.py
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты по алгоритму token bucket.
+    rate — сколько событий в секунду восполняется, capacity — допустимый всплеск.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_consume(self, amount: float = 1.0) -> bool:
+        """
+        Забирает токен без ожидания. Возвращает False, если лимит исчерпан.
+        """
+        now = time.monotonic()
+        if now < self.paused_until:
+            return False
+        self._refill(now)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    async def acquire(self, amount: float = 1.0):
+        """
+        Ждёт, пока не появится токен, и забирает его.
+        """
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def is_full(self) -> bool:
+        """
+        Возвращает True, если запас токенов полностью восстановился.
+        """
+        now = time.monotonic()
+        return now >= self.paused_until and self.tokens + (now - self.updated_at) * self.rate >= self.capacity
+
+    def pause(self, seconds: float):
+        """
+        Приостанавливает выдачу токенов (например, после RetryAfter от Telegram).
+        """
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        self.updated_at = self.paused_until
@@ -0,0 +1,152 @@
+# router.py
+
+import inspect
+import logging
+
+from aiogram import types
+from aiogram.dispatcher.handler import CancelHandler, current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Контекст, в котором у пользователя нет состояния FSM (любой экран)
+IDLE = 'idle'
+# Любой контекст, включая состояния FSM
+ANY = '*'
+# Экран по умолчанию, если другой не сохранён в данных FSM
+MAIN_SCREEN = 'main'
+
+
+class _Route:
+    def __init__(self, handler):
+        self.handler = handler
+        self.wants_state = 'state' in inspect.signature(handler).parameters
+
+    async def __call__(self, event, state):
+        if self.wants_state:
+            return await self.handler(event, state=state)
+        return await self.handler(event)
+
+
+class Router:
+    """
+    Маршрутизация кнопок по точному совпадению текста (поиск в словаре).
+    Контекст сообщения — текущее состояние FSM, а без состояния — экран,
+    сохранённый в данных FSM под ключом screen. Поэтому один и тот же текст
+    кнопки может вести к разным обработчикам на разных экранах.
+    Для контекста можно задать обработчик произвольного текста (ввод в состоянии
+    или выбор пользователя из списка). Callback-запросы маршрутизируются по
+    точному значению data или по префиксу до первого "_".
+    """
+
+    def __init__(self):
+        self._texts = {}  # текст кнопки -> {контекст: маршрут}
+        self._fallbacks = {}  # контекст -> маршрут для произвольного текста
+        self._callbacks = {}  # data или префикс "xxx_" -> маршрут
+
+    def add_text(self, text: str, handler, context: str = IDLE):
+        self._texts.setdefault(text, {})[context] = _Route(handler)
+
+    def add_fallback(self, context: str, handler):
+        self._fallbacks[context] = _Route(handler)
+
+    def add_callback(self, data: str, handler):
+        """
+        Регистрирует callback по точному значению data или по префиксу, оканчивающемуся на "_".
+        """
+        self._callbacks[data] = _Route(handler)
+
+    @property
+    def has_fallbacks(self) -> bool:
+        return bool(self._fallbacks)
+
+    def knows_text(self, text: str) -> bool:
+        return text in self._texts
+
+    def resolve_text(self, text: str, state, screen: str):
+        """
+        Возвращает (маршрут, сбросить_экран) для текста в данном контексте.
+        Кнопки, не привязанные к экрану, нажатые на другом экране, уводят с него,
+        поэтому сохранённый экран нужно сбросить.
+        """
+        context = state or screen
+        routes = self._texts.get(text)
+        if routes:
+            route = routes.get(context)
+            if route is not None:
+                return route, False
+            if state is None:
+                route = routes.get(IDLE)
+                if route is not None:
+                    return route, screen != MAIN_SCREEN
+            route = routes.get(ANY)
+            if route is not None:
+                return route, False
+        return self._fallbacks.get(context), False
+
+    def resolve_callback(self, data: str):
+        route = self._callbacks.get(data)
+        if route is None:
+            separator = data.find('_')
+            if separator != -1:
+                route = self._callbacks.get(data[:separator + 1])
+        return route
+
+
+class RouterMiddleware(BaseMiddleware):
+    """
+    Передаёт сообщения и callback-запросы обработчикам из Router до проверки
+    фильтров aiogram. Если маршрут не найден, обновление обрабатывается как обычно
+    (команды, документы и т. п.). Перед вызовом обработчика, как и aiogram,
+    вызываются стадии process_* и post_process_* остальных middleware.
+    """
+
+    def __init__(self, router: Router):
+        super().__init__()
+        self.router = router
+
+    async def _dispatch(self, key: str, route: _Route, event, data: dict, fsm):
+        results = []
+        ctx_token = current_handler.set(route.handler)
+        try:
+            await self.manager.trigger(f"process_{key}", (event, data))
+            response = await route(event, fsm)
+            if response is not None:
+                results.append(response)
+        except CancelHandler:
+            pass
+        finally:
+            current_handler.reset(ctx_token)
+            await self.manager.trigger(f"post_process_{key}", (event, results, data))
+        raise CancelHandler()
+
+    async def on_pre_process_message(self, message: types.Message, data: dict):
+        text = message.text
+        if text is None or message.is_command():
+            return
+        if not self.router.knows_text(text) and not self.router.has_fallbacks:
+            return
+
+        dispatcher = self.manager.dispatcher
+        fsm = dispatcher.current_state(chat=message.chat.id, user=message.from_user.id)
+        state = await fsm.get_state()
+        screen = MAIN_SCREEN
+        if state is None:
+            screen = (await fsm.get_data()).get('screen') or MAIN_SCREEN
+
+        route, leave_screen = self.router.resolve_text(text, state, screen)
+        if route is None:
+            return
+        if leave_screen:
+            await fsm.reset_data()
+        await self._dispatch('message', route, message, data, fsm)
+
+    async def on_pre_process_callback_query(self, call: types.CallbackQuery, data: dict):
+        if not call.data:
+            return
+        route = self.router.resolve_callback(call.data)
+        if route is None:
+            return
+        chat_id = call.message.chat.id if call.message else call.from_user.id
+        fsm = self.manager.dispatcher.current_state(chat=chat_id, user=call.from_user.id)
+        await self._dispatch('callback_query', route, call, data, fsm)
@@ -0,0 +1,492 @@
+# sqlite_storage.py
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+
+from config import (
+    AUTHORIZED_USERS_FILE,
+    BANNED_USERS_FILE,
+    KEYS_ISSUED_FILE,
+    KEYS_LOG_FILE,
+    KEYS_LOG_COMPACTING_FILE,
+    KEYS_LOG_SNAPSHOT_FILE,
+    KEYS_LOG_ARCHIVE_DIR,
+    SITE_EXCEPTIONS_FILE,
+    KEY_LIMIT_FILE,
+    USER_LIMITS_FILE,
+    USERS_DIR,
+    SQLITE_DB_FILE
+)
+from issuance_index import parse_issuance_line, parse_stats_line
+from issuance_rollups import OPEN_DAYS
+from log_compaction import list_segments, read_snapshot
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS bans (
+    user_id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS limits (
+    user_id INTEGER PRIMARY KEY,
+    key_limit INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS issuances (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    issued_at TEXT NOT NULL,
+    username TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    key_filename TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_issuances_user ON issuances (user_id);
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS issued_keys (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    key_filename TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_issued_keys_user ON issued_keys (user_id);
+CREATE TABLE IF NOT EXISTS exceptions (
+    url TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS lines (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    line TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_lines_path ON lines (path);
+CREATE TABLE IF NOT EXISTS issuance_hourly (
+    hour TEXT PRIMARY KEY,
+    issued INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS issuance_daily (
+    day TEXT PRIMARY KEY,
+    issued INTEGER NOT NULL,
+    active INTEGER NOT NULL
+);
+"""
+
+# Пересчёт сводок выдачи по таблице issuances (после импорта журнала или для старой базы)
+REBUILD_ROLLUPS_SQL = """
+DELETE FROM issuance_hourly;
+DELETE FROM issuance_daily;
+INSERT INTO issuance_hourly (hour, issued)
+    SELECT substr(issued_at, 1, 13), COUNT(*) FROM issuances
+    WHERE substr(issued_at, 5, 1) = '-' AND substr(issued_at, 11, 1) = ' ' GROUP BY 1;
+INSERT INTO issuance_daily (day, issued, active)
+    SELECT substr(issued_at, 1, 10), COUNT(*), COUNT(DISTINCT user_id) FROM issuances
+    WHERE substr(issued_at, 5, 1) = '-' AND substr(issued_at, 11, 1) = ' ' GROUP BY 1;
+"""
+
+def _parse_user_id(line: str):
+    return (int(line),) if line.isdigit() else None
+
+
+def _parse_user_limit(line: str):
+    parts = line.split(':')
+    if len(parts) != 2:
+        return None
+    try:
+        return int(parts[0]), int(parts[1])
+    except ValueError:
+        return None
+
+
+def _parse_issued_key(line: str):
+    user_id, sep, key_filename = line.partition(':')
+    if not sep or not user_id.isdigit() or not key_filename:
+        return None
+    return int(user_id), key_filename
+
+
+def _parse_url(line: str):
+    return (line,) if line else None
+
+
+class _FileTable:
+    """
+    Описывает, как строки одного текстового файла раскладываются по таблице.
+    Строки, которые не удалось разобрать ни одной таблицей файла, хранятся в общей таблице lines.
+    """
+
+    def __init__(self, table: str, columns: tuple, parse, render, replace: bool):
+        self.table = table
+        self.columns = columns
+        self.parse = parse
+        self.render = render
+        verb = "INSERT OR REPLACE" if replace else "INSERT"
+        placeholders = ", ".join("?" for _ in columns)
+        self.insert_sql = f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+        self.select_sql = f"SELECT {', '.join(columns)} FROM {table} ORDER BY rowid"
+        self.delete_sql = f"DELETE FROM {table} WHERE " + " AND ".join(f"{c} = ?" for c in columns)
+        self.clear_sql = f"DELETE FROM {table}"
+
+
+FILE_TABLES = {
+    AUTHORIZED_USERS_FILE: _FileTable('users', ('user_id',), _parse_user_id, lambda r: str(r[0]), replace=True),
+    BANNED_USERS_FILE: _FileTable('bans', ('user_id',), _parse_user_id, lambda r: str(r[0]), replace=True),
+    USER_LIMITS_FILE: _FileTable('limits', ('user_id', 'key_limit'), _parse_user_limit, lambda r: f"{r[0]}:{r[1]}", replace=True),
+    KEYS_ISSUED_FILE: _FileTable('issued_keys', ('user_id', 'key_filename'), _parse_issued_key, lambda r: f"{r[0]}:{r[1]}", replace=False),
+    KEYS_LOG_FILE: _FileTable('issuances', ('issued_at', 'username', 'user_id', 'key_filename'), parse_issuance_line,
+                              lambda r: f"{r[0]} - User: {r[1]} (ID: {r[2]}) - Key: {r[3]}", replace=False),
+    SITE_EXCEPTIONS_FILE: _FileTable('exceptions', ('url',), _parse_url, lambda r: r[0], replace=True),
+}
+
+# Дополнительные таблицы файла: строка, не подошедшая основной таблице, пробуется в них.
+# Строки статистики user_id:stats:count хранятся по одной на пользователя (последнее значение)
+EXTRA_FILE_TABLES = {
+    KEYS_LOG_FILE: (_FileTable('user_stats', ('user_id', 'count'), parse_stats_line,
+                               lambda r: f"{r[0]}:stats:{r[1]}", replace=True),),
+}
+
+GLOBAL_LIMIT_SETTING = 'global_limit'
+
+
+def _file_tables(file_path: str) -> tuple:
+    table = FILE_TABLES.get(file_path)
+    return ((table,) if table else ()) + EXTRA_FILE_TABLES.get(file_path, ())
+
+
+class SQLiteStorage:
+    """
+    Хранилище данных бота в SQLite (режим WAL).
+    Повторяет построчную модель текстовых файлов из data/users, но хранит
+    данные в индексированных таблицах. Все обращения к базе выполняются
+    в отдельном потоке, чтобы не блокировать цикл событий.
+    """
+
+    def __init__(self, db_path: str = SQLITE_DB_FILE):
+        self.db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def handles(self, file_path: str) -> bool:
+        """
+        Возвращает True, если файл относится к данным пользователей и хранится в базе.
+        """
+        return os.path.dirname(os.path.abspath(file_path)) == os.path.abspath(USERS_DIR) and file_path.endswith('.txt')
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(SCHEMA)
+            self._move_stats_lines(conn)
+            self._conn = conn
+            logger.info(f"Открыта база данных SQLite: {self.db_path}")
+        return self._conn
+
+    @staticmethod
+    def _move_stats_lines(conn):
+        # Старые базы хранили каждую строку статистики в таблице lines: переносим последние значения в user_stats
+        path = os.path.basename(KEYS_LOG_FILE)
+        rows = conn.execute("SELECT id, line FROM lines WHERE path = ? ORDER BY id", (path,)).fetchall()
+        moved = [(row_id, parse_stats_line(line)) for row_id, line in rows]
+        moved = [(row_id, values) for row_id, values in moved if values is not None]
+        if not moved:
+            return
+        table = EXTRA_FILE_TABLES[KEYS_LOG_FILE][0]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(table.insert_sql, [values for _, values in moved])
+            conn.executemany("DELETE FROM lines WHERE id = ?", [(row_id,) for row_id, _ in moved])
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        logger.info(f"Строки статистики перенесены в таблицу user_stats: {len(moved)}")
+
+    def _run_sync(self, func, *args):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(conn, *args)
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+
+    async def _run(self, func, *args):
+        return await asyncio.to_thread(self._run_sync, func, *args)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # Построчный API, повторяющий работу с файлами
+
+    @staticmethod
+    def _read_lines(conn, file_path: str) -> list:
+        lines = []
+        if file_path == KEY_LIMIT_FILE:
+            row = conn.execute("SELECT value FROM settings WHERE name = ?", (GLOBAL_LIMIT_SETTING,)).fetchone()
+            if row:
+                lines.append(row[0])
+        for table in _file_tables(file_path):
+            lines.extend(table.render(row) for row in conn.execute(table.select_sql))
+        lines.extend(row[0] for row in conn.execute(
+            "SELECT line FROM lines WHERE path = ? ORDER BY id", (os.path.basename(file_path),)
+        ))
+        return lines
+
+    @staticmethod
+    def _append_line(conn, file_path: str, line: str):
+        line = line.strip()
+        if file_path == KEY_LIMIT_FILE and line:
+            conn.execute(
+                "INSERT OR IGNORE INTO settings (name, value) VALUES (?, ?)", (GLOBAL_LIMIT_SETTING, line)
+            )
+            return
+        for table in _file_tables(file_path):
+            values = table.parse(line)
+            if values is not None:
+                conn.execute(table.insert_sql, values)
+                return
+        conn.execute("INSERT INTO lines (path, line) VALUES (?, ?)", (os.path.basename(file_path), line))
+
+    @staticmethod
+    def _replace_lines(conn, file_path: str, lines: list):
+        if file_path == KEY_LIMIT_FILE:
+            conn.execute("DELETE FROM settings WHERE name = ?", (GLOBAL_LIMIT_SETTING,))
+        for table in _file_tables(file_path):
+            conn.execute(table.clear_sql)
+        conn.execute("DELETE FROM lines WHERE path = ?", (os.path.basename(file_path),))
+        for line in lines:
+            SQLiteStorage._append_line(conn, file_path, str(line))
+        if file_path == KEYS_LOG_FILE:
+            SQLiteStorage._rebuild_rollups(conn)
+
+    @staticmethod
+    def _rebuild_rollups(conn):
+        # executescript завершает текущую транзакцию, поэтому выражения выполняются по одному
+        for statement in REBUILD_ROLLUPS_SQL.split(';'):
+            if statement.strip():
+                conn.execute(statement)
+
+    @staticmethod
+    def _remove_line(conn, file_path: str, line: str):
+        line = line.strip()
+        parsed = [(table, table.parse(line)) for table in _file_tables(file_path)]
+        parsed = [(table, values) for table, values in parsed if values is not None]
+        if parsed:
+            table, values = parsed[0]
+            conn.execute(table.delete_sql, values)
+        elif file_path == KEY_LIMIT_FILE:
+            conn.execute("DELETE FROM settings WHERE name = ? AND value = ?", (GLOBAL_LIMIT_SETTING, line))
+        conn.execute("DELETE FROM lines WHERE path = ? AND line = ?", (os.path.basename(file_path), line))
+
+    async def read_lines(self, file_path: str) -> list:
+        return await self._run(self._read_lines, file_path)
+
+    async def append_line(self, file_path: str, line: str):
+        await self._run(self._append_line, file_path, line)
+
+    async def replace_lines(self, file_path: str, lines: list):
+        await self._run(self._replace_lines, file_path, lines)
+
+    async def remove_line(self, file_path: str, line: str):
+        await self._run(self._remove_line, file_path, line)
+
+    # Точечные запросы по индексам
+
+    async def get_global_limit(self):
+        def query(conn):
+            row = conn.execute("SELECT value FROM settings WHERE name = ?", (GLOBAL_LIMIT_SETTING,)).fetchone()
+            return row[0] if row else None
+        return await self._run(query)
+
+    async def set_global_limit(self, new_limit: int):
+        def query(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?)", (GLOBAL_LIMIT_SETTING, str(new_limit))
+            )
+        await self._run(query)
+
+    async def set_user_limit(self, user_id: int, limit: int):
+        def query(conn):
+            conn.execute("INSERT OR REPLACE INTO limits (user_id, key_limit) VALUES (?, ?)", (user_id, limit))
+        await self._run(query)
+
+    async def log_issuance(self, issued_at: str, username: str, user_id: int, key_filename: str):
+        """
+        Записывает выдачу ключа в журнал, в список выданных ключей и в сводки выдачи одной транзакцией.
+        """
+        def query(conn):
+            hour, day = issued_at[:13], issued_at[:10]
+            # Пользователь активен за день с первой выдачи; его выдачи находятся по индексу user_id
+            first_today = conn.execute(
+                "SELECT 1 FROM issuances WHERE user_id = ? AND issued_at >= ? LIMIT 1", (user_id, day)
+            ).fetchone() is None
+            conn.execute(FILE_TABLES[KEYS_LOG_FILE].insert_sql, (issued_at, username, user_id, key_filename))
+            conn.execute(FILE_TABLES[KEYS_ISSUED_FILE].insert_sql, (user_id, key_filename))
+            conn.execute(
+                "INSERT INTO issuance_hourly (hour, issued) VALUES (?, 1) "
+                "ON CONFLICT (hour) DO UPDATE SET issued = issued + 1", (hour,)
+            )
+            conn.execute(
+                "INSERT INTO issuance_daily (day, issued, active) VALUES (?, 1, ?) "
+                "ON CONFLICT (day) DO UPDATE SET issued = issued + 1, active = active + excluded.active",
+                (day, int(first_today))
+            )
+        await self._run(query)
+
+    async def load_rollups(self) -> dict:
+        """
+        Возвращает сводки выдачи в формате IssuanceRollups.dump().
+        Пользователи за последние OPEN_DAYS дней читаются с конца журнала до начала первого из этих дней.
+        """
+        def query(conn):
+            if conn.execute("SELECT 1 FROM issuance_hourly LIMIT 1").fetchone() is None:
+                SQLiteStorage._rebuild_rollups(conn)
+            hourly = dict(conn.execute("SELECT hour, issued FROM issuance_hourly"))
+            daily = {day: [issued, active] for day, issued, active in conn.execute("SELECT day, issued, active FROM issuance_daily")}
+            open_days = sorted(daily)[-OPEN_DAYS:]
+            day_users = {day: set() for day in open_days}
+            if open_days:
+                for issued_at, user_id in conn.execute("SELECT issued_at, user_id FROM issuances ORDER BY id DESC"):
+                    if issued_at[:10] < open_days[0]:
+                        break
+                    if issued_at[:10] in day_users:
+                        day_users[issued_at[:10]].add(user_id)
+            return {'hourly': hourly, 'daily': daily, 'day_users': day_users}
+        return await self._run(query)
+
+    async def load_issuance_counts(self) -> dict:
+        """
+        Возвращает агрегат выдачи в формате снимка журнала: {'counts': {user_id: число выдач},
+        'stats': {user_id: счётчик статистики}}. Считается запросами GROUP BY по индексу user_id,
+        без чтения всех строк журнала.
+        """
+        def query(conn):
+            return {
+                'counts': dict(conn.execute("SELECT user_id, COUNT(*) FROM issuances GROUP BY user_id")),
+                'stats': dict(conn.execute("SELECT user_id, count FROM user_stats")),
+            }
+        return await self._run(query)
+
+    async def recent_issuances(self, limit: int, user_id: int = None) -> list:
+        """
+        Возвращает последние выдачи ключей (новые первыми) в виде кортежей
+        (timestamp, username, user_id, key_filename).
+        """
+        def query(conn):
+            if user_id is None:
+                rows = conn.execute(
+                    "SELECT issued_at, username, user_id, key_filename FROM issuances ORDER BY id DESC LIMIT ?", (limit,)
+                )
+            else:
+                rows = conn.execute(
+                    "SELECT issued_at, username, user_id, key_filename FROM issuances WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                    (user_id, limit)
+                )
+            return [tuple(row) for row in rows]
+        return await self._run(query)
+
+    async def key_files(self, user_id: int = None) -> dict:
+        """
+        Возвращает имена выданных файлов ключей по пользователям в порядке выдачи
+        (только для user_id, если он задан).
+        """
+        def query(conn):
+            if user_id is None:
+                rows = conn.execute("SELECT user_id, key_filename FROM issuances ORDER BY id")
+            else:
+                rows = conn.execute("SELECT user_id, key_filename FROM issuances WHERE user_id = ? ORDER BY id", (user_id,))
+            files = {}
+            for row_user_id, key_filename in rows:
+                files.setdefault(row_user_id, []).append(key_filename)
+            return files
+        return await self._run(query)
+
+    def iter_issuances(self):
+        """
+        Перебирает все выдачи ключей по порядку через отдельное соединение только для чтения.
+        Вызывается из рабочего потока: в режиме WAL чтение видит согласованный снимок
+        и не мешает записи новых выдач, а строки читаются курсором по одной.
+        """
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            yield from conn.execute("SELECT issued_at, username, user_id, key_filename FROM issuances ORDER BY id")
+        finally:
+            conn.close()
+
+    # Миграция из текстовых файлов
+
+    @staticmethod
+    def _read_text_lines(file_path: str) -> list:
+        if not os.path.exists(file_path):
+            return []
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+
+    @classmethod
+    def _compacted_keys_log(cls, users_dir: str) -> list:
+        """
+        Строки журнала выдачи, уже перенесённые уплотнением: архивные сегменты от старых к новым,
+        статистика из снимка и прерванное уплотнение. Импортируются перед keys_log.txt,
+        чтобы более новые строки статистики перекрывали старые.
+        """
+        archive_dir = os.path.join(users_dir, os.path.basename(KEYS_LOG_ARCHIVE_DIR))
+        lines = []
+        for segment in list_segments(archive_dir):
+            lines.extend(cls._read_text_lines(segment))
+        snapshot = read_snapshot(os.path.join(users_dir, os.path.basename(KEYS_LOG_SNAPSHOT_FILE)))
+        lines.extend(f"{user_id}:stats:{count}" for user_id, count in snapshot['stats'].items())
+        lines.extend(cls._read_text_lines(os.path.join(users_dir, os.path.basename(KEYS_LOG_COMPACTING_FILE))))
+        return lines
+
+    def migrate_from_files(self, users_dir: str = USERS_DIR) -> dict:
+        """
+        Импортирует все *.txt файлы из users_dir в базу, заменяя уже импортированные данные.
+        Журнал выдачи импортируется вместе с архивом и снимком уплотнения.
+        Возвращает словарь {имя файла: количество строк}.
+        """
+        keys_log_name = os.path.basename(KEYS_LOG_FILE)
+        compacted = self._compacted_keys_log(users_dir)
+        filenames = {filename for filename in os.listdir(users_dir) if filename.endswith('.txt')}
+        if compacted:
+            # После уплотнения живого журнала может ещё не быть
+            filenames.add(keys_log_name)
+        imported = {}
+        for filename in sorted(filenames):
+            lines = self._read_text_lines(os.path.join(users_dir, filename))
+            if filename == keys_log_name:
+                lines = compacted + lines
+            self._run_sync(self._replace_lines, os.path.join(USERS_DIR, filename), lines)
+            imported[filename] = len(lines)
+        return imported
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Импорт данных бота из текстовых файлов в SQLite.")
+    parser.add_argument('--users-dir', default=USERS_DIR, help="Папка с *.txt файлами пользователей")
+    parser.add_argument('--db', default=SQLITE_DB_FILE, help="Путь к файлу базы данных")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    storage = SQLiteStorage(args.db)
+    for filename, count in storage.migrate_from_files(args.users_dir).items():
+        print(f"{filename}: импортировано строк: {count}")
+    storage.close()
+    print(f"Готово. Для использования базы задайте STORAGE_BACKEND=sqlite ({args.db}).")
@@ -25,4 +25,18 @@ class GlobalSettingsForm(StatesGroup):
     waiting_for_limit = State()  # Установка глобального лимита
 
 class SupportReplyStates(StatesGroup):
-    waiting_for_reply = State()
\ No newline at end of file
+    waiting_for_reply = State()
+
+# Экраны без состояния FSM: сохраняются в данных FSM под ключом screen
+SCREEN_USERS = 'users'  # Список пользователей (управление)
+SCREEN_USER_ACTIONS = 'user_actions'  # Действия с выбранным пользователем
+SCREEN_STATS = 'stats'  # Список пользователей (статистика)
+SCREEN_STATS_USER = 'stats_user'  # Ключи выбранного пользователя
+
+# Время жизни незавершённых диалогов (сек) по состояниям; для остальных действует FSM_STATE_TTL
+STATE_TTLS = {
+    **dict.fromkeys(WishesStates.all_states_names, 30 * 60),
+    **dict.fromkeys(VPNSupportStates.all_states_names, 30 * 60),
+    **dict.fromkeys(AddSiteForm.all_states_names, 30 * 60),
+    **dict.fromkeys(SupportReplyStates.all_states_names, 24 * 60 * 60),
+}
@@ -0,0 +1,47 @@
+# tests/conftest.py
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+# Конфигурация бота читается при импорте, поэтому окружение и рабочая папка задаются заранее
+WORK_DIR = tempfile.mkdtemp(prefix='bot_tests_')
+os.chdir(WORK_DIR)
+shutil.copy(os.path.join(ROOT_DIR, 'messages.json'), WORK_DIR)
+os.environ.update({
+    'API_TOKEN': '123456:TEST',
+    'AUTHORIZED_USER_ID': '1',
+    'ADMIN_USERNAME': 'admin',
+    'BOT_MODE': 'polling',
+    'WEBHOOK_SECRET': 'test-webhook-secret',
+    'STORAGE_BACKEND': 'files',
+    'FSM_STORAGE': 'memory',
+    'METRICS_PORT': '',
+    'STAGING_CHAT_ID': '',
+})
+
+
+@pytest.fixture
+def data_dir():
+    """
+    Пустая папка data и сброшенные индексы в памяти для каждого теста.
+    """
+    import config
+    import utils
+
+    shutil.rmtree(config.DATA_DIR, ignore_errors=True)
+    os.makedirs(config.USERS_DIR)
+    os.makedirs(config.CONFIGS_DIR)
+    # Реестр, индексы и очередь ключей загружаются при первом обращении
+    for value in list(vars(utils).values()):
+        if isinstance(getattr(value, 'loaded', None), bool):
+            value.loaded = False
+    yield config.DATA_DIR
+    shutil.rmtree(config.DATA_DIR, ignore_errors=True)
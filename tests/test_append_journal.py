@@ -0,0 +1,159 @@
+# tests/test_append_journal.py
+
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+import config
+import utils
+from append_journal import AppendJournal
+
+
+@pytest.fixture
+def slow_flush(monkeypatch):
+    """
+    Замедляет фоновую запись журнала. Событие устанавливается, когда строки уже
+    забраны из очереди и пишутся в отдельном потоке.
+    """
+    in_flight = threading.Event()
+    write_batch = AppendJournal._write_batch
+
+    def slow_write_batch(batch, fsync):
+        in_flight.set()
+        time.sleep(0.2)
+        return write_batch(batch, fsync)
+
+    monkeypatch.setattr(AppendJournal, '_write_batch', staticmethod(slow_write_batch))
+    return in_flight
+
+
+def _write_users(lines: list):
+    with open(config.AUTHORIZED_USERS_FILE, 'w', encoding='utf-8') as f:
+        f.write(''.join(f"{line}\n" for line in lines))
+
+
+def test_remove_during_flush_keeps_appended_line(data_dir, slow_flush):
+    _write_users(['20'])
+
+    async def scenario():
+        registry = await utils.get_user_registry()
+        await utils.append_to_file(config.AUTHORIZED_USERS_FILE, '30')
+        await asyncio.to_thread(slow_flush.wait, 5)
+        await utils.remove_from_file(config.AUTHORIZED_USERS_FILE, '20')
+        await utils.close_storage()
+        return registry
+
+    registry = asyncio.run(scenario())
+    with open(config.AUTHORIZED_USERS_FILE, 'r', encoding='utf-8') as f:
+        assert f.read().split() == ['30']
+    assert registry.authorized == {30}
+
+
+def test_read_during_flush_sees_appended_line(data_dir, slow_flush):
+    _write_users(['20'])
+
+    async def scenario():
+        await utils.append_to_file(config.AUTHORIZED_USERS_FILE, '30')
+        await asyncio.to_thread(slow_flush.wait, 5)
+        lines = await utils.read_file(config.AUTHORIZED_USERS_FILE)
+        await utils.close_storage()
+        return lines
+
+    assert asyncio.run(scenario()) == ['20', '30']
+
+
+def test_append_during_rewrite_is_kept(data_dir, monkeypatch):
+    _write_users(['20'])
+    rewriting = threading.Event()
+    write_file_atomic = utils._write_file_atomic
+
+    def slow_write_file_atomic(file_path, lines, fsync):
+        rewriting.set()
+        time.sleep(0.2)
+        write_file_atomic(file_path, lines, fsync)
+
+    monkeypatch.setattr(utils, '_write_file_atomic', slow_write_file_atomic)
+
+    async def scenario():
+        registry = await utils.get_user_registry()
+        rewrite = asyncio.create_task(utils.write_file(config.AUTHORIZED_USERS_FILE, ['40']))
+        await asyncio.to_thread(rewriting.wait, 5)
+        await utils.append_to_file(config.AUTHORIZED_USERS_FILE, '30', durable=True)
+        await rewrite
+        await utils.close_storage()
+        return registry
+
+    registry = asyncio.run(scenario())
+    with open(config.AUTHORIZED_USERS_FILE, 'r', encoding='utf-8') as f:
+        assert f.read().split() == ['40', '30']
+    assert registry.authorized == {30, 40}
+
+
+def test_exclusive_blocks_are_never_concurrent(tmp_path):
+    journal = AppendJournal(commit_interval=0)
+    file_path = str(tmp_path / 'journal.txt')
+    holders = []
+    max_holders = []
+
+    async def hold(delay):
+        await asyncio.sleep(delay)
+        async with journal.exclusive(file_path):
+            holders.append(delay)
+            max_holders.append(len(holders))
+            await asyncio.sleep(0.01)
+            holders.remove(delay)
+
+    async def append_and_flush(delay):
+        await asyncio.sleep(delay)
+        await journal.append(file_path, str(delay))
+        await journal.flush()
+
+    async def scenario():
+        # Вызовы начинаются вразнобой, в том числе сразу после освобождения замка
+        await asyncio.gather(*(hold(i * 0.005) for i in range(10)), *(append_and_flush(i * 0.007) for i in range(5)))
+        await journal.stop()
+
+    asyncio.run(scenario())
+    assert max(max_holders) == 1
+    with open(file_path, 'r', encoding='utf-8') as f:
+        assert len(f.read().split()) == 5
+
+
+def test_concurrent_rewrites_keep_file_and_registry_in_sync(data_dir, monkeypatch):
+    _write_users([str(uid) for uid in range(1, 21)])
+    write_file_atomic = utils._write_file_atomic
+
+    def slow_write_file_atomic(file_path, lines, fsync):
+        # Перезапись занимает время: пересекающиеся перезаписи потеряли бы изменения
+        time.sleep(0.005)
+        write_file_atomic(file_path, lines, fsync)
+
+    monkeypatch.setattr(utils, '_write_file_atomic', slow_write_file_atomic)
+
+    async def later(delay, call):
+        await asyncio.sleep(delay)
+        await call
+
+    async def scenario():
+        registry = await utils.get_user_registry()
+        calls = []
+        for i, uid in enumerate(range(1, 21, 2)):
+            calls.append(later(i * 0.003, utils.remove_from_file(config.AUTHORIZED_USERS_FILE, str(uid))))
+        for i, uid in enumerate(range(30, 35)):
+            calls.append(later(i * 0.004, utils.append_to_file(config.AUTHORIZED_USERS_FILE, str(uid))))
+        calls.append(later(0.01, utils.write_file(config.AUTHORIZED_USERS_FILE, [str(uid) for uid in range(2, 21, 2)])))
+        calls.append(later(0.02, utils.remove_from_file(config.AUTHORIZED_USERS_FILE, '4')))
+        await asyncio.gather(*calls)
+        await utils.close_storage()
+        return registry
+
+    registry = asyncio.run(scenario())
+    with open(config.AUTHORIZED_USERS_FILE, 'r', encoding='utf-8') as f:
+        in_file = [int(line) for line in f.read().split()]
+    assert len(in_file) == len(set(in_file))
+    assert set(in_file) == registry.authorized
+    assert 4 not in registry.authorized
+    assert not [name for name in os.listdir(config.USERS_DIR) if name.endswith('.tmp')]
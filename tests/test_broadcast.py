@@ -0,0 +1,100 @@
+# tests/test_broadcast.py
+
+import asyncio
+import os
+from types import SimpleNamespace
+
+from aiogram.utils.exceptions import RetryAfter
+
+from broadcast import BroadcastEngine
+
+ADMIN_ID = 999
+
+
+class FakeBot:
+    def __init__(self, block_on=None, fail=(), flood=()):
+        self.block_on = block_on
+        self.fail = set(fail)
+        self.flood = set(flood)
+        self.sent = []
+        self.edits = []
+        self.blocked = None
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id == self.block_on:
+            self.blocked.set()
+            await asyncio.Event().wait()
+        if chat_id in self.flood:
+            self.flood.discard(chat_id)
+            raise RetryAfter(0)
+        if chat_id in self.fail:
+            raise RuntimeError('Forbidden: bot was blocked by the user')
+        self.sent.append(chat_id)
+        return SimpleNamespace(message_id=100)
+
+    async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        self.edits.append(text)
+
+
+def _engine(tmp_path, concurrency=1):
+    return BroadcastEngine(str(tmp_path / 'broadcast.json'), rate=1000, concurrency=concurrency, progress_interval=60)
+
+
+def test_delivers_to_every_recipient_once(tmp_path):
+    engine = _engine(tmp_path, concurrency=4)
+    bot = FakeBot(fail={3}, flood={5})
+
+    async def scenario():
+        assert await engine.start(bot, ADMIN_ID, 'hello', [2, 3, 4, 5, 2, 6])
+        assert not await engine.start(bot, ADMIN_ID, 'again', [7])
+        await engine._task
+
+    asyncio.run(scenario())
+    # Сообщение с прогрессом администратору и по одному сообщению каждому получателю
+    assert sorted(bot.sent) == [2, 4, 5, 6, ADMIN_ID]
+    assert (engine.state['sent'], engine.state['failed']) == (4, 1)
+    assert 'Рассылка завершена' in bot.edits[-1]
+    assert not os.path.exists(engine.state_path)
+
+
+def test_resume_continues_after_restart(tmp_path):
+    first = _engine(tmp_path)
+    bot = FakeBot(block_on=6)
+
+    async def interrupted():
+        bot.blocked = asyncio.Event()
+        await first.start(bot, ADMIN_ID, 'hello', list(range(2, 11)))
+        await bot.blocked.wait()
+        await first.stop()
+
+    asyncio.run(interrupted())
+    assert bot.sent == [ADMIN_ID, 2, 3, 4, 5]
+    assert os.path.exists(first.state_path)
+
+    second = _engine(tmp_path)
+    resumed_bot = FakeBot()
+
+    async def resumed():
+        assert await second.resume(resumed_bot)
+        await second._task
+
+    asyncio.run(resumed())
+    assert resumed_bot.sent == [6, 7, 8, 9, 10]
+    assert (second.state['sent'], second.state['failed']) == (9, 0)
+    assert not os.path.exists(second.state_path)
+
+
+def test_resume_without_saved_state(tmp_path):
+    engine = _engine(tmp_path)
+    assert asyncio.run(engine.resume(FakeBot())) is False
+
+
+def test_cursor_skips_recipients_done_out_of_order(tmp_path):
+    engine = _engine(tmp_path)
+    engine.state = {'cursor': 0, 'ahead': set(), 'sent': 0, 'failed': 0}
+    engine._mark_done(1, True)
+    engine._mark_done(2, False)
+    assert engine.state['cursor'] == 0 and engine.state['ahead'] == {1, 2}
+    engine._mark_done(0, True)
+    assert engine.state['cursor'] == 3 and engine.state['ahead'] == set()
+    assert (engine.state['sent'], engine.state['failed']) == (2, 1)
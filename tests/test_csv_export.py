@@ -0,0 +1,85 @@
+# tests/test_csv_export.py
+
+import asyncio
+import csv
+import gzip
+import os
+
+import config
+import utils
+from csv_export import ISSUANCES_HEADER, USERS_HEADER, iter_user_rows, write_csv
+
+
+def _read_csv(file_path):
+    opener = gzip.open if file_path.endswith('.gz') else open
+    with opener(file_path, 'rt', encoding='utf-8', newline='') as f:
+        return list(csv.reader(f))
+
+
+class FakeQuota:
+    def limit_for(self, user_id):
+        return {2: 5}.get(user_id, 1)
+
+
+def test_write_csv_plain_and_compressed():
+    rows = [(1, 'a,b', 'строка "в кавычках"')]
+    for compress in (False, True):
+        file_path = write_csv(iter(rows), ('id', 'text', 'note'), compress)
+        try:
+            assert file_path.endswith('.csv.gz' if compress else '.csv')
+            assert _read_csv(file_path) == [['id', 'text', 'note'], ['1', 'a,b', 'строка "в кавычках"']]
+        finally:
+            os.remove(file_path)
+
+
+def test_write_csv_removes_file_on_error(tmp_path, monkeypatch):
+    monkeypatch.setattr('tempfile.tempdir', str(tmp_path))
+
+    def rows():
+        yield (1,)
+        raise OSError('диск переполнен')
+
+    try:
+        write_csv(rows(), ('id',))
+    except OSError:
+        pass
+    assert os.listdir(tmp_path) == []
+
+
+def test_user_rows_have_status_limit_and_keys():
+    key_files = {2: ['wg1.conf', 'wg2.conf'], 9: ['wg3.conf']}
+    rows = list(iter_user_rows({9, 3, 2}, authorized={2, 3}, banned={3}, quota_index=FakeQuota(), key_files=key_files))
+    assert rows == [
+        (2, 'authorized', 5, 2, 'wg1.conf wg2.conf'),
+        (3, 'banned', 1, 0, ''),
+        (9, 'removed', 1, 1, 'wg3.conf'),
+    ]
+
+
+def test_export_from_files(data_dir):
+    async def scenario():
+        await utils.append_to_file(config.AUTHORIZED_USERS_FILE, '2')
+        await utils.append_to_file(config.BANNED_USERS_FILE, '3')
+        await utils.set_user_limit(2, 4)
+        await utils.log_key_issuance(2, 'alice', 'wg1.conf')
+        await utils.log_key_issuance(7, 'bob', 'wg2.conf')
+        result = await utils.export_users_csv(), await utils.export_issuances_csv(compress=True)
+        await utils.close_storage()
+        return result
+
+    users_path, issuances_path = asyncio.run(scenario())
+    try:
+        users = _read_csv(users_path)
+        issuances = _read_csv(issuances_path)
+    finally:
+        os.remove(users_path)
+        os.remove(issuances_path)
+
+    assert users[0] == list(USERS_HEADER)
+    assert [row[:5] for row in users[1:]] == [
+        ['2', 'authorized', '4', '1', 'wg1.conf'],
+        ['3', 'banned', str(utils.DEFAULT_GLOBAL_LIMIT), '0', ''],
+        ['7', 'removed', str(utils.DEFAULT_GLOBAL_LIMIT), '1', 'wg2.conf'],
+    ]
+    assert issuances[0] == list(ISSUANCES_HEADER)
+    assert [row[1:] for row in issuances[1:]] == [['alice', '2', 'wg1.conf'], ['bob', '7', 'wg2.conf']]
@@ -0,0 +1,113 @@
+# tests/test_fsm_expiry.py
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import fsm_storage
+from fsm_storage import ExpiringMemoryStorage, SQLiteFSMStorage, fsm_expiry_worker
+
+STATE_TTLS = {'Form:short': 10}
+DEFAULT_TTL = 100
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Подменяем часы только в fsm_storage: цикл событий asyncio продолжает идти по настоящим
+    now = [1000.0]
+    monkeypatch.setattr(fsm_storage, 'time', SimpleNamespace(time=lambda: now[0], monotonic=lambda: now[0]))
+    return now
+
+
+async def _fill(storage):
+    await storage.set_state(chat=1, user=1, state='Form:short')
+    await storage.set_state(chat=2, user=2, state='Form:long')
+    await storage.update_data(chat=3, user=3, data={'screen': 'stats'})
+
+
+@pytest.mark.parametrize('make_storage', [
+    lambda tmp_path: SQLiteFSMStorage(str(tmp_path / 'fsm.db')),
+    lambda tmp_path: ExpiringMemoryStorage(),
+], ids=['sqlite', 'memory'])
+def test_expire_uses_per_state_ttl(tmp_path, clock, make_storage):
+    storage = make_storage(tmp_path)
+
+    async def scenario():
+        await _fill(storage)
+        clock[0] += 50
+        first = await storage.expire(STATE_TTLS, DEFAULT_TTL), await storage.count_entries()
+        short_state = await storage.get_state(chat=1, user=1)
+        long_state = await storage.get_state(chat=2, user=2)
+        clock[0] += 60
+        second = await storage.expire(STATE_TTLS, DEFAULT_TTL), await storage.count_entries()
+        await storage.close()
+        return first, short_state, long_state, second
+
+    first, short_state, long_state, second = asyncio.run(scenario())
+    assert first == (1, 2)
+    assert short_state is None and long_state == 'Form:long'
+    assert second == (2, 0)
+
+
+def test_activity_extends_lifetime(tmp_path, clock):
+    storage = SQLiteFSMStorage(str(tmp_path / 'fsm.db'))
+
+    async def scenario():
+        await storage.set_state(chat=1, user=1, state='Form:short')
+        clock[0] += 8
+        await storage.update_data(chat=1, user=1, data={'step': 2})
+        clock[0] += 8
+        removed = await storage.expire(STATE_TTLS, DEFAULT_TTL)
+        state = await storage.get_state(chat=1, user=1)
+        await storage.close()
+        return removed, state
+
+    assert asyncio.run(scenario()) == (0, 'Form:short')
+
+
+def test_memory_storage_drops_empty_records_without_counting(clock):
+    storage = ExpiringMemoryStorage()
+
+    async def scenario():
+        # MemoryStorage создаёт пустую запись при каждом чтении
+        await storage.get_state(chat=5, user=5)
+        removed = await storage.expire(STATE_TTLS, DEFAULT_TTL)
+        return removed, storage.data, storage.touched
+
+    assert asyncio.run(scenario()) == (0, {}, {})
+
+
+def test_worker_updates_live_entries(tmp_path, clock):
+    storage = SQLiteFSMStorage(str(tmp_path / 'fsm.db'))
+
+    async def scenario():
+        await _fill(storage)
+        clock[0] += 50
+        worker = asyncio.create_task(fsm_expiry_worker(storage, STATE_TTLS, DEFAULT_TTL, 0))
+        while storage.live_entries != 2:
+            await asyncio.sleep(0.01)
+        worker.cancel()
+        await storage.close()
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
+
+
+@pytest.mark.parametrize('make_storage', [
+    lambda tmp_path: SQLiteFSMStorage(str(tmp_path / 'fsm.db')),
+    lambda tmp_path: ExpiringMemoryStorage(),
+], ids=['sqlite', 'memory'])
+def test_count_entries_skips_finished_records(tmp_path, clock, make_storage):
+    storage = make_storage(tmp_path)
+
+    async def scenario():
+        await _fill(storage)
+        # finish() оставляет в MemoryStorage запись без состояния и данных
+        await storage.finish(chat=1, user=1)
+        await storage.get_state(chat=4, user=4)
+        await storage.set_bucket(chat=5, user=5, bucket={'throttled': 1})
+        count = await storage.count_entries()
+        await storage.close()
+        return count
+
+    assert asyncio.run(scenario()) == 2
@@ -0,0 +1,117 @@
+# tests/test_fsm_storage.py
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from fsm_storage import SQLiteFSMStorage
+
+CHAT, USER = 10, 10
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'fsm.db')
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_state_data_and_bucket_round_trip(db_path):
+    storage = SQLiteFSMStorage(db_path)
+
+    async def scenario():
+        await storage.set_state(chat=CHAT, user=USER, state='Form:name')
+        await storage.update_data(chat=CHAT, user=USER, data={'a': 1}, b=2)
+        await storage.update_bucket(chat=CHAT, user=USER, bucket={'hits': 3})
+        result = (
+            await storage.get_state(chat=CHAT, user=USER),
+            await storage.get_data(chat=CHAT, user=USER),
+            await storage.get_bucket(chat=CHAT, user=USER),
+            await storage.get_state(chat=CHAT, user=99, default='Form:other'),
+        )
+        await storage.close()
+        return result
+
+    assert _run(scenario()) == ('Form:name', {'a': 1, 'b': 2}, {'hits': 3}, 'Form:other')
+
+
+def test_state_survives_restart(db_path):
+    async def before_restart():
+        storage = SQLiteFSMStorage(db_path)
+        await storage.set_state(chat=CHAT, user=USER, state='Form:name')
+        await storage.set_data(chat=CHAT, user=USER, data={'operator': 'МТС'})
+        await storage.close()
+
+    async def after_restart():
+        storage = SQLiteFSMStorage(db_path)
+        result = await storage.get_state(chat=CHAT, user=USER), await storage.get_data(chat=CHAT, user=USER)
+        await storage.close()
+        return result
+
+    _run(before_restart())
+    assert _run(after_restart()) == ('Form:name', {'operator': 'МТС'})
+
+
+def test_returned_data_is_a_copy(db_path):
+    storage = SQLiteFSMStorage(db_path)
+
+    async def scenario():
+        await storage.set_data(chat=CHAT, user=USER, data={'items': [1]})
+        data = await storage.get_data(chat=CHAT, user=USER)
+        data['items'].append(2)
+        result = await storage.get_data(chat=CHAT, user=USER)
+        await storage.close()
+        return result
+
+    assert _run(scenario()) == {'items': [1]}
+
+
+def test_finished_dialog_is_deleted(db_path):
+    storage = SQLiteFSMStorage(db_path)
+
+    async def scenario():
+        await storage.set_state(chat=CHAT, user=USER, state='Form:name')
+        await storage.update_data(chat=CHAT, user=USER, data={'a': 1})
+        await storage.finish(chat=CHAT, user=USER)
+        result = await storage.get_state(chat=CHAT, user=USER)
+        await storage.close()
+        return result
+
+    assert _run(scenario()) is None
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM fsm").fetchone()[0] == 0
+
+
+def test_changes_from_another_process_are_seen(db_path):
+    first = SQLiteFSMStorage(db_path)
+    second = SQLiteFSMStorage(db_path)
+
+    async def scenario():
+        await first.set_state(chat=CHAT, user=USER, state='Form:name')
+        # Запись закэширована в первом экземпляре
+        assert await first.get_state(chat=CHAT, user=USER) == 'Form:name'
+        await second.set_state(chat=CHAT, user=USER, state='Form:phone')
+        await second.update_data(chat=CHAT, user=USER, data={'phone': '123'})
+        result = await first.get_state(chat=CHAT, user=USER), await first.get_data(chat=CHAT, user=USER)
+        await first.close()
+        await second.close()
+        return result
+
+    assert _run(scenario()) == ('Form:phone', {'phone': '123'})
+
+
+def test_cache_is_bounded(db_path):
+    storage = SQLiteFSMStorage(db_path, cache_size=2)
+
+    async def scenario():
+        for user in range(5):
+            await storage.set_state(chat=user, user=user, state='Form:name')
+        cached = len(storage._cache)
+        states = [await storage.get_state(chat=user, user=user) for user in range(5)]
+        await storage.close()
+        return cached, states
+
+    assert _run(scenario()) == (2, ['Form:name'] * 5)
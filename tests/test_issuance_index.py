@@ -0,0 +1,85 @@
+# tests/test_issuance_index.py
+
+import asyncio
+
+import config
+import utils
+from issuance_index import IssuanceIndex, parse_issuance_line, parse_stats_line
+
+LOG_LINES = [
+    "2026-10-01 10:00:00 - User: alice (ID: 1) - Key: wg1.conf",
+    "1:stats:1",
+    "повреждённая строка",
+    "2026-10-01 11:00:00 - User: bob - admin (ID: 2) - Key: wg2.conf",
+    "2026-10-02 09:00:00 - User: alice (ID: 1) - Key: wg3.conf",
+    "1:stats:2",
+]
+
+
+def test_parse_lines():
+    assert parse_issuance_line(LOG_LINES[3]) == ("2026-10-01 11:00:00", "bob - admin", 2, "wg2.conf")
+    assert parse_issuance_line(LOG_LINES[1]) is None
+    assert parse_stats_line(LOG_LINES[1]) == (1, 1)
+    assert parse_stats_line(LOG_LINES[0]) is None
+
+
+def test_load_aggregates_in_one_pass():
+    index = IssuanceIndex()
+    index.load(LOG_LINES)
+    assert index.loaded
+    assert index.counts == {1: 2, 2: 1}
+    assert index.count(3) == 0
+    # Последняя строка статистики перекрывает предыдущие
+    assert index.stats == {1: 2}
+
+
+def test_updates_after_load():
+    index = IssuanceIndex()
+    index.load(LOG_LINES)
+    index.on_issued(3)
+    index.on_issued(1)
+    assert index.counts == {1: 3, 2: 1, 3: 1}
+    assert index.increment_stats(1) == 3
+    assert index.increment_stats(5) == 1
+
+
+def test_utils_index_follows_issuance(data_dir):
+    with open(config.KEYS_LOG_FILE, 'w', encoding='utf-8') as f:
+        f.write(''.join(f"{line}\n" for line in LOG_LINES))
+
+    async def scenario():
+        assert await utils.get_user_keys_count(1) == 2
+        await utils.log_key_issuance(1, 'alice', 'wg5.conf')
+        await utils.update_user_stats(1)
+        result = await utils.get_user_key_files(1), await utils.load_user_stats()
+        await utils.close_storage()
+        return result
+
+    files, stats = asyncio.run(scenario())
+    assert files == ['wg1.conf', 'wg3.conf', 'wg5.conf']
+    assert stats[1] == 3
+
+    # Индекс, построенный заново по файлу, совпадает с обновлённым в памяти
+    utils.issuance_index.loaded = False
+
+    async def reload():
+        result = await utils.get_user_key_files(1), await utils.load_user_stats()
+        await utils.close_storage()
+        return result
+
+    assert asyncio.run(reload()) == (files, stats)
+
+
+def test_key_files_are_read_on_demand_after_compaction(data_dir):
+    with open(config.KEYS_LOG_FILE, 'w', encoding='utf-8') as f:
+        f.write(''.join(f"{line}\n" for line in LOG_LINES))
+
+    async def scenario():
+        await utils.compact_keys_log()
+        await utils.log_key_issuance(1, 'alice', 'wg5.conf')
+        utils.issuance_index.loaded = False
+        result = await utils.get_user_keys_count(1), await utils.get_user_key_files(1), await utils.get_user_key_files(7)
+        await utils.close_storage()
+        return result
+
+    assert asyncio.run(scenario()) == (3, ['wg1.conf', 'wg3.conf', 'wg5.conf'], [])
@@ -0,0 +1,81 @@
+# tests/test_issuance_rollups.py
+
+import asyncio
+from datetime import datetime
+
+import config
+import utils
+from issuance_rollups import IssuanceRollups
+
+NOW = datetime(2026, 3, 10, 12, 30)
+
+
+def _rollups(entries):
+    rollups = IssuanceRollups()
+    for issued_at, user_id in entries:
+        rollups.add(issued_at, user_id)
+    return rollups
+
+
+def test_counts_per_hour_and_day():
+    rollups = _rollups([
+        ("2026-03-09 23:59:59", 1),
+        ("2026-03-10 10:00:00", 2),
+        ("2026-03-10 12:05:00", 1),
+        ("2026-03-10 12:40:00", 1),
+        ("не дата", 3),
+    ])
+    assert rollups.last_hours(NOW, 3) == [1, 0, 2]
+    assert rollups.last_days(NOW, 2) == [("2026-03-10", 3, 2), ("2026-03-09", 1, 1)]
+    assert rollups.daily_rate(NOW, days=2) == 2.0
+
+
+def test_hourly_window_rolls_over_midnight():
+    rollups = _rollups([("2026-03-09 23:10:00", 1), ("2026-03-10 00:20:00", 2)])
+    assert rollups.last_hours(datetime(2026, 3, 10, 0, 45), 2) == [1, 1]
+    assert rollups.last_hours(datetime(2026, 3, 10, 1, 0), 2) == [1, 0]
+    # Окно в сутки, сдвинутое на сутки вперёд, уже пустое
+    assert sum(rollups.last_hours(datetime(2026, 3, 11, 0, 20), 24)) == 0
+
+
+def test_only_open_days_keep_user_sets():
+    rollups = _rollups([
+        ("2026-03-07 09:00:00", 1),
+        ("2026-03-08 09:00:00", 1),
+        ("2026-03-09 09:00:00", 1),
+        ("2026-03-10 09:00:00", 2),
+    ])
+    assert sorted(rollups.day_users) == ["2026-03-09", "2026-03-10"]
+    assert rollups.active == {"2026-03-07": 1, "2026-03-08": 1, "2026-03-09": 1, "2026-03-10": 1}
+
+    # Запоздалая выдача за закрытый день учитывается в выдачах, но не в активных
+    rollups.add("2026-03-07 18:00:00", 5)
+    assert (rollups.daily["2026-03-07"], rollups.active["2026-03-07"]) == (2, 1)
+    # Открытый день по-прежнему отличает новых пользователей от повторных
+    rollups.add("2026-03-09 18:00:00", 1)
+    rollups.add("2026-03-09 19:00:00", 5)
+    assert (rollups.daily["2026-03-09"], rollups.active["2026-03-09"]) == (3, 2)
+
+
+def test_dump_and_load_round_trip():
+    rollups = _rollups([("2026-03-09 09:00:00", 1), ("2026-03-10 09:00:00", 2)])
+    restored = IssuanceRollups()
+    restored.load(rollups.dump(), [("2026-03-10 11:00:00", "bob", 3, "wg9.conf")])
+
+    assert restored.loaded
+    assert restored.last_days(NOW, 2) == [("2026-03-10", 2, 2), ("2026-03-09", 1, 1)]
+    assert restored.day_users == {"2026-03-09": {1}, "2026-03-10": {2, 3}}
+
+
+def test_utils_rollups_follow_issuance(data_dir):
+    with open(config.KEYS_LOG_FILE, 'w', encoding='utf-8') as f:
+        f.write("2026-03-10 09:00:00 - User: alice (ID: 1) - Key: wg1.conf\n")
+
+    async def scenario():
+        rollups = await utils.get_issuance_rollups()
+        before = sum(rollups.daily.values())
+        await utils.log_key_issuance(2, 'bob', 'wg2.conf')
+        await utils.close_storage()
+        return before, sum(rollups.daily.values()), rollups.daily.get("2026-03-10")
+
+    assert asyncio.run(scenario()) == (1, 2, 1)
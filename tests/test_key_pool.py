@@ -0,0 +1,88 @@
+# tests/test_key_pool.py
+
+import os
+
+import pytest
+
+from key_pool import KeyPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    configs_dir = tmp_path / 'configs'
+    configs_dir.mkdir()
+    for name in ('b.conf', 'a.conf', 'c.conf'):
+        (configs_dir / name).write_text(f"[Interface] {name}\n", encoding='utf-8')
+    (configs_dir / 'readme.txt').write_text('не ключ\n', encoding='utf-8')
+    pool = KeyPool(str(configs_dir), str(tmp_path / 'claimed'))
+    pool.load()
+    return pool
+
+
+def test_claim_in_order_and_moves_file(pool):
+    assert pool.snapshot() == ['a.conf', 'b.conf', 'c.conf']
+    filename = pool.claim()
+    assert filename == 'a.conf'
+    assert os.path.exists(pool.claimed_path('a.conf'))
+    assert not os.path.exists(os.path.join(pool.configs_dir, 'a.conf'))
+    assert pool.remaining == 2
+
+
+def test_complete_removes_claimed_file(pool):
+    filename = pool.claim()
+    pool.complete(filename)
+    assert not os.path.exists(pool.claimed_path(filename))
+    assert filename not in pool.snapshot()
+
+
+def test_release_returns_key_to_front(pool):
+    filename = pool.claim()
+    pool.release(filename)
+    assert pool.snapshot() == ['a.conf', 'b.conf', 'c.conf']
+    assert os.path.exists(os.path.join(pool.configs_dir, 'a.conf'))
+    assert pool.claim() == 'a.conf'
+
+
+def test_release_after_replacement_keeps_new_file(pool):
+    filename = pool.claim()
+    # Пока ключ выдавался, загрузили новый файл с тем же именем
+    with open(os.path.join(pool.configs_dir, filename), 'w', encoding='utf-8') as f:
+        f.write('new\n')
+    pool.add(filename)
+    pool.release(filename)
+    assert not os.path.exists(pool.claimed_path(filename))
+    assert pool.snapshot().count(filename) == 1
+    with open(os.path.join(pool.configs_dir, filename), 'r', encoding='utf-8') as f:
+        assert f.read() == 'new\n'
+
+
+def test_claim_skips_vanished_files_until_empty(pool):
+    os.remove(os.path.join(pool.configs_dir, 'a.conf'))
+    assert pool.claim() == 'b.conf'
+    assert pool.claim() == 'c.conf'
+    assert pool.claim() is None
+
+
+def test_pools_sharing_folder_never_claim_same_key(pool):
+    # Второй процесс с той же папкой: переименование атомарно, поэтому ключ получает только один
+    other = KeyPool(pool.configs_dir, pool.claimed_dir)
+    other.load()
+    claimed = [pool.claim(), other.claim(), pool.claim(), other.claim(), other.claim()]
+    assert sorted(name for name in claimed if name) == ['a.conf', 'b.conf', 'c.conf']
+    assert claimed.count(None) == 2
+
+
+def test_load_returns_unfinished_claims(pool):
+    pool.claim()
+    restarted = KeyPool(pool.configs_dir, pool.claimed_dir)
+    restarted.load()
+    assert restarted.snapshot() == ['a.conf', 'b.conf', 'c.conf']
+    assert os.listdir(pool.claimed_dir) == []
+
+
+def test_add_appends_new_key_once(pool):
+    with open(os.path.join(pool.configs_dir, 'd.conf'), 'w', encoding='utf-8') as f:
+        f.write('d\n')
+    pool.add('d.conf')
+    pool.add('d.conf')
+    assert pool.snapshot() == ['a.conf', 'b.conf', 'c.conf', 'd.conf']
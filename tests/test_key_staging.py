@@ -0,0 +1,100 @@
+# tests/test_key_staging.py
+
+import asyncio
+import os
+from types import SimpleNamespace
+
+from aiogram.utils.exceptions import TelegramAPIError
+
+from key_pool import KeyPool
+from key_staging import stage_pending_keys
+from rate_limit import TokenBucket
+
+STAGING_CHAT_ID = -100
+
+
+class FakeBot:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.uploaded = []
+        self.deleted = []
+
+    async def send_document(self, chat_id, document, **kwargs):
+        filename = document.filename
+        if filename in self.fail:
+            raise TelegramAPIError('Bad Request: file is empty')
+        self.uploaded.append((chat_id, filename))
+        message_id = len(self.uploaded)
+        return SimpleNamespace(message_id=message_id, document=SimpleNamespace(file_id=f"id-{filename}"))
+
+    async def delete_message(self, chat_id, message_id):
+        self.deleted.append(message_id)
+
+
+def _pool(tmp_path, names=('a.conf', 'b.conf', 'c.conf')):
+    configs_dir = tmp_path / 'configs'
+    configs_dir.mkdir(exist_ok=True)
+    for name in names:
+        (configs_dir / name).write_text(name, encoding='utf-8')
+    pool = KeyPool(str(configs_dir), str(tmp_path / 'claimed'), str(tmp_path / 'file_ids.json'))
+    pool.load()
+    return pool
+
+
+def test_stages_unstaged_keys_and_saves_file_ids(tmp_path):
+    pool = _pool(tmp_path)
+    bot = FakeBot(fail={'b.conf'})
+
+    staged = asyncio.run(stage_pending_keys(bot, pool, STAGING_CHAT_ID, TokenBucket(1000)))
+
+    assert staged == 2
+    assert bot.uploaded == [(STAGING_CHAT_ID, 'a.conf'), (STAGING_CHAT_ID, 'c.conf')]
+    assert bot.deleted == [1, 2]
+    assert pool.file_id('a.conf') == 'id-a.conf'
+    assert pool.unstaged() == ['b.conf']
+
+    # После перезапуска file_id берутся из файла, повторная загрузка не нужна
+    restarted = _pool(tmp_path, names=())
+    assert restarted.file_id('c.conf') == 'id-c.conf'
+    assert restarted.unstaged() == ['b.conf']
+
+
+def test_second_pass_uploads_only_new_keys(tmp_path):
+    pool = _pool(tmp_path)
+    bot = FakeBot()
+    limiter = TokenBucket(1000)
+    asyncio.run(stage_pending_keys(bot, pool, STAGING_CHAT_ID, limiter))
+    with open(os.path.join(pool.configs_dir, 'd.conf'), 'w', encoding='utf-8') as f:
+        f.write('d')
+    pool.add('d.conf')
+
+    assert asyncio.run(stage_pending_keys(bot, pool, STAGING_CHAT_ID, limiter)) == 1
+    assert [name for _, name in bot.uploaded] == ['a.conf', 'b.conf', 'c.conf', 'd.conf']
+
+
+def test_claimed_and_replaced_keys_lose_file_id(tmp_path):
+    pool = _pool(tmp_path)
+    asyncio.run(stage_pending_keys(FakeBot(), pool, STAGING_CHAT_ID, TokenBucket(1000)))
+
+    filename = pool.claim()
+    pool.complete(filename)
+    assert pool.file_id(filename) is None
+    # Файл заменён загрузкой архива: старый file_id указывает на другой документ
+    pool.add('b.conf')
+    assert pool.file_id('b.conf') is None
+    assert pool.unstaged() == ['b.conf']
+
+
+def test_key_claimed_during_upload_is_not_staged(tmp_path):
+    pool = _pool(tmp_path, names=('a.conf',))
+    bot = FakeBot()
+    send_document = bot.send_document
+
+    async def claim_while_uploading(chat_id, document, **kwargs):
+        message = await send_document(chat_id, document, **kwargs)
+        pool.claim()
+        return message
+
+    bot.send_document = claim_while_uploading
+    asyncio.run(stage_pending_keys(bot, pool, STAGING_CHAT_ID, TokenBucket(1000)))
+    assert pool.file_ids == {}
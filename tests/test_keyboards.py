@@ -0,0 +1,48 @@
+# tests/test_keyboards.py
+
+import json
+
+from aiogram.utils.payload import prepare_arg
+
+import keyboards
+from config import AUTHORIZED_USER_ID
+
+
+def _buttons(frozen):
+    markup = json.loads(frozen)
+    rows = markup.get('keyboard') or markup.get('inline_keyboard')
+    return [button['text'] for row in rows for button in row]
+
+
+def test_static_keyboards_are_built_once_per_variant():
+    admin = keyboards.get_main_menu_kb(AUTHORIZED_USER_ID)
+    user = keyboards.get_main_menu_kb(AUTHORIZED_USER_ID + 1)
+
+    assert keyboards.get_main_menu_kb(AUTHORIZED_USER_ID) is admin
+    assert keyboards.get_main_menu_kb(AUTHORIZED_USER_ID + 2) is user
+    assert "📊 Статистика" in _buttons(admin) and "📊 Статистика" not in _buttons(user)
+    assert keyboards.get_back_kb() is keyboards.get_back_kb()
+    assert keyboards.get_stats_user_actions_keyboard() is keyboards.get_back_kb()
+    assert _buttons(keyboards.get_user_actions_keyboard(True))[0] == "Разбанить"
+    assert _buttons(keyboards.get_user_actions_keyboard(False))[0] == "Забанить"
+
+
+def test_frozen_markup_is_sent_as_is():
+    frozen = keyboards.access_request_kb()
+    # aiogram не сериализует строку повторно
+    assert prepare_arg(frozen) is frozen
+    assert json.loads(frozen) == frozen.markup.to_python()
+    assert frozen.markup.inline_keyboard[0][0].callback_data == "request_access"
+
+
+def test_users_page_keyboard_is_memoized_by_contents():
+    page = (("@alice", 2), ("Bob", 3))
+    frozen = keyboards.get_users_page_kb('users', page, None, ('banned', 7), "1–2 из 3")
+
+    assert keyboards.get_users_page_kb('users', list(page), None, ('banned', 7), "1–2 из 3") is frozen
+    assert keyboards.get_users_page_kb('stats', page, None, ('banned', 7), "1–2 из 3") is not frozen
+    rows = frozen.markup.inline_keyboard
+    assert [(button.text, button.callback_data) for row in rows[:-1] for button in row] == [
+        ("@alice (ID: 2)", "usel_users_2"), ("Bob (ID: 3)", "usel_users_3"),
+    ]
+    assert [button.callback_data for button in rows[-1]] == ["no_action", "upage_users_n_banned_7"]
@@ -0,0 +1,165 @@
+# tests/test_log_compaction.py
+
+import asyncio
+import os
+
+import pytest
+
+import log_compaction
+from issuance_index import parse_issuance_line, parse_stats_line
+
+LINES = [
+    "2026-09-30 23:59:00 - User: user1 (ID: 1) - Key: wg1.conf",
+    "1:stats:1",
+    "2026-10-01 00:01:00 - User: user2 (ID: 2) - Key: wg2.conf",
+    "2:stats:4",
+]
+
+
+class Crash(Exception):
+    pass
+
+
+def _crash(*args):
+    raise Crash()
+
+
+def _paths(root):
+    return (
+        os.path.join(root, 'keys_log.compacting'),
+        os.path.join(root, 'keys_log_snapshot.json'),
+        os.path.join(root, 'keys_log_archive'),
+    )
+
+
+def _write_compacting(path, lines):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(''.join(f"{line}\n" for line in lines))
+
+
+def _archived_lines(archive_dir):
+    lines = []
+    for path in log_compaction.list_segments(archive_dir):
+        with open(path, 'r', encoding='utf-8') as f:
+            lines.extend(line.strip() for line in f if line.strip())
+    return lines
+
+
+def _assert_compacted_once(root):
+    compacting, snapshot_path, archive_dir = _paths(root)
+    assert not os.path.exists(compacting)
+    assert _archived_lines(archive_dir) == [LINES[0], LINES[2]]
+    snapshot = log_compaction.read_snapshot(snapshot_path)
+    assert snapshot['stats'] == {1: 1, 2: 4}
+    assert snapshot['counts'] == {1: 1, 2: 1}
+    daily = log_compaction.read_rollups(snapshot_path, archive_dir)['daily']
+    assert {day: counts[0] for day, counts in daily.items()} == {'2026-09-30': 1, '2026-10-01': 1}
+
+
+def test_rerun_after_crash_before_snapshot(tmp_path, monkeypatch):
+    compacting, snapshot_path, archive_dir = _paths(str(tmp_path))
+    _write_compacting(compacting, LINES)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(log_compaction, '_write_snapshot', _crash)
+        with pytest.raises(Crash):
+            log_compaction.compact_file(compacting, snapshot_path, archive_dir)
+    # Сегменты уже дописаны, снимок — нет
+    assert _archived_lines(archive_dir) == [LINES[0], LINES[2]]
+
+    log_compaction.compact_file(compacting, snapshot_path, archive_dir)
+    _assert_compacted_once(str(tmp_path))
+
+
+def test_rerun_after_crash_before_remove(tmp_path, monkeypatch):
+    compacting, snapshot_path, archive_dir = _paths(str(tmp_path))
+    _write_compacting(compacting, LINES)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(log_compaction.os, 'remove', _crash)
+        with pytest.raises(Crash):
+            log_compaction.compact_file(compacting, snapshot_path, archive_dir)
+    assert os.path.exists(compacting)
+
+    log_compaction.compact_file(compacting, snapshot_path, archive_dir)
+    _assert_compacted_once(str(tmp_path))
+
+
+def test_crashed_run_rolled_back_after_earlier_compaction(tmp_path, monkeypatch):
+    compacting, snapshot_path, archive_dir = _paths(str(tmp_path))
+    _write_compacting(compacting, LINES[:2])
+    log_compaction.compact_file(compacting, snapshot_path, archive_dir)
+
+    _write_compacting(compacting, LINES[2:])
+    with monkeypatch.context() as patch:
+        patch.setattr(log_compaction, '_write_snapshot', _crash)
+        with pytest.raises(Crash):
+            log_compaction.compact_file(compacting, snapshot_path, archive_dir)
+
+    log_compaction.compact_file(compacting, snapshot_path, archive_dir)
+    _assert_compacted_once(str(tmp_path))
+
+
+def test_migration_imports_compacted_log(tmp_path):
+    import config
+    from sqlite_storage import SQLiteStorage
+
+    users_dir = str(tmp_path / 'users')
+    os.makedirs(users_dir)
+    compacting, snapshot_path, archive_dir = _paths(users_dir)
+    _write_compacting(compacting, LINES)
+    log_compaction.compact_file(compacting, snapshot_path, archive_dir)
+    live_line = "2026-10-02 10:00:00 - User: user1 (ID: 1) - Key: wg3.conf"
+    with open(os.path.join(users_dir, 'keys_log.txt'), 'w', encoding='utf-8') as f:
+        f.write(f"{live_line}\n1:stats:2\n")
+
+    storage = SQLiteStorage(str(tmp_path / 'bot.db'))
+    try:
+        imported = storage.migrate_from_files(users_dir)
+        lines = asyncio.run(storage.read_lines(config.KEYS_LOG_FILE))
+    finally:
+        storage.close()
+
+    assert imported['keys_log.txt'] == 6
+    assert [line for line in lines if parse_issuance_line(line)] == [LINES[0], LINES[2], live_line]
+    # Статистика из снимка идёт раньше живого журнала, поэтому более новое значение перекрывает её
+    stats = dict(filter(None, map(parse_stats_line, lines)))
+    assert stats == {1: 2, 2: 4}
+
+
+def test_migration_without_live_log(tmp_path):
+    import config
+    from sqlite_storage import SQLiteStorage
+
+    users_dir = str(tmp_path / 'users')
+    os.makedirs(users_dir)
+    compacting, snapshot_path, archive_dir = _paths(users_dir)
+    _write_compacting(compacting, LINES)
+    log_compaction.compact_file(compacting, snapshot_path, archive_dir)
+
+    storage = SQLiteStorage(str(tmp_path / 'bot.db'))
+    try:
+        imported = storage.migrate_from_files(users_dir)
+        lines = asyncio.run(storage.read_lines(config.KEYS_LOG_FILE))
+    finally:
+        storage.close()
+
+    assert imported['keys_log.txt'] == 4
+    assert len([line for line in lines if parse_issuance_line(line)]) == 2
+
+
+def test_snapshot_keeps_counts_not_filenames(tmp_path):
+    import json
+
+    compacting, snapshot_path, archive_dir = _paths(str(tmp_path))
+    # Снимок старого формата со списками имён файлов
+    with open(snapshot_path, 'w', encoding='utf-8') as f:
+        json.dump({'stats': {'1': 1}, 'files': {'1': ['wg0.conf', 'wg0.conf'], '3': ['wg9.conf']}}, f)
+    assert log_compaction.read_snapshot(snapshot_path)['counts'] == {1: 2, 3: 1}
+
+    _write_compacting(compacting, LINES)
+    log_compaction.compact_file(compacting, snapshot_path, archive_dir)
+    with open(snapshot_path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    assert 'files' not in raw and '.conf' not in json.dumps(raw)
+    assert log_compaction.read_snapshot(snapshot_path)['counts'] == {1: 3, 2: 1, 3: 1}
@@ -0,0 +1,76 @@
+# tests/test_log_reader.py
+
+from log_reader import iter_lines_reversed, key_files_by_user, recent_issuances
+
+
+def _write(path, content: bytes):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_lines_reversed(tmp_path):
+    path = _write(tmp_path / 'log.txt', b"one\ntwo\n\nthree\n")
+    assert list(iter_lines_reversed(path)) == ['three', 'two', 'one']
+
+
+def test_last_line_without_newline_and_crlf(tmp_path):
+    path = _write(tmp_path / 'log.txt', b"one\r\ntwo\r\nthree")
+    assert list(iter_lines_reversed(path)) == ['three', 'two', 'one']
+
+
+def test_single_line_and_single_character(tmp_path):
+    assert list(iter_lines_reversed(_write(tmp_path / 'a.txt', b"x"))) == ['x']
+    assert list(iter_lines_reversed(_write(tmp_path / 'b.txt', b"x\n"))) == ['x']
+    assert list(iter_lines_reversed(_write(tmp_path / 'c.txt', b"\n\n"))) == []
+
+
+def test_empty_and_missing_files(tmp_path):
+    assert list(iter_lines_reversed(_write(tmp_path / 'empty.txt', b""))) == []
+    assert list(iter_lines_reversed(str(tmp_path / 'missing.txt'))) == []
+
+
+def test_utf8_lines(tmp_path):
+    path = _write(tmp_path / 'log.txt', "первая\nвторая\n".encode('utf-8'))
+    assert list(iter_lines_reversed(path)) == ['вторая', 'первая']
+
+
+def test_reader_is_lazy(tmp_path):
+    path = _write(tmp_path / 'log.txt', b"".join(b"line %d\n" % i for i in range(1000)))
+    lines = iter_lines_reversed(path)
+    assert next(lines) == 'line 999'
+    assert next(lines) == 'line 998'
+    lines.close()
+
+
+def test_recent_issuances_across_files(tmp_path):
+    older = _write(tmp_path / 'old.txt', (
+        "2026-09-01 10:00:00 - User: a (ID: 1) - Key: k1.conf\n"
+        "2026-09-02 10:00:00 - User: b (ID: 2) - Key: k2.conf\n"
+    ).encode('utf-8'))
+    newer = _write(tmp_path / 'new.txt', (
+        "2026-10-01 10:00:00 - User: a (ID: 1) - Key: k3.conf\n"
+        "1:stats:4\n"
+        "2026-10-02 10:00:00 - User: c (ID: 11) - Key: k4.conf\n"
+    ).encode('utf-8'))
+    paths = [newer, str(tmp_path / 'missing.txt'), older]
+
+    assert [entry[3] for entry in recent_issuances(paths, 3)] == ['k4.conf', 'k3.conf', 'k2.conf']
+    # ID 1 не совпадает с ID 11, хотя подстрока встречается
+    assert [entry[3] for entry in recent_issuances(paths, 10, user_id=1)] == ['k3.conf', 'k1.conf']
+    assert recent_issuances(paths, 0) == []
+
+
+def test_key_files_by_user_in_issue_order(tmp_path):
+    older = _write(tmp_path / 'old.txt', (
+        "2026-09-01 10:00:00 - User: a (ID: 1) - Key: k1.conf\n"
+        "2026-09-02 10:00:00 - User: c (ID: 11) - Key: k2.conf\n"
+    ).encode('utf-8'))
+    newer = _write(tmp_path / 'new.txt', (
+        "1:stats:4\n"
+        "2026-10-01 10:00:00 - User: a (ID: 1) - Key: k3.conf\n"
+    ).encode('utf-8'))
+    paths = [older, str(tmp_path / 'missing.txt'), newer]
+
+    assert key_files_by_user(paths) == {1: ['k1.conf', 'k3.conf'], 11: ['k2.conf']}
+    assert key_files_by_user(paths, user_id=1) == {1: ['k1.conf', 'k3.conf']}
+    assert key_files_by_user(paths, user_id=5) == {}
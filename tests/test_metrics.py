@@ -0,0 +1,135 @@
+# tests/test_metrics.py
+
+import asyncio
+import socket
+from collections import defaultdict
+
+import aiohttp
+import pytest
+from aiogram import Bot, Dispatcher, types
+
+import metrics
+from metrics import CallbackMetric, Counter, Histogram, Registry, timed
+
+USER_ID = 90
+
+
+def _render(metric):
+    return asyncio.run(metric.render())
+
+
+def test_counter_renders_labelled_series():
+    counter = Counter('errors_total', 'Ошибки', 'method')
+    counter.inc('sendMessage')
+    counter.inc('sendMessage')
+    counter.inc('get"Me', amount=0.5)
+    assert _render(counter) == [
+        '# HELP errors_total Ошибки',
+        '# TYPE errors_total counter',
+        'errors_total{method="get\\"Me"} 0.5',
+        'errors_total{method="sendMessage"} 2',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('duration_seconds', 'Время', 'handler', buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe('stats', value)
+    assert _render(histogram)[2:] == [
+        'duration_seconds_bucket{handler="stats",le="0.1"} 2',
+        'duration_seconds_bucket{handler="stats",le="1"} 3',
+        'duration_seconds_bucket{handler="stats",le="+Inf"} 4',
+        'duration_seconds_sum{handler="stats"} 3.65',
+        'duration_seconds_count{handler="stats"} 4',
+    ]
+
+
+def test_callback_metrics_sync_async_and_errors():
+    async def users_by_status():
+        return {'banned': 1, 'authorized': 3}
+
+    def broken():
+        raise OSError('нет доступа')
+
+    registry = Registry()
+    registry.gauge('keys_free', 'Свободные ключи', lambda: 7)
+    registry.gauge('users', 'Пользователи', users_by_status, label='status')
+    registry.register(CallbackMetric('broken', 'Сломанная', broken))
+
+    lines = asyncio.run(registry.render()).splitlines()
+    assert 'keys_free 7' in lines
+    assert lines[-2:] == ['users{status="authorized"} 3', 'users{status="banned"} 1']
+    assert not any(line.startswith('# HELP broken') for line in lines)
+
+
+def test_timed_records_failures_too():
+    histogram = Histogram('op_seconds', 'Операции', 'operation')
+
+    @timed(histogram, 'read')
+    async def read(fail):
+        if fail:
+            raise ValueError('boom')
+        return 'ok'
+
+    async def scenario():
+        assert await read(False) == 'ok'
+        with pytest.raises(ValueError):
+            await read(True)
+
+    asyncio.run(scenario())
+    assert histogram.series['read'][2] == 2
+
+
+def test_middleware_measures_handlers_and_errors(monkeypatch):
+    monkeypatch.setattr(metrics.HANDLER_DURATION, 'series', {})
+    monkeypatch.setattr(metrics.HANDLER_ERRORS, 'values', defaultdict(float))
+
+    async def ok_handler(message: types.Message):
+        pass
+
+    async def failing_handler(message: types.Message):
+        raise RuntimeError('boom')
+
+    bot = Bot(token='123456:TEST')
+    dp = Dispatcher(bot)
+    dp.middleware.setup(metrics.MetricsMiddleware())
+    dp.register_message_handler(ok_handler, text='ok')
+    dp.register_message_handler(failing_handler, text='fail')
+
+    def update(update_id, text):
+        return types.Update.to_object({'update_id': update_id, 'message': {
+            'message_id': update_id, 'date': 0,
+            'chat': {'id': USER_ID, 'type': 'private'},
+            'from': {'id': USER_ID, 'is_bot': False, 'first_name': 'Test'},
+            'text': text,
+        }})
+
+    async def scenario():
+        Bot.set_current(bot)
+        Dispatcher.set_current(dp)
+        await dp.process_update(update(1, 'ok'))
+        with pytest.raises(RuntimeError):
+            await dp.process_update(update(2, 'fail'))
+
+    asyncio.run(scenario())
+    assert {name: series[2] for name, series in metrics.HANDLER_DURATION.series.items()} == {'ok_handler': 1, 'failing_handler': 1}
+    assert dict(metrics.HANDLER_ERRORS.values) == {'failing_handler': 1}
+
+
+def test_metrics_server_serves_registry():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    async def scenario():
+        runner = await metrics.start_metrics_server('127.0.0.1', port)
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f'http://127.0.0.1:{port}/metrics') as response:
+                    return response.status, response.content_type, await response.text()
+        finally:
+            await runner.cleanup()
+
+    status, content_type, body = asyncio.run(scenario())
+    assert (status, content_type) == (200, 'text/plain')
+    assert '# TYPE bot_handler_duration_seconds histogram' in body
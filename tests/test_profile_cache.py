@@ -0,0 +1,116 @@
+# tests/test_profile_cache.py
+
+import asyncio
+from types import SimpleNamespace
+
+import profile_cache
+from profile_cache import ProfileCache
+
+
+class FakeBot:
+    def __init__(self, delay: float = 0, fail: set = ()):
+        self.delay = delay
+        self.fail = set(fail)
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    async def get_chat(self, user_id):
+        self.calls.append(user_id)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if user_id in self.fail:
+                raise RuntimeError(f"chat {user_id} not found")
+            return {'id': user_id}
+        finally:
+            self.active -= 1
+
+
+def test_hit_after_miss():
+    cache = ProfileCache(ttl=60, max_size=10, concurrency=2)
+    bot = FakeBot()
+
+    async def scenario():
+        first = await cache.get(bot, 1)
+        second = await cache.get(bot, 1)
+        return first, second
+
+    assert asyncio.run(scenario()) == ({'id': 1}, {'id': 1})
+    assert bot.calls == [1]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(profile_cache, 'time', SimpleNamespace(monotonic=lambda: now[0]))
+    cache = ProfileCache(ttl=60, max_size=10, concurrency=2)
+    bot = FakeBot()
+
+    async def scenario():
+        await cache.get(bot, 1)
+        now[0] += 59
+        await cache.get(bot, 1)
+        now[0] += 2
+        await cache.get(bot, 1)
+
+    asyncio.run(scenario())
+    assert bot.calls == [1, 1]
+
+
+def test_least_recently_used_is_evicted():
+    cache = ProfileCache(ttl=60, max_size=2, concurrency=2)
+    bot = FakeBot()
+
+    async def scenario():
+        await cache.get(bot, 1)
+        await cache.get(bot, 2)
+        await cache.get(bot, 1)  # 1 становится самым свежим
+        await cache.get(bot, 3)  # вытесняет 2
+        await cache.get(bot, 1)
+        await cache.get(bot, 2)
+
+    asyncio.run(scenario())
+    assert bot.calls == [1, 2, 3, 2]
+    assert len(cache) == 2
+
+
+def test_concurrent_requests_share_one_call():
+    cache = ProfileCache(ttl=60, max_size=10, concurrency=2)
+    bot = FakeBot(delay=0.01)
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get(bot, 7) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == [{'id': 7}] * 5
+    assert bot.calls == [7]
+
+
+def test_get_many_bounds_concurrency_and_reports_failures():
+    cache = ProfileCache(ttl=60, max_size=100, concurrency=3)
+    bot = FakeBot(delay=0.01, fail={4})
+
+    async def scenario():
+        return await cache.get_many(bot, [1, 2, 3, 4, 5, 6, 7, 8, 2])
+
+    profiles = asyncio.run(scenario())
+    assert list(profiles) == [1, 2, 3, 4, 5, 6, 7, 8]
+    assert profiles[4] is None
+    assert profiles[8] == {'id': 8}
+    assert bot.max_active == 3
+    # Ошибки не кэшируются
+    assert 4 not in cache._entries
+
+
+def test_invalidate_forces_reload():
+    cache = ProfileCache(ttl=60, max_size=10, concurrency=2)
+    bot = FakeBot()
+
+    async def scenario():
+        await cache.get(bot, 1)
+        cache.invalidate(1)
+        await cache.get(bot, 1)
+
+    asyncio.run(scenario())
+    assert bot.calls == [1, 1]
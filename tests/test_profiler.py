@@ -0,0 +1,136 @@
+# tests/test_profiler.py
+
+import asyncio
+import cProfile
+
+from aiogram import Bot, Dispatcher, types
+
+import profiler
+from profiler import Profiler, format_report
+
+USER_ID = 95
+
+
+class FakeBot:
+    def __init__(self):
+        self.documents = []
+
+    async def send_document(self, chat_id, document, caption=None, **kwargs):
+        self.documents.append((chat_id, document.filename, document.file.read().decode('utf-8'), caption))
+
+
+def _dispatcher(handled):
+    async def on_message(message: types.Message):
+        handled.append(message.text)
+
+    dp = Dispatcher(Bot(token='123456:TEST'))
+    dp.register_message_handler(on_message)
+    return dp
+
+
+def _update(update_id, text):
+    return types.Update.to_object({'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 0,
+        'chat': {'id': USER_ID, 'type': 'private'},
+        'from': {'id': USER_ID, 'is_bot': False, 'first_name': 'Test'},
+        'text': text,
+    }})
+
+
+async def _wait_for(condition):
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+def test_session_ends_after_max_updates():
+    handled = []
+    dp = _dispatcher(handled)
+    bot = FakeBot()
+    session = Profiler()
+
+    async def scenario():
+        Dispatcher.set_current(dp)
+        assert session.start(dp, bot, USER_ID, seconds=60, max_updates=2)
+        assert not session.start(dp, bot, USER_ID, seconds=60)
+        for update_id in (1, 2):
+            await dp.process_updates([_update(update_id, 'hi')])
+        await asyncio.wait_for(_wait_for(lambda: bot.documents), 5)
+        # После сеанса счётчик обновлений отключён
+        await dp.process_updates([_update(3, 'hi')])
+
+    asyncio.run(scenario())
+    assert handled == ['hi'] * 3
+    assert not session.is_running
+    assert dp.middleware.applications == []
+    [(chat_id, filename, report, caption)] = bot.documents
+    assert chat_id == USER_ID and filename.startswith('profile_') and filename.endswith('.txt')
+    assert 'обновлений: 2' in caption and report.startswith('Профилирование:')
+
+
+def test_starting_update_is_not_profiled_or_counted():
+    handled = []
+    dp = _dispatcher(handled)
+    bot = FakeBot()
+    session = Profiler()
+
+    async def start_profiling(message: types.Message):
+        session.start(Dispatcher.get_current(), bot, USER_ID, seconds=60, max_updates=2)
+        # Работа запустившего обработчика после включения не должна попасть в отчёт
+        _starter_work()
+
+    dp.register_message_handler(start_profiling, commands=['profile'])
+    dp.message_handlers.handlers.insert(0, dp.message_handlers.handlers.pop())
+
+    async def scenario():
+        Dispatcher.set_current(dp)
+        await dp.process_updates([_update(1, '/profile')])
+        assert session.is_running
+        for update_id in (2, 3):
+            await dp.process_updates([_update(update_id, 'hi')])
+        await asyncio.wait_for(_wait_for(lambda: bot.documents), 5)
+
+    asyncio.run(scenario())
+    assert handled == ['hi'] * 2
+    [(_, _, report, caption)] = bot.documents
+    assert 'обновлений: 2' in caption
+    assert '_starter_work' not in report and 'start_profiling' not in report
+    assert 'on_message' in report
+
+
+def _starter_work():
+    return sum(range(1000))
+
+
+def test_session_ends_by_timer():
+    bot = FakeBot()
+    dp = _dispatcher([])
+    session = Profiler()
+
+    async def scenario():
+        session.start(dp, bot, USER_ID, seconds=0.05)
+        await asyncio.wait_for(_wait_for(lambda: bot.documents), 5)
+
+    asyncio.run(scenario())
+    assert not session.is_running
+    assert 'обновлений: 0' in bot.documents[0][3]
+
+
+def test_stop_without_session_does_nothing():
+    asyncio.run(Profiler().stop())
+
+
+def _busy_function():
+    return sum(range(1000))
+
+
+def test_report_highlights_bot_modules(monkeypatch):
+    monkeypatch.setattr(profiler, '_HIGHLIGHT_PATHS', {__file__})
+    profile = cProfile.Profile()
+    profile.enable()
+    _busy_function()
+    profile.disable()
+
+    report = format_report(profile, 1.5, 3)
+    own = report.split("Функции из handlers.py, utils.py:")[1]
+    assert report.startswith("Профилирование: 1.5 сек., обновлений: 3")
+    assert "▶" in own and "test_profiler.py" in own and "_busy_function" in own
@@ -0,0 +1,37 @@
+# tests/test_quota_index.py
+
+import asyncio
+
+import utils
+
+
+def test_reissued_filename_counts_against_limit(data_dir):
+    # Имена ключей повторяются после повторной загрузки архива, каждая выдача учитывается отдельно
+    async def scenario():
+        await utils.log_key_issuance(5, 'user5', 'wg1.conf')
+        await utils.log_key_issuance(5, 'user5', 'wg1.conf')
+        assert (await utils.get_quota_index()).issued_count(5) == 2
+
+        utils.issuance_index.loaded = False
+        utils.quota_index.loaded = False
+        quota = await utils.get_quota_index()
+        await utils.close_storage()
+        return quota
+
+    quota = asyncio.run(scenario())
+    assert quota.issued_count(5) == 2
+    quota.set_user_limit(5, 2)
+    assert not quota.try_acquire(5)
+
+
+def test_legacy_duplicate_keys_issued_lines_count_once(data_dir):
+    # Старые версии записывали выдачу в keys_issued.txt дважды, но в журнал — один раз
+    import config
+
+    with open(config.KEYS_LOG_FILE, 'w', encoding='utf-8') as f:
+        f.write("2025-01-01 10:00:00 - User: user7 (ID: 7) - Key: wg1.conf\n")
+    with open(config.KEYS_ISSUED_FILE, 'w', encoding='utf-8') as f:
+        f.write("7:wg1.conf\n7:wg1.conf\n")
+
+    quota = asyncio.run(utils.get_quota_index())
+    assert quota.issued_count(7) == 1
@@ -0,0 +1,115 @@
+# tests/test_router.py
+
+import asyncio
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+
+from router import ANY, MAIN_SCREEN, Router, RouterMiddleware
+
+USER_ID = 70
+
+
+def _router(calls):
+    def handler(name):
+        async def handle(event):
+            calls.append(name)
+        return handle
+
+    router = Router()
+    router.add_text("🔙 Назад", handler('back_main'))
+    router.add_text("🔙 Назад", handler('back_stats'), context='stats')
+    router.add_text("🔙 Назад", handler('back_form'), context='Form:name')
+    router.add_text("📊 Статистика", handler('stats'))
+    router.add_text("❌ Отмена", handler('cancel'), context=ANY)
+    router.add_fallback('Form:name', handler('form_input'))
+    router.add_callback('refresh', handler('refresh'))
+    router.add_callback('upage_', handler('users_page'))
+    return router
+
+
+def test_text_resolves_by_context():
+    calls = []
+    router = _router(calls)
+
+    route, leave = router.resolve_text("🔙 Назад", None, 'stats')
+    assert not leave
+    asyncio.run(route(None, None))
+    route, leave = router.resolve_text("🔙 Назад", 'Form:name', MAIN_SCREEN)
+    asyncio.run(route(None, None))
+    route, leave = router.resolve_text("🔙 Назад", None, MAIN_SCREEN)
+    asyncio.run(route(None, None))
+    assert calls == ['back_stats', 'back_form', 'back_main']
+
+
+def test_idle_button_leaves_saved_screen():
+    router = _router([])
+    assert router.resolve_text("📊 Статистика", None, 'users')[1] is True
+    assert router.resolve_text("📊 Статистика", None, MAIN_SCREEN)[1] is False
+    # В состоянии FSM кнопки главного меню не срабатывают
+    assert router.resolve_text("📊 Статистика", 'Form:phone', MAIN_SCREEN) == (None, False)
+
+
+def test_any_context_and_fallbacks():
+    calls = []
+    router = _router(calls)
+    for state, screen in ((None, MAIN_SCREEN), (None, 'stats'), ('Form:name', MAIN_SCREEN)):
+        route, leave = router.resolve_text("❌ Отмена", state, screen)
+        asyncio.run(route(None, None))
+        assert not leave
+    route, _ = router.resolve_text("Иван", 'Form:name', MAIN_SCREEN)
+    asyncio.run(route(None, None))
+    assert calls == ['cancel', 'cancel', 'cancel', 'form_input']
+    assert router.resolve_text("Иван", None, MAIN_SCREEN) == (None, False)
+    assert router.has_fallbacks and router.knows_text("🔙 Назад") and not router.knows_text("Иван")
+
+
+def test_callback_exact_and_prefix():
+    calls = []
+    router = _router(calls)
+    asyncio.run(router.resolve_callback('refresh')(None, None))
+    asyncio.run(router.resolve_callback('upage_all_n_authorized_5')(None, None))
+    assert calls == ['refresh', 'users_page']
+    assert router.resolve_callback('refresh_now') is None
+    assert router.resolve_callback('unknown') is None
+
+
+def test_middleware_dispatches_by_saved_screen():
+    calls = []
+
+    async def back_to_main(message: types.Message, state):
+        calls.append(('back', await state.get_data()))
+
+    async def show_users(message: types.Message, state):
+        await state.update_data(screen='users')
+        calls.append(('users', None))
+
+    async def fallthrough(message: types.Message):
+        calls.append(('aiogram', message.text))
+
+    router = Router()
+    router.add_text("👥 Пользователи", show_users)
+    router.add_text("🔙 Назад", back_to_main, context='users')
+    bot = Bot(token='123456:TEST')
+    dp = Dispatcher(bot, storage=MemoryStorage())
+    dp.middleware.setup(RouterMiddleware(router))
+    dp.register_message_handler(fallthrough)
+
+    def update(update_id, text):
+        return types.Update.to_object({'update_id': update_id, 'message': {
+            'message_id': update_id, 'date': 0,
+            'chat': {'id': USER_ID, 'type': 'private'},
+            'from': {'id': USER_ID, 'is_bot': False, 'first_name': 'Test'},
+            'text': text,
+        }})
+
+    async def scenario():
+        Bot.set_current(bot)
+        Dispatcher.set_current(dp)
+        await dp.process_update(update(1, "👥 Пользователи"))
+        await dp.process_update(update(2, "🔙 Назад"))
+        await dp.process_update(update(3, "просто текст"))
+        await dp.storage.close()
+
+    asyncio.run(scenario())
+    assert calls == [('users', None), ('back', {'screen': 'users'}), ('aiogram', "просто текст")]
@@ -0,0 +1,208 @@
+# tests/test_sqlite_storage.py
+
+import asyncio
+import os
+
+import pytest
+
+import config
+from sqlite_storage import SQLiteStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'bot.db'))
+    yield storage
+    storage.close()
+
+
+def test_lines_round_trip_through_tables(storage):
+    async def scenario():
+        await storage.append_line(config.AUTHORIZED_USERS_FILE, '10')
+        await storage.append_line(config.AUTHORIZED_USERS_FILE, '20')
+        # Повторное добавление пользователя не создаёт дубликат
+        await storage.append_line(config.AUTHORIZED_USERS_FILE, '10')
+        await storage.append_line(config.USER_LIMITS_FILE, '10:3')
+        await storage.append_line(config.USER_LIMITS_FILE, '10:5')
+        await storage.remove_line(config.AUTHORIZED_USERS_FILE, '20')
+        return (
+            await storage.read_lines(config.AUTHORIZED_USERS_FILE),
+            await storage.read_lines(config.USER_LIMITS_FILE),
+            await storage.read_lines(config.BANNED_USERS_FILE),
+        )
+
+    authorized, limits, banned = asyncio.run(scenario())
+    assert authorized == ['10']
+    assert limits == ['10:5']
+    assert banned == []
+
+
+def test_unparsed_lines_are_kept_in_order(storage):
+    async def scenario():
+        await storage.append_line(config.AUTHORIZED_USERS_FILE, 'not-a-user')
+        await storage.append_line(config.SUPPORT_REQUESTS_FILE, 'first')
+        await storage.append_line(config.SUPPORT_REQUESTS_FILE, 'second')
+        await storage.remove_line(config.SUPPORT_REQUESTS_FILE, 'first')
+        return (
+            await storage.read_lines(config.AUTHORIZED_USERS_FILE),
+            await storage.read_lines(config.SUPPORT_REQUESTS_FILE),
+        )
+
+    authorized, support = asyncio.run(scenario())
+    assert authorized == ['not-a-user']
+    assert support == ['second']
+
+
+def test_replace_lines_rewrites_table(storage):
+    async def scenario():
+        await storage.append_line(config.BANNED_USERS_FILE, '7')
+        await storage.replace_lines(config.BANNED_USERS_FILE, ['8', '9'])
+        return await storage.read_lines(config.BANNED_USERS_FILE)
+
+    assert asyncio.run(scenario()) == ['8', '9']
+
+
+def test_global_limit_setting(storage):
+    async def scenario():
+        assert await storage.get_global_limit() is None
+        await storage.set_global_limit(4)
+        await storage.set_global_limit(6)
+        return await storage.get_global_limit(), await storage.read_lines(config.KEY_LIMIT_FILE)
+
+    assert asyncio.run(scenario()) == ('6', ['6'])
+
+
+def test_data_survives_reopen(tmp_path):
+    db_path = str(tmp_path / 'bot.db')
+    first = SQLiteStorage(db_path)
+    asyncio.run(first.append_line(config.AUTHORIZED_USERS_FILE, '42'))
+    first.close()
+
+    second = SQLiteStorage(db_path)
+    try:
+        assert asyncio.run(second.read_lines(config.AUTHORIZED_USERS_FILE)) == ['42']
+    finally:
+        second.close()
+
+
+def test_migrate_from_files(storage, tmp_path):
+    users_dir = tmp_path / 'users'
+    users_dir.mkdir()
+    (users_dir / 'authorized_users.txt').write_text('1\n2\n\n', encoding='utf-8')
+    (users_dir / 'user_limits.txt').write_text('2:7\n', encoding='utf-8')
+    (users_dir / 'keys_log.txt').write_text(
+        "2026-10-01 10:00:00 - User: u2 (ID: 2) - Key: wg1.conf\n", encoding='utf-8'
+    )
+    (users_dir / 'notes.md').write_text('не импортируется\n', encoding='utf-8')
+
+    imported = storage.migrate_from_files(str(users_dir))
+    assert imported['authorized_users.txt'] == 2
+    assert 'notes.md' not in imported
+
+    async def scenario():
+        return (
+            await storage.read_lines(config.AUTHORIZED_USERS_FILE),
+            await storage.read_lines(config.USER_LIMITS_FILE),
+            await storage.read_lines(config.KEYS_LOG_FILE),
+        )
+
+    authorized, limits, keys_log = asyncio.run(scenario())
+    assert authorized == ['1', '2']
+    assert limits == ['2:7']
+    assert keys_log == ["2026-10-01 10:00:00 - User: u2 (ID: 2) - Key: wg1.conf"]
+    # Повторная миграция заменяет данные, а не дублирует их
+    storage.migrate_from_files(str(users_dir))
+    assert asyncio.run(storage.read_lines(config.AUTHORIZED_USERS_FILE)) == ['1', '2']
+
+
+def test_handles_only_user_text_files(storage):
+    assert storage.handles(config.AUTHORIZED_USERS_FILE)
+    assert not storage.handles(os.path.join(config.CONFIGS_DIR, 'wg1.conf'))
+    assert not storage.handles(os.path.join(config.DATA_DIR, 'other.txt'))
+
+
+def test_utils_file_api_uses_database(data_dir, storage, monkeypatch):
+    import utils
+
+    monkeypatch.setattr(utils, 'sqlite_storage', storage)
+
+    async def scenario():
+        await utils.append_to_file(config.AUTHORIZED_USERS_FILE, '5')
+        await utils.append_to_file(config.BANNED_USERS_FILE, '6')
+        await utils.remove_from_file(config.BANNED_USERS_FILE, '6')
+        registry = await utils.get_user_registry()
+        return await utils.read_file(config.AUTHORIZED_USERS_FILE), registry
+
+    authorized, registry = asyncio.run(scenario())
+    assert authorized == ['5']
+    assert registry.authorized == {5} and registry.banned == set()
+    # Текстовые файлы не создаются
+    assert not os.path.exists(config.AUTHORIZED_USERS_FILE)
+
+
+def test_key_files_in_issue_order(storage):
+    async def scenario():
+        await storage.log_issuance("2026-10-01 10:00:00", 'alice', 1, 'wg1.conf')
+        await storage.log_issuance("2026-10-01 11:00:00", 'bob', 2, 'wg2.conf')
+        await storage.log_issuance("2026-10-02 09:00:00", 'alice', 1, 'wg3.conf')
+        return await storage.key_files(), await storage.key_files(1), await storage.key_files(5)
+
+    assert asyncio.run(scenario()) == ({1: ['wg1.conf', 'wg3.conf'], 2: ['wg2.conf']}, {1: ['wg1.conf', 'wg3.conf']}, {})
+
+
+def test_stats_lines_are_upserted_per_user(storage):
+    async def scenario():
+        await storage.log_issuance("2026-10-01 10:00:00", 'alice', 1, 'wg1.conf')
+        for count in range(1, 4):
+            await storage.append_line(config.KEYS_LOG_FILE, f"1:stats:{count}")
+        await storage.append_line(config.KEYS_LOG_FILE, "2:stats:1")
+        return await storage.read_lines(config.KEYS_LOG_FILE), await storage.load_issuance_counts()
+
+    lines, index = asyncio.run(scenario())
+    assert lines == ["2026-10-01 10:00:00 - User: alice (ID: 1) - Key: wg1.conf", "1:stats:3", "2:stats:1"]
+    assert index == {'counts': {1: 1}, 'stats': {1: 3, 2: 1}}
+    # В общую таблицу строк статистика не попадает
+    assert storage._run_sync(lambda conn: conn.execute("SELECT COUNT(*) FROM lines").fetchone()[0]) == 0
+
+
+def test_stats_lines_of_old_database_are_moved(tmp_path):
+    import sqlite3
+
+    db_path = str(tmp_path / 'bot.db')
+    SQLiteStorage(db_path)._run_sync(lambda conn: None)
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO lines (path, line) VALUES (?, ?)",
+        [('keys_log.txt', '1:stats:1'), ('keys_log.txt', 'junk'), ('keys_log.txt', '1:stats:2')]
+    )
+    conn.commit()
+    conn.close()
+
+    storage = SQLiteStorage(db_path)
+    try:
+        assert asyncio.run(storage.read_lines(config.KEYS_LOG_FILE)) == ['1:stats:2', 'junk']
+    finally:
+        storage.close()
+
+
+def test_issuance_index_is_built_from_aggregates(data_dir, storage, monkeypatch):
+    import utils
+
+    monkeypatch.setattr(utils, 'sqlite_storage', storage)
+    read_lines = storage.read_lines
+
+    async def guarded_read_lines(file_path):
+        assert file_path != config.KEYS_LOG_FILE, "журнал выдачи не должен читаться целиком"
+        return await read_lines(file_path)
+
+    async def scenario():
+        await utils.log_key_issuance(1, 'alice', 'wg1.conf')
+        await utils.log_key_issuance(1, 'alice', 'wg2.conf')
+        await utils.log_key_issuance(2, 'bob', 'wg3.conf')
+        await utils.update_user_stats(1)
+        utils.issuance_index.loaded = False
+        monkeypatch.setattr(storage, 'read_lines', guarded_read_lines)
+        index = await utils.get_issuance_index()
+        return dict(index.counts), dict(index.stats)
+
+    assert asyncio.run(scenario()) == ({1: 2, 2: 1}, {1: 1})
@@ -0,0 +1,56 @@
+# tests/test_throttling.py
+
+import asyncio
+import itertools
+from collections import Counter
+
+from aiogram import Bot, Dispatcher, types
+
+USER_ID = 80
+
+
+def test_back_from_throttled_input_does_not_spend_limit(data_dir, monkeypatch):
+    import config
+    import handlers
+    import main
+    import utils
+
+    sent = []
+    ids = itertools.count(1)
+
+    async def fake_request(self, method, data=None, files=None, **kwargs):
+        sent.append((method, dict(data or {})))
+        chat_id = int((data or {}).get('chat_id', USER_ID))
+        return {'message_id': next(ids), 'date': 0, 'chat': {'id': chat_id, 'type': 'private'}, 'text': 'x'}
+
+    monkeypatch.setattr(Bot, 'request', fake_request)
+    monkeypatch.setattr(handlers.throttling, 'buckets', {})
+    monkeypatch.setattr(handlers.throttling, 'warned', set())
+    monkeypatch.setattr(handlers.throttling, 'rejected', Counter())
+
+    def message(text):
+        return types.Update.to_object({'update_id': next(ids), 'message': {
+            'message_id': next(ids), 'date': 0,
+            'chat': {'id': USER_ID, 'type': 'private'},
+            'from': {'id': USER_ID, 'is_bot': False, 'first_name': 'Test'},
+            'text': text,
+        }})
+
+    async def scenario():
+        Bot.set_current(main.bot)
+        Dispatcher.set_current(main.dp)
+        await utils.append_to_file(config.AUTHORIZED_USERS_FILE, str(USER_ID))
+        # Лимит пожеланий — 3 за 10 минут; возвраты в меню не должны его расходовать
+        for _ in range(4):
+            await main.dp.process_update(message("💬 Пожелания и предложения"))
+            await main.dp.process_update(message("🔙 Назад"))
+        await main.dp.process_update(message("💬 Пожелания и предложения"))
+        sent.clear()
+        await main.dp.process_update(message("Добавьте больше серверов"))
+        assert await main.dp.current_state(chat=USER_ID, user=USER_ID).get_state() is None
+        await utils.close_storage()
+
+    asyncio.run(scenario())
+    assert handlers.throttling.rejected['wishes'] == 0
+    assert any(data.get('chat_id') == config.AUTHORIZED_USER_ID and 'Добавьте больше серверов' in data.get('text', '')
+               for method, data in sent)
@@ -0,0 +1,42 @@
+# tests/test_user_registry.py
+
+import asyncio
+
+import pytest
+
+import config
+import utils
+
+
+def test_registry_follows_file_writes(data_dir):
+    async def scenario():
+        registry = await utils.get_user_registry()
+        await utils.append_to_file(config.AUTHORIZED_USERS_FILE, '10')
+        await utils.append_to_file(config.BANNED_USERS_FILE, '20')
+        await utils.remove_from_file(config.AUTHORIZED_USERS_FILE, '10')
+        await utils.close_storage()
+        return registry
+
+    registry = asyncio.run(scenario())
+    assert registry.authorized == set()
+    assert registry.banned == {20}
+
+
+def test_failed_append_is_rolled_back(data_dir, monkeypatch):
+    async def failing_append(file_path, data, durable=False):
+        raise OSError("диск переполнен")
+
+    async def scenario():
+        registry = await utils.get_user_registry()
+        await utils.append_to_file(config.AUTHORIZED_USERS_FILE, '10')
+        await utils.close_storage()
+        monkeypatch.setattr(utils.append_journal, 'append', failing_append)
+        for user_id in ('10', '30'):
+            with pytest.raises(OSError):
+                await utils.append_to_file(config.AUTHORIZED_USERS_FILE, user_id, durable=True)
+        return registry
+
+    registry = asyncio.run(scenario())
+    # Пользователь, уже записанный ранее, остаётся; несохранённый — не появляется
+    assert registry.authorized == {10}
+    assert registry.sorted['authorized'] == [10]
@@ -0,0 +1,109 @@
+# tests/test_users_pages.py
+
+import asyncio
+from types import SimpleNamespace
+
+from keyboards import users_page_data
+from user_registry import UserRegistry
+
+
+def _registry(authorized, banned=()):
+    registry = UserRegistry()
+    registry.load([str(uid) for uid in authorized], [str(uid) for uid in banned])
+    return registry
+
+
+def test_pages_walk_both_sections_in_order():
+    registry = _registry([5, 3, 1], [4, 2])
+
+    first, start, total, next_cursor = registry.page(size=2)
+    assert (first, start, total, next_cursor) == ([('authorized', 1), ('authorized', 3)], 0, 5, ('authorized', 5))
+    second, start, _, next_cursor = registry.page(next_cursor, size=2)
+    assert (second, start, next_cursor) == ([('authorized', 5), ('banned', 2)], 2, ('banned', 4))
+    third, start, _, next_cursor = registry.page(next_cursor, size=2)
+    assert (third, start, next_cursor) == ([('banned', 4)], 4, None)
+
+    # Назад от первого элемента страницы
+    back, start, _, _ = registry.page(third[0], size=2, backward=True)
+    assert (back, start) == (second, 2)
+    back, start, _, _ = registry.page(second[0], size=2, backward=True)
+    assert (back, start) == (first, 0)
+
+
+def test_cursor_is_stable_when_users_change():
+    from config import AUTHORIZED_USERS_FILE
+
+    registry = _registry(range(10, 100, 10))
+    page, _, _, next_cursor = registry.page(size=3)
+    assert next_cursor == ('authorized', 40)
+
+    # Пользователи до курсора добавлены и удалены, а курсор на следующую страницу
+    # по-прежнему указывает на тех же пользователей
+    registry.on_append(AUTHORIZED_USERS_FILE, '5')
+    registry.on_remove(AUTHORIZED_USERS_FILE, '20')
+    page, start, total, _ = registry.page(next_cursor, size=3)
+    assert [uid for _, uid in page] == [40, 50, 60]
+    assert (start, total) == (3, 9)
+
+    # Курсор удалённого пользователя указывает на следующего
+    registry.on_remove(AUTHORIZED_USERS_FILE, '40')
+    assert registry.page(next_cursor, size=3)[0][0] == ('authorized', 50)
+
+
+def test_page_of_empty_registry():
+    assert _registry([]).page() == ([], 0, 0, None)
+
+
+def test_sorted_sections_follow_registry_updates():
+    from config import AUTHORIZED_USERS_FILE, BANNED_USERS_FILE
+
+    registry = _registry([3, 1])
+    registry.on_append(AUTHORIZED_USERS_FILE, '2')
+    registry.on_append(AUTHORIZED_USERS_FILE, '2')
+    registry.on_append(BANNED_USERS_FILE, '9')
+    registry.on_remove(AUTHORIZED_USERS_FILE, '3')
+    assert registry.sorted == {'authorized': [1, 2], 'banned': [9]}
+    registry.on_rewrite(BANNED_USERS_FILE, ['8', '7'])
+    assert registry.sorted['banned'] == [7, 8] and registry.banned == {7, 8}
+
+
+def test_page_callback_data_round_trip():
+    import handlers
+
+    for view, cursor, backward in (('stats', ('authorized', 42), False), ('users', ('banned', 7), True)):
+        data = users_page_data(view, cursor, backward)
+        assert len(data.encode()) <= 64
+        assert handlers._parse_users_page_data(data) == (view, cursor, backward)
+
+
+def test_render_users_page_fetches_only_page_profiles(data_dir, monkeypatch):
+    import config
+    import handlers
+    import utils
+
+    requested = []
+
+    async def get_many(bot, user_ids):
+        requested.append(list(user_ids))
+        return {uid: SimpleNamespace(username=f"user<{uid}>") for uid in user_ids}
+
+    monkeypatch.setattr(handlers, 'USERS_PAGE_SIZE', 2)
+    monkeypatch.setattr(handlers.profile_cache, 'get_many', get_many)
+
+    async def scenario():
+        for uid in (11, 12, 13):
+            await utils.append_to_file(config.AUTHORIZED_USERS_FILE, str(uid))
+        await utils.append_to_file(config.BANNED_USERS_FILE, '14')
+        first = await handlers.render_users_page(handlers.VIEW_USERS)
+        cursor = ('authorized', 13)
+        second = await handlers.render_users_page(handlers.VIEW_USERS, cursor)
+        await utils.close_storage()
+        return first, second
+
+    (text, keyboard), (second_text, second_keyboard) = asyncio.run(scenario())
+    assert requested == [[11, 12], [13, 14]]
+    assert "user&lt;11&gt; (ID: 11)" in text and "Авторизовано:</b> 3, <b>забанено:</b> 1" in text
+    rows = keyboard.markup.inline_keyboard
+    assert [button.callback_data for button in rows[-1]] == ['no_action', 'upage_users_n_authorized_13']
+    assert "🚫 <b>Забаненные пользователи:</b>" in second_text
+    assert [button.text for button in second_keyboard.markup.inline_keyboard[-1]] == ["◀️", "3–4 из 4"]
@@ -0,0 +1,79 @@
+# tests/test_webhook.py
+
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.utils import executor
+from aiohttp.test_utils import TestClient, TestServer
+
+import config
+import webhook_server
+
+UPDATE = {
+    'update_id': 1,
+    'message': {
+        'message_id': 1,
+        'date': 1700000000,
+        'chat': {'id': 42, 'type': 'private'},
+        'from': {'id': 42, 'is_bot': False, 'first_name': 'Test'},
+        'text': 'привет',
+    },
+}
+
+
+def _post_update(monkeypatch, headers: dict):
+    """
+    Поднимает приложение вебхука так же, как start_webhook, и отправляет на WEBHOOK_PATH одно обновление.
+    Возвращает код ответа и тексты сообщений, дошедших до обработчиков.
+    """
+    apps = []
+    monkeypatch.setattr(executor.Executor, 'run_app', lambda self, **kwargs: apps.append(self.web_app))
+
+    async def welcome(self):
+        pass
+
+    # Приветствие при запуске запрашивает getMe у Telegram
+    monkeypatch.setattr(executor.Executor, '_welcome', welcome)
+
+    # start_webhook синхронный и сам выполняет запуск в текущем цикле событий
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    bot = Bot(config.API_TOKEN)
+    dp = Dispatcher(bot)
+    received = []
+
+    @dp.message_handler()
+    async def on_message(message):
+        received.append(message.text)
+
+    async def noop(dispatcher):
+        pass
+
+    async def post():
+        async with TestClient(TestServer(apps[0])) as client:
+            response = await client.post(config.WEBHOOK_PATH, json=UPDATE, headers=headers)
+            return response.status
+
+    try:
+        webhook_server.start_webhook(dp, noop, noop, config.WEBHOOK_HOST, config.WEBHOOK_PORT,
+                                     config.WEBHOOK_PATH, config.WEBHOOK_SECRET)
+        status = loop.run_until_complete(post())
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+    return status, received
+
+
+def test_update_with_secret_token_is_processed(monkeypatch):
+    headers = {webhook_server.SECRET_TOKEN_HEADER: config.WEBHOOK_SECRET}
+    status, received = _post_update(monkeypatch, headers)
+    assert status == 200
+    assert received == ['привет']
+
+
+@pytest.mark.parametrize('headers', [{}, {webhook_server.SECRET_TOKEN_HEADER: 'wrong'}])
+def test_update_without_secret_token_is_rejected(monkeypatch, headers):
+    status, received = _post_update(monkeypatch, headers)
+    assert status == 401
+    assert received == []
@@ -0,0 +1,112 @@
+# throttling.py
+
+import logging
+from collections import Counter
+
+from aiogram import types
+from aiogram.dispatcher.handler import CancelHandler, current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Как часто удалять восстановившиеся ограничители, чтобы их число не росло бесконечно
+PRUNE_EVERY = 1000
+
+
+def throttled(action: str):
+    """
+    Помечает обработчик как ограничиваемый по частоте: лимит задаётся для действия action.
+    """
+    def decorator(handler):
+        handler.throttle_action = action
+        return handler
+    return decorator
+
+
+def parse_rate_limit(value: str) -> tuple:
+    """
+    Разбирает лимит вида "N/сек" (N событий за указанное число секунд).
+    Возвращает (скорость восстановления в секунду, допустимый всплеск).
+    """
+    count, _, seconds = value.partition('/')
+    count = float(count)
+    seconds = float(seconds or 1)
+    if count <= 0 or seconds <= 0:
+        raise ValueError(f"Некорректный лимит: {value}")
+    return count / seconds, count
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничивает частоту дорогих действий для каждого пользователя (token bucket
+    на пару пользователь/действие). Отклонённое событие не доходит до обработчика;
+    о превышении пользователь узнаёт один раз, пока снова не уложится в лимит.
+    Счётчики отклонённых событий по действиям хранятся в rejected.
+    """
+
+    def __init__(self, limits: dict, message: str, exempt: set = None):
+        super().__init__()
+        self.limits = limits  # действие -> (скорость в секунду, всплеск)
+        self.message = message
+        self.exempt = exempt or set()
+        self.buckets = {}  # (user_id, действие) -> TokenBucket
+        self.warned = set()  # (user_id, действие), которым уже отправлено предупреждение
+        self.rejected = Counter()  # действие -> число отклонённых событий
+        self._checks = 0
+
+    def _prune(self):
+        for key in [key for key, bucket in self.buckets.items() if bucket.is_full()]:
+            del self.buckets[key]
+            self.warned.discard(key)
+
+    def _allow(self, user_id: int, action: str) -> bool:
+        self._checks += 1
+        if self._checks % PRUNE_EVERY == 0:
+            self._prune()
+        key = (user_id, action)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            rate, burst = self.limits[action]
+            bucket = self.buckets[key] = TokenBucket(rate, burst)
+        if bucket.try_consume():
+            self.warned.discard(key)
+            return True
+        self.rejected[action] += 1
+        return False
+
+    def _action(self, user_id: int):
+        handler = current_handler.get(None)
+        action = getattr(handler, 'throttle_action', None)
+        if action is None or action not in self.limits or user_id in self.exempt:
+            return None
+        return action
+
+    def _first_rejection(self, user_id: int, action: str) -> bool:
+        key = (user_id, action)
+        if key in self.warned:
+            return False
+        self.warned.add(key)
+        logger.warning(f"Пользователь {user_id} превысил лимит действия {action}")
+        return True
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        user_id = message.from_user.id
+        action = self._action(user_id)
+        if action is None or self._allow(user_id, action):
+            return
+        if self._first_rejection(user_id, action):
+            await message.reply(self.message)
+        raise CancelHandler()
+
+    async def on_process_callback_query(self, call: types.CallbackQuery, data: dict):
+        user_id = call.from_user.id
+        action = self._action(user_id)
+        if action is None or self._allow(user_id, action):
+            return
+        if self._first_rejection(user_id, action):
+            await call.answer(self.message, show_alert=True)
+        else:
+            await call.answer()
+        raise CancelHandler()
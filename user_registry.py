@@ -0,0 +1,135 @@
+# user_registry.py
+
+import bisect
+
+from config import AUTHORIZED_USERS_FILE, BANNED_USERS_FILE
+
+# Разделы списка пользователей в порядке показа
+SECTIONS = ('authorized', 'banned')
+
+
+class UserRegistry:
+    """
+    Держит в памяти множества авторизованных и забаненных пользователей.
+    Загружается один раз при старте и синхронизируется при каждой записи
+    в соответствующие файлы (write-through), поэтому проверки выполняются за O(1)
+    и без обращения к диску. Для постраничного вывода каждый раздел дополнительно
+    хранится отсортированным по ID.
+    """
+
+    def __init__(self):
+        self.authorized = set()
+        self.banned = set()
+        self.sorted = {section: [] for section in SECTIONS}  # раздел -> отсортированные ID
+        self.loaded = False
+
+    def _section(self, file_path: str):
+        if file_path == AUTHORIZED_USERS_FILE:
+            return 'authorized'
+        if file_path == BANNED_USERS_FILE:
+            return 'banned'
+        return None
+
+    @staticmethod
+    def _parse(lines) -> set:
+        return {int(line.strip()) for line in lines if line.strip().isdigit()}
+
+    def _set_section(self, section: str, user_ids: set):
+        setattr(self, section, user_ids)
+        self.sorted[section] = sorted(user_ids)
+
+    def load(self, authorized_lines: list, banned_lines: list):
+        """
+        Заполняет реестр строками из файлов пользователей.
+        """
+        self._set_section('authorized', self._parse(authorized_lines))
+        self._set_section('banned', self._parse(banned_lines))
+        self.loaded = True
+
+    def is_authorized(self, user_id: int) -> bool:
+        return user_id in self.authorized
+
+    def is_banned(self, user_id: int) -> bool:
+        return user_id in self.banned
+
+    def on_append(self, file_path: str, data: str) -> bool:
+        """
+        Вызывается при добавлении строки в файл пользователей.
+        Возвращает True, если пользователь добавлен в реестр этим вызовом.
+        """
+        section = self._section(file_path)
+        if section is None or not data.strip().isdigit():
+            return False
+        user_id = int(data.strip())
+        target = getattr(self, section)
+        if user_id in target:
+            return False
+        target.add(user_id)
+        bisect.insort(self.sorted[section], user_id)
+        return True
+
+    def on_remove(self, file_path: str, data: str):
+        """
+        Вызывается после удаления строки из файла пользователей.
+        """
+        section = self._section(file_path)
+        if section is None or not data.strip().isdigit():
+            return
+        user_id = int(data.strip())
+        target = getattr(self, section)
+        if user_id in target:
+            target.discard(user_id)
+            ordered = self.sorted[section]
+            del ordered[bisect.bisect_left(ordered, user_id)]
+
+    def on_rewrite(self, file_path: str, lines: list):
+        """
+        Вызывается после полной перезаписи файла пользователей.
+        """
+        section = self._section(file_path)
+        if section is not None:
+            self._set_section(section, self._parse(lines))
+
+    # Постраничный вывод
+
+    def total(self) -> int:
+        return sum(len(self.sorted[section]) for section in SECTIONS)
+
+    def _position(self, cursor: tuple) -> int:
+        section, user_id = cursor
+        position = 0
+        for name in SECTIONS:
+            if name == section:
+                return position + bisect.bisect_left(self.sorted[name], user_id)
+            position += len(self.sorted[name])
+        return position
+
+    def _slice(self, start: int, stop: int) -> list:
+        entries = []
+        offset = 0
+        for section in SECTIONS:
+            ordered = self.sorted[section]
+            if start < offset + len(ordered) and stop > offset:
+                entries.extend((section, user_id) for user_id in ordered[max(start - offset, 0):stop - offset])
+            offset += len(ordered)
+        return entries
+
+    def page(self, cursor: tuple = None, size: int = 20, backward: bool = False) -> tuple:
+        """
+        Страница списка пользователей: сначала авторизованные, затем забаненные, по возрастанию ID.
+        cursor — (раздел, user_id) первого пользователя страницы, а при backward —
+        пользователя сразу после неё. Курсор не обязан существовать: позиция ищется
+        бинарным поиском, поэтому добавление и удаление пользователей не сдвигает страницы.
+        Возвращает (список (раздел, user_id), номер первого элемента, всего, курсор следующей страницы).
+        """
+        total = self.total()
+        start = self._position(cursor) if cursor is not None else 0
+        if backward:
+            start -= size
+        start = max(0, min(start, max(total - 1, 0)))
+        entries = self._slice(start, start + size + 1)
+        next_cursor = entries[size] if len(entries) > size else None
+        return entries[:size], start, total, next_cursor
+
+
+user_registry = UserRegistry()
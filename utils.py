@@ -2,7 +2,7 @@
 
 import asyncio
 import os
-from pathlib import Path
+import tempfile
 import aiofiles
 import zipfile
 from datetime import datetime
@@ -14,56 +14,164 @@ from config import (
     SUPPORT_REQUESTS_FILE,
     SITE_EXCEPTIONS_FILE,
     CONFIGS_DIR,
+    CLAIMED_CONFIGS_DIR,
+    STAGED_FILE_IDS_FILE,
     KEY_LIMIT_FILE,
-    USER_LIMITS_FILE
+    USER_LIMITS_FILE,
+    STORAGE_BACKEND,
+    SQLITE_DB_FILE,
+    JOURNAL_COMMIT_INTERVAL,
+    JOURNAL_FSYNC,
+    KEYS_LOG_COMPACTING_FILE,
+    KEYS_LOG_SNAPSHOT_FILE,
+    KEYS_LOG_ARCHIVE_DIR,
+    KEYS_LOG_MAX_BYTES,
+    KEYS_LOG_COMPACT_INTERVAL
 )
+from user_registry import user_registry
+from sqlite_storage import SQLiteStorage
+from quota_index import QuotaIndex
+from issuance_index import IssuanceIndex, parse_issuance_line
+from issuance_rollups import IssuanceRollups
+from key_pool import KeyPool
+from append_journal import AppendJournal
+from log_compaction import read_snapshot, read_rollups, compact_file, list_segments
+from log_reader import recent_issuances, iter_log_issuances, key_files_by_user
+from csv_export import write_csv, iter_user_rows, USERS_HEADER, ISSUANCES_HEADER
+from metrics import timed, STORAGE_DURATION
 import logging
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_GLOBAL_LIMIT = 10
 
+# Хранилище SQLite используется вместо текстовых файлов, если STORAGE_BACKEND=sqlite
+sqlite_storage = SQLiteStorage(SQLITE_DB_FILE) if STORAGE_BACKEND == 'sqlite' else None
+append_journal = AppendJournal(JOURNAL_COMMIT_INTERVAL, JOURNAL_FSYNC)
+
+quota_index = QuotaIndex(DEFAULT_GLOBAL_LIMIT)
+issuance_index = IssuanceIndex()
+issuance_rollups = IssuanceRollups()
+key_pool = KeyPool(CONFIGS_DIR, CLAIMED_CONFIGS_DIR, STAGED_FILE_IDS_FILE)
+
+def _use_sqlite(file_path: str) -> bool:
+    return sqlite_storage is not None and sqlite_storage.handles(file_path)
+
 # Асинхронное чтение файла
+@timed(STORAGE_DURATION, 'read_file')
 async def read_file(file_path: str) -> list:
     """
     Асинхронно читает файл и возвращает список строк.
     """
-    if not os.path.exists(file_path):
-        return []
-    async with aiofiles.open(file_path, mode='r', encoding='utf-8') as f:
-        contents = await f.readlines()
+    if _use_sqlite(file_path):
+        return await sqlite_storage.read_lines(file_path)
+    # Ждём и фоновую запись, которая уже забрала строки из очереди, иначе прочитаем устаревший файл
+    async with append_journal.exclusive(file_path):
+        if not os.path.exists(file_path):
+            return []
+        async with aiofiles.open(file_path, mode='r', encoding='utf-8') as f:
+            contents = await f.readlines()
     return [line.strip() for line in contents]
 
 # Асинхронное добавление строки в конец файла
-async def append_to_file(file_path: str, data: str):
+@timed(STORAGE_DURATION, 'append_to_file')
+async def append_to_file(file_path: str, data: str, durable: bool = False):
     """
     Асинхронно добавляет строку в конец файла.
+    Запись выполняется фоновым журналом группами; при durable=True функция
+    возвращается только после того, как строка записана на диск.
     """
-    path = Path(file_path)
-    async with aiofiles.open(file_path, mode='a', encoding='utf-8') as f:
-        await f.write(f"{data}\n")
+    # Реестр обновляется сразу, чтобы строку увидела перезапись файла, начатая до её записи на диск
+    added = user_registry.on_append(file_path, data)
+    try:
+        if _use_sqlite(file_path):
+            await sqlite_storage.append_line(file_path, data)
+        else:
+            await append_journal.append(file_path, data, durable=durable)
+    except BaseException:
+        # Строка не записана: убираем из реестра пользователя, добавленного этим вызовом
+        if added:
+            user_registry.on_remove(file_path, data)
+        raise
 
 # Асинхронная перезапись файла (полное)
+@timed(STORAGE_DURATION, 'write_file')
 async def write_file(file_path: str, lines: list):
     """
     Асинхронно записывает список строк в файл, перезаписывая его.
+    Файл пишется целиком во временный файл и атомарно подменяется.
     """
-    path = Path(file_path)
-    async with aiofiles.open(file_path, mode='w', encoding='utf-8') as f:
-        for line in lines:
-            await f.write(f"{line}\n")
+    if _use_sqlite(file_path):
+        await sqlite_storage.replace_lines(file_path, lines)
+        user_registry.on_rewrite(file_path, lines)
+        return
+    async with append_journal.exclusive(file_path):
+        # Реестр обновляется до снятия блокировки: строки, добавленные позже, попадут и в файл, и в реестр
+        user_registry.on_rewrite(file_path, lines)
+        await asyncio.to_thread(_write_file_atomic, file_path, [f"{line}\n" for line in lines], JOURNAL_FSYNC)
+
+def _write_file_atomic(file_path: str, lines: list, fsync: bool):
+    # Уникальное имя временного файла: параллельные перезаписи не мешают друг другу
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or '.', prefix=f"{os.path.basename(file_path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(''.join(lines))
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def _remove_line_atomic(file_path: str, data: str, fsync: bool):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        lines = [f"{line.strip()}\n" for line in f if line.strip() != data]
+    _write_file_atomic(file_path, lines, fsync)
 
 # Асинхронное удаление строки из файла
+@timed(STORAGE_DURATION, 'remove_from_file')
 async def remove_from_file(file_path: str, data: str):
     """
     Асинхронно удаляет строку из файла.
     """
-    path = Path(file_path)
-    if not path.exists():
+    if _use_sqlite(file_path):
+        await sqlite_storage.remove_line(file_path, data)
+        user_registry.on_remove(file_path, data)
         return
-    lines = await read_file(file_path)
-    lines = [line for line in lines if line != data]
-    await write_file(file_path, lines)
+    # Чтение и перезапись выполняются под одной блокировкой журнала, чтобы не потерять параллельные добавления
+    async with append_journal.exclusive(file_path):
+        if not os.path.exists(file_path):
+            return
+        user_registry.on_remove(file_path, data)
+        await asyncio.to_thread(_remove_line_atomic, file_path, data, JOURNAL_FSYNC)
+
+# Закрытие хранилища при остановке бота
+async def close_storage():
+    """
+    Записывает накопленные строки и закрывает соединение с базой данных, если используется SQLite.
+    """
+    await append_journal.stop()
+    if sqlite_storage is not None:
+        await asyncio.to_thread(sqlite_storage.close)
+
+# Загрузка реестра пользователей
+async def load_user_registry():
+    """
+    Загружает списки авторизованных и забаненных пользователей в память.
+    """
+    authorized_users = await read_file(AUTHORIZED_USERS_FILE)
+    banned_users = await read_file(BANNED_USERS_FILE)
+    user_registry.load(authorized_users, banned_users)
+    logger.info(f"Реестр пользователей загружен: {len(user_registry.authorized)} авторизованных, {len(user_registry.banned)} забаненных")
+
+async def get_user_registry():
+    """
+    Возвращает реестр пользователей, загружая его при первом обращении.
+    """
+    if not user_registry.loaded:
+        await load_user_registry()
+    return user_registry
 
 # Логирование выдачи ключа
 async def log_key_issuance(user_id: int, username: str, key_filename: str):
@@ -73,65 +181,186 @@ async def log_key_issuance(user_id: int, username: str, key_filename: str):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     log_entry = f"{timestamp} - User: {username} (ID: {user_id}) - Key: {key_filename}"
     issued_entry = f"{user_id}:{key_filename}"
-    
-    await append_to_file(KEYS_LOG_FILE, log_entry)
-    await append_to_file(KEYS_ISSUED_FILE, issued_entry)
+
+    if sqlite_storage is not None:
+        await sqlite_storage.log_issuance(timestamp, username, user_id, key_filename)
+    else:
+        # Обе строки попадают в одно окно фиксации; ждём, пока выдача будет записана на диск
+        await asyncio.gather(
+            append_to_file(KEYS_LOG_FILE, log_entry, durable=True),
+            append_to_file(KEYS_ISSUED_FILE, issued_entry, durable=True)
+        )
+    quota_index.on_issued(user_id)
+    issuance_index.on_issued(user_id)
+    issuance_rollups.add(timestamp, user_id)
 
 # Проверка, выдавался ли уже ключ
 async def check_key_issued(user_id: int) -> bool:
     """
     Проверяет, был ли уже выдан ключ пользователю.
     """
-    issued_keys = await read_file(KEYS_ISSUED_FILE)
-    return any(line.startswith(f"{user_id}:") for line in issued_keys)
+    return (await get_quota_index()).issued_count(user_id) > 0
 
 # Маркировка ключа как выданного
 async def mark_key_issued(user_id: int, key_filename: str):
     """
     Маркирует ключ как выданный пользователю.
+    Не нужно вызывать после log_key_issuance: она уже записывает ключ в keys_issued.txt.
+    Лимиты считаются по журналу выдачи, поэтому индекс квот здесь не меняется.
     """
     entry = f"{user_id}:{key_filename}"
     await append_to_file(KEYS_ISSUED_FILE, entry)
 
+# Загрузка очереди ключей
+async def load_key_pool():
+    """
+    Индексирует папку с .conf файлами в очередь ключей.
+    """
+    await asyncio.to_thread(key_pool.load)
+    logger.info(f"Очередь ключей загружена: {key_pool.remaining} ключей")
+
+async def get_key_pool():
+    """
+    Возвращает очередь ключей, загружая её при первом обращении.
+    """
+    if not key_pool.loaded:
+        await load_key_pool()
+    return key_pool
+
+# Проверка очереди ключей
+async def check_key_pool() -> dict:
+    """
+    Проверяет очередь ключей при старте и предупреждает о пустой очереди и пустых файлах.
+    """
+    pool = await get_key_pool()
+    report = await asyncio.to_thread(pool.check)
+    if not report['remaining']:
+        logger.warning("⚠️ В очереди нет ключей: пользователи не смогут получить ключ")
+    if report['empty']:
+        logger.warning(f"⚠️ Пустые файлы ключей ({len(report['empty'])}): {', '.join(report['empty'][:10])}")
+    return report
+
 # Получение доступных конфигурационных файлов
 async def get_conf_files() -> list:
     """
-    Возвращает список доступных .conf файлов.
+    Возвращает список доступных .conf файлов в порядке выдачи.
     """
-    if not os.path.exists(CONFIGS_DIR):
-        return []
-    return [f for f in os.listdir(CONFIGS_DIR) if f.endswith('.conf')]
+    return (await get_key_pool()).snapshot()
 
 # Обновление статистики пользователя
 async def update_user_stats(user_id: int):
     """
     Обновляет статистику использования ключей пользователем.
     """
-    stats = await load_user_stats()
-    stats[user_id] = stats.get(user_id, 0) + 1
+    count = (await get_issuance_index()).increment_stats(user_id)
     # Записываем обновлённую статистику
-    await append_to_file(KEYS_LOG_FILE, f"{user_id}:stats:{stats[user_id]}")
+    await append_to_file(KEYS_LOG_FILE, f"{user_id}:stats:{count}")
 
 # Загрузка статистики пользователей
 async def load_user_stats() -> dict:
     """
-    Загружает статистику пользователей из keys_log.txt.
-    """
-    stats = {}
-    issued_keys = await read_file(KEYS_LOG_FILE)
-    for line in issued_keys:
-        # Предполагается формат:
-        # timestamp - User: username (ID: user_id) - Key: filename.conf
-        if f"(ID: " in line and "stats" in line:
-            parts = line.split(':')
-            if len(parts) >= 3 and parts[1].strip() == 'stats':
-                try:
-                    user_id = int(parts[0])
-                    count = int(parts[2])
-                    stats[user_id] = count
-                except:
-                    continue
-    return stats
+    Возвращает статистику пользователей (строки user_id:stats:count из keys_log.txt и снимка).
+    """
+    return dict((await get_issuance_index()).stats)
+
+# Чтение журнала выдачи после последнего уплотнения
+async def read_keys_log_tail() -> list:
+    """
+    Возвращает строки keys_log.txt, ещё не попавшие в снимок
+    (включая файл, уплотнение которого было прервано).
+    """
+    lines = []
+    if sqlite_storage is None and os.path.exists(KEYS_LOG_COMPACTING_FILE):
+        lines = await read_file(KEYS_LOG_COMPACTING_FILE)
+    return lines + await read_file(KEYS_LOG_FILE)
+
+_compaction_lock = None
+
+def _get_compaction_lock() -> asyncio.Lock:
+    global _compaction_lock
+    if _compaction_lock is None:
+        _compaction_lock = asyncio.Lock()
+    return _compaction_lock
+
+def _keys_log_paths() -> list:
+    # Файлы журнала выдачи от старых к новым: архивные сегменты, прерванное уплотнение, журнал
+    return list_segments(KEYS_LOG_ARCHIVE_DIR) + [KEYS_LOG_COMPACTING_FILE, KEYS_LOG_FILE]
+
+# Уплотнение журнала выдачи
+async def compact_keys_log(min_bytes: int = 0):
+    """
+    Сворачивает строки статистики keys_log.txt в снимок и переносит строки
+    выдачи в помесячные архивные сегменты, после чего журнал начинается заново.
+    Выполняется, если размер журнала не меньше min_bytes или прошлое уплотнение
+    было прервано. Возвращает сводку или None, если уплотнять нечего.
+    """
+    if sqlite_storage is not None:
+        # Журнал хранится в базе, уплотнение текстового файла не требуется
+        return None
+    async with _get_compaction_lock():
+        if not os.path.exists(KEYS_LOG_COMPACTING_FILE):
+            size = os.path.getsize(KEYS_LOG_FILE) if os.path.exists(KEYS_LOG_FILE) else 0
+            if size == 0 or size < min_bytes:
+                return None
+            await append_journal.rotate(KEYS_LOG_FILE, KEYS_LOG_COMPACTING_FILE)
+        summary = await asyncio.to_thread(compact_file, KEYS_LOG_COMPACTING_FILE, KEYS_LOG_SNAPSHOT_FILE, KEYS_LOG_ARCHIVE_DIR)
+        logger.info(
+            f"Журнал выдачи уплотнён: {summary['stats']} строк статистики, "
+            f"{summary['issuances']} выдач перенесено в {', '.join(summary['segments']) or 'архив'}"
+        )
+        return summary
+
+# Последние выдачи ключей
+async def get_recent_issuances(limit: int, user_id: int = None) -> list:
+    """
+    Возвращает последние limit выдач ключей (новые первыми), при необходимости только для одного пользователя.
+    Журнал и архивные сегменты читаются с конца, поэтому стоимость зависит от limit, а не от размера журнала.
+    """
+    if sqlite_storage is not None:
+        return await sqlite_storage.recent_issuances(limit, user_id)
+    await append_journal.flush(KEYS_LOG_FILE)
+    file_paths = [KEYS_LOG_FILE, KEYS_LOG_COMPACTING_FILE] + list(reversed(list_segments(KEYS_LOG_ARCHIVE_DIR)))
+    return await asyncio.to_thread(recent_issuances, file_paths, limit, user_id)
+
+# Выгрузка пользователей в CSV
+async def export_users_csv(compress: bool = False) -> str:
+    """
+    Выгружает пользователей с их статусом, лимитом и выданными ключами во временный CSV-файл.
+    Списки ID копируются в цикле событий, имена ключей читаются из журнала выдачи,
+    а форматирование и запись идут построчно в отдельном потоке.
+    Возвращает путь к файлу.
+    """
+    registry = await get_user_registry()
+    quota = await get_quota_index()
+    issuance = await get_issuance_index()
+    authorized, banned = set(registry.authorized), set(registry.banned)
+    user_ids = authorized | banned | set(issuance.counts)
+    rows = iter_user_rows(user_ids, authorized, banned, quota, await _read_key_files())
+    return await asyncio.to_thread(write_csv, rows, USERS_HEADER, compress)
+
+# Выгрузка журнала выдачи в CSV
+async def export_issuances_csv(compress: bool = False) -> str:
+    """
+    Выгружает всю историю выдачи ключей во временный CSV-файл и возвращает его путь.
+    Архивные сегменты и журнал читаются построчно в отдельном потоке; на время
+    выгрузки уплотнение журнала откладывается, чтобы строки не переносились между файлами.
+    """
+    if sqlite_storage is not None:
+        return await asyncio.to_thread(write_csv, sqlite_storage.iter_issuances(), ISSUANCES_HEADER, compress)
+    async with _get_compaction_lock():
+        await append_journal.flush(KEYS_LOG_FILE)
+        return await asyncio.to_thread(write_csv, iter_log_issuances(_keys_log_paths()), ISSUANCES_HEADER, compress)
+
+async def keys_log_compaction_worker():
+    """
+    Фоновая задача: периодически уплотняет журнал выдачи, если он превысил KEYS_LOG_MAX_BYTES.
+    """
+    while True:
+        await asyncio.sleep(KEYS_LOG_COMPACT_INTERVAL)
+        try:
+            await compact_keys_log(KEYS_LOG_MAX_BYTES)
+        except Exception as e:
+            logger.error(f"Ошибка при уплотнении журнала выдачи: {e}")
 
 # Добавление сайтов в исключения
 async def add_site_exceptions(url: str):
@@ -153,6 +382,7 @@ async def extract_conf_files_from_zip(zip_path: str) -> tuple:
     """
     added = 0
     replaced = 0
+    pool = await get_key_pool()
 
     try:
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
@@ -170,6 +400,7 @@ async def extract_conf_files_from_zip(zip_path: str) -> tuple:
                     added += 1
 
                 await asyncio.to_thread(os.replace, extracted_path, target_path)
+                pool.add(os.path.basename(file))
 
         return added, replaced
     except zipfile.BadZipFile:
@@ -179,28 +410,89 @@ async def extract_conf_files_from_zip(zip_path: str) -> tuple:
         logger.error(f"Ошибка при извлечении ZIP архива {zip_path}: {e}")
         return -1, -1
 
+# Загрузка агрегата выдачи ключей
+async def load_issuance_index():
+    """
+    Строит агрегат выдачи ключей из снимка и одного прохода по хвосту keys_log.txt,
+    а в режиме SQLite — из агрегирующих запросов к базе.
+    """
+    if sqlite_storage is not None:
+        issuance_index.load([], await sqlite_storage.load_issuance_counts())
+    else:
+        snapshot = await asyncio.to_thread(read_snapshot, KEYS_LOG_SNAPSHOT_FILE)
+        issuance_index.load(await read_keys_log_tail(), snapshot)
+    logger.info(f"Агрегат выдачи ключей загружен: {len(issuance_index.counts)} пользователей")
+
+async def get_issuance_index():
+    """
+    Возвращает агрегат выдачи ключей, загружая его при первом обращении.
+    """
+    if not issuance_index.loaded:
+        await load_issuance_index()
+    return issuance_index
+
+# Загрузка сводок выдачи ключей
+async def load_issuance_rollups():
+    """
+    Загружает почасовые и посуточные счётчики выдачи: из базы или из снимка
+    журнала с досчётом по его хвосту, не перечитывая архив.
+    """
+    if sqlite_storage is not None:
+        issuance_rollups.load(await sqlite_storage.load_rollups())
+    else:
+        async with _get_compaction_lock():
+            snapshot = await asyncio.to_thread(read_rollups, KEYS_LOG_SNAPSHOT_FILE, KEYS_LOG_ARCHIVE_DIR)
+            keys_log = await read_keys_log_tail()
+        issuance_rollups.load(snapshot, filter(None, map(parse_issuance_line, keys_log)))
+    logger.info(f"Сводки выдачи ключей загружены: {len(issuance_rollups.daily)} дней")
+
+async def get_issuance_rollups():
+    """
+    Возвращает сводки выдачи ключей, загружая их при первом обращении.
+    """
+    if not issuance_rollups.loaded:
+        await load_issuance_rollups()
+    return issuance_rollups
+
 # Получение количества ключей у пользователя
 async def get_user_keys_count(user_id: int) -> int:
     """
-    Подсчитывает количество выданных ключей пользователю из keys_log.txt.
+    Возвращает количество выданных пользователю ключей по журналу keys_log.txt.
+    """
+    return (await get_issuance_index()).count(user_id)
+
+async def _read_key_files(user_id: int = None) -> dict:
+    """
+    Читает имена выданных файлов ключей по пользователям (только для user_id, если он задан)
+    из базы или из архива и журнала выдачи. На время чтения уплотнение откладывается,
+    чтобы строки не переносились между файлами.
     """
-    keys_log = await read_file(KEYS_LOG_FILE)
-    count = 0
-    for line in keys_log:
-        # Предполагается формат:
-        # timestamp - User: username (ID: user_id) - Key: filename.conf
-        if f"(ID: {user_id})" in line and "Key:" in line:
-            count += 1
-    return count
+    if sqlite_storage is not None:
+        return await sqlite_storage.key_files(user_id)
+    async with _get_compaction_lock():
+        await append_journal.flush(KEYS_LOG_FILE)
+        return await asyncio.to_thread(key_files_by_user, _keys_log_paths(), user_id)
+
+# Получение списка ключей пользователя
+async def get_user_key_files(user_id: int) -> list:
+    """
+    Возвращает имена файлов ключей, выданных пользователю, в порядке выдачи.
+    Имена не держатся в памяти: журнал читается при открытии экрана пользователя.
+    """
+    return (await _read_key_files(user_id)).get(user_id, [])
 
 # Функции для лимитов
-async def get_global_limit() -> int:
+async def _read_global_limit() -> int:
     """
-    Возвращает глобальный лимит ключей. Если файл не существует или содержит некорректные данные, возвращает DEFAULT_GLOBAL_LIMIT.
+    Читает глобальный лимит ключей из хранилища. Если файл не существует или содержит некорректные данные, возвращает DEFAULT_GLOBAL_LIMIT.
     """
-    if not os.path.exists(KEY_LIMIT_FILE):
+    if sqlite_storage is not None:
+        value = await sqlite_storage.get_global_limit()
+        lines = [value] if value is not None else []
+    elif not os.path.exists(KEY_LIMIT_FILE):
         return DEFAULT_GLOBAL_LIMIT
-    lines = await read_file(KEY_LIMIT_FILE)
+    else:
+        lines = await read_file(KEY_LIMIT_FILE)
     if not lines:
         return DEFAULT_GLOBAL_LIMIT
     try:
@@ -208,18 +500,10 @@ async def get_global_limit() -> int:
     except:
         return DEFAULT_GLOBAL_LIMIT
 
-async def set_global_limit(new_limit: int):
-    """
-    Устанавливает новый глобальный лимит ключей.
-    """
-    await write_file(KEY_LIMIT_FILE, [str(new_limit)])
-
-async def get_user_limit(user_id: int) -> int:
+async def _read_user_limits() -> dict:
     """
-    Возвращает индивидуальный лимит ключей пользователя.
-    Если лимит не установлен, возвращает глобальный лимит.
+    Читает индивидуальные лимиты пользователей из хранилища.
     """
-    # Если нет записи для пользователя, возвращаем глобальный лимит
     user_limits = await read_file(USER_LIMITS_FILE)
     user_limit_dict = {}
     for line in user_limits:
@@ -230,29 +514,60 @@ async def get_user_limit(user_id: int) -> int:
                 user_limit_dict[int(uid)] = int(limit)
             except:
                 continue
-    if user_id in user_limit_dict:
-        return user_limit_dict[user_id]
-    # Иначе глобальный
-    return await get_global_limit()
+    return user_limit_dict
+
+# Загрузка индекса квот
+async def load_quota_index():
+    """
+    Загружает в память число выданных ключей и лимиты пользователей.
+    Выдачи считаются по агрегату журнала выдачи: в keys_issued.txt старые версии бота
+    записывали каждую выдачу дважды, а в журнале каждой выдаче соответствует одна строка.
+    """
+    issuance = await get_issuance_index()
+    quota_index.load(dict(issuance.counts), await _read_user_limits(), await _read_global_limit())
+    logger.info(f"Индекс квот загружен: {len(quota_index.issued)} пользователей с ключами, {len(quota_index.user_limits)} индивидуальных лимитов")
+
+async def get_quota_index():
+    """
+    Возвращает индекс квот, загружая его при первом обращении.
+    """
+    if not quota_index.loaded:
+        await load_quota_index()
+    return quota_index
+
+async def get_global_limit() -> int:
+    """
+    Возвращает глобальный лимит ключей.
+    """
+    return (await get_quota_index()).global_limit
+
+async def set_global_limit(new_limit: int):
+    """
+    Устанавливает новый глобальный лимит ключей.
+    """
+    if sqlite_storage is not None:
+        await sqlite_storage.set_global_limit(new_limit)
+    else:
+        await write_file(KEY_LIMIT_FILE, [str(new_limit)])
+    quota_index.set_global_limit(new_limit)
+
+async def get_user_limit(user_id: int) -> int:
+    """
+    Возвращает индивидуальный лимит ключей пользователя.
+    Если лимит не установлен, возвращает глобальный лимит.
+    """
+    return (await get_quota_index()).limit_for(user_id)
 
 async def set_user_limit(user_id: int, limit: int):
     """
     Устанавливает индивидуальный лимит ключей для пользователя.
     """
-    user_limits = await read_file(USER_LIMITS_FILE)
-    # Создаём словарь текущих лимитов
-    user_limit_dict = {}
-    for line in user_limits:
-        parts = line.split(':')
-        if len(parts) == 2:
-            uid, l = parts
-            try:
-                user_limit_dict[int(uid)] = int(l)
-            except:
-                continue
-    # Устанавливаем или обновляем лимит для пользователя
-    user_limit_dict[user_id] = limit
+    quota = await get_quota_index()
+    quota.set_user_limit(user_id, limit)
+    if sqlite_storage is not None:
+        await sqlite_storage.set_user_limit(user_id, limit)
+        return
 
     # Перезаписываем файл с обновлёнными лимитами
-    lines = [f"{uid}:{l}" for uid, l in user_limit_dict.items()]
-    await write_file(USER_LIMITS_FILE, lines)
\ No newline at end of file
+    lines = [f"{uid}:{l}" for uid, l in quota.user_limits.items()]
+    await write_file(USER_LIMITS_FILE, lines)
@@ -0,0 +1,65 @@
+# webhook_server.py
+
+import hmac
+import logging
+
+from aiohttp import web
+from aiogram import Dispatcher
+from aiogram.utils import executor
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def secret_token_middleware(webhook_path: str, secret_token: str):
+    """
+    Отклоняет запросы к пути вебхука без правильного секретного токена,
+    который Telegram передаёт в заголовке X-Telegram-Bot-Api-Secret-Token.
+    """
+    expected = secret_token.encode('utf-8')
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        if request.path == webhook_path:
+            received = request.headers.get(SECRET_TOKEN_HEADER, '').encode('utf-8')
+            if not hmac.compare_digest(received, expected):
+                logger.warning(f"Отклонён запрос к вебхуку без корректного секретного токена от {request.remote}")
+                return web.Response(status=401)
+        return await handler(request)
+
+    return middleware
+
+
+def create_web_app(webhook_path: str, secret_token: str) -> web.Application:
+    """
+    Создаёт aiohttp-приложение с проверкой секретного токена.
+    Обработчик обновлений регистрирует aiogram при запуске вебхука.
+    """
+    return web.Application(middlewares=[secret_token_middleware(webhook_path, secret_token)])
+
+
+def start_webhook(dp: Dispatcher, on_startup, on_shutdown, host: str, port: int,
+                  webhook_path: str, secret_token: str, webhook_url: str = None):
+    """
+    Запускает бота в режиме вебхука.
+    Если задан webhook_url (публичный адрес, например за обратным прокси),
+    вебхук регистрируется в Telegram при старте вместе с секретным токеном.
+    """
+    async def register_webhook(dispatcher: Dispatcher):
+        if webhook_url:
+            url = f"{webhook_url.rstrip('/')}{webhook_path}"
+            # Вместо skip_updates: накопившиеся обновления сбрасывает сам Telegram
+            await dispatcher.bot.set_webhook(url, secret_token=secret_token, drop_pending_updates=True)
+            logger.info(f"Вебхук зарегистрирован: {url}")
+        await on_startup(dispatcher)
+
+    bot_executor = executor.set_webhook(
+        dispatcher=dp,
+        webhook_path=webhook_path,
+        on_startup=register_webhook,
+        on_shutdown=on_shutdown,
+        web_app=create_web_app(webhook_path, secret_token),
+    )
+    logger.info(f"Запуск вебхука на {host}:{port}{webhook_path}")
+    bot_executor.run_app(host=host, port=port)